@@ -0,0 +1,126 @@
+"""
+Инкрементальная синхронизация платежей ЮKassa в локальную таблицу payments.
+
+Проход листает список succeeded-платежей курсором ЮKassa от новых к старым,
+начиная с created_at >= watermark - SYNC_OVERLAP (первый проход — вся история).
+После каждой страницы курсор сохраняется в sync_state, поэтому прерванный
+проход продолжается с той же страницы. Запись платежей идемпотентна (merge по id),
+перекрытие окна подхватывает платежи, подтверждённые позже создания.
+"""
+import asyncio
+import re
+import traceback
+from datetime import datetime, timedelta
+
+import requests
+
+from core.api_s.api_youkassa.youkassa_api import list_payments_page
+from core.settings import payment_sync_interval
+from core.sql.function_db_payments.payments import get_sync_state, save_sync_state, upsert_payments
+from core.utils.format_iso_datetime import parse_iso_datetime
+from logs.log_main import RotatingFileLogger
+
+logger = RotatingFileLogger()
+
+SYNC_NAME = 'yookassa_payments'
+# Размер страницы списка платежей (максимум API — 100)
+SYNC_PAGE_SIZE = 100
+# На сколько раньше watermark начинается следующий проход
+SYNC_OVERLAP = timedelta(hours=2)
+
+# Описание платежа из create_payment: "Ключ для аккаунта <id>\nна ..."
+_ACCOUNT_RE = re.compile(r'аккаунта (\d+)\b')
+
+
+def _format_api_datetime(value: datetime) -> str:
+    return value.strftime('%Y-%m-%dT%H:%M:%S.000Z')
+
+
+def _payment_account(payment) -> int | None:
+    metadata = payment.metadata or {}
+    if metadata.get('account'):
+        return int(metadata['account'])
+    match = _ACCOUNT_RE.search(payment.description or '')
+    return int(match.group(1)) if match else None
+
+
+def _payment_row(payment) -> dict:
+    row = {
+        'id': payment.id,
+        'account': _payment_account(payment),
+        'amount': str(payment.amount.value) if payment.amount else None,
+        'status': payment.status,
+        'description': payment.description,
+        'created_at': parse_iso_datetime(payment.created_at),
+        'captured_at': parse_iso_datetime(payment.captured_at),
+    }
+    day_count = (payment.metadata or {}).get('day_count')
+    if day_count:
+        # Иначе сохраняется срок, записанный при выдаче ключа
+        row['period_days'] = int(day_count)
+    return row
+
+
+async def sync_payments() -> int:
+    """
+    Один проход синхронизации (или продолжение прерванного)
+
+    :return: int - Сколько платежей записано
+    """
+    state = await get_sync_state(SYNC_NAME)
+    watermark = state.watermark if state else None
+    cursor = state.cursor if state else None
+    if cursor:
+        since = state.since
+    else:
+        since = watermark - SYNC_OVERLAP if watermark else None
+
+    synced = 0
+    newest = watermark
+    while True:
+        params = {'status': 'succeeded', 'limit': SYNC_PAGE_SIZE}
+        if since:
+            params['created_at.gte'] = _format_api_datetime(since)
+        if cursor:
+            params['cursor'] = cursor
+        try:
+            payments, cursor = await list_payments_page(params)
+        except requests.HTTPError as e:
+            # SDK выбрасывает HTTPError из raise_for_status, а не BadRequestError
+            if not params.get('cursor') or e.response is None or e.response.status_code != 400:
+                raise
+            # Курсор прерванного прохода устарел — сбрасываем его и начинаем проход заново с since
+            logger.log('warning', 'Payment sync: stale cursor, restarting pass')
+            cursor = None
+            await save_sync_state(SYNC_NAME, cursor=None, since=since, watermark=watermark)
+            continue
+
+        rows = [_payment_row(payment) for payment in payments]
+        await upsert_payments(rows)
+        synced += len(rows)
+        for row in rows:
+            if row['created_at'] and (newest is None or row['created_at'] > newest):
+                newest = row['created_at']
+
+        # Watermark продвигается только по завершении прохода
+        await save_sync_state(SYNC_NAME, cursor=cursor, since=since, watermark=watermark if cursor else newest)
+        if not cursor:
+            break
+
+    logger.log('info', f'Payment sync: {synced} payments, watermark {newest}')
+    return synced
+
+
+async def payment_sync_loop() -> None:
+    """
+    Периодическая синхронизация (запускается задачей в процессе проверки подписок)
+    """
+    while True:
+        try:
+            await sync_payments()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            tb = traceback.format_exc()
+            logger.log('error', f'Payment sync failed: {e}\n{tb}')
+        await asyncio.sleep(payment_sync_interval)
@@ -1,15 +1,113 @@
+import asyncio
+import functools
+import ipaddress
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
 import yookassa
+from yookassa.client import ApiClient
 from yookassa.domain.response import PaymentResponse
 
-from core.settings import client_id, secret_key
-from core.utils.format_iso_datetime import format_iso_datetime
+from core.settings import client_id, secret_key, yookassa_timeout, yookassa_workers
+from core.utils.latency import get_histogram
+from logs.log_main import RotatingFileLogger
+
+logger = RotatingFileLogger()
 
 yookassa.Configuration.account_id = client_id
 yookassa.Configuration.secret_key = secret_key
 
+# SDK ЮKassa синхронный: вызовы выполняются в отдельном ограниченном пуле потоков
+_executor = ThreadPoolExecutor(max_workers=yookassa_workers, thread_name_prefix='yookassa')
+
+# Таймаут установки соединения с API (секунды); ожидание ответа — yookassa_timeout
+YOOKASSA_CONNECT_TIMEOUT = 5
+
+
+class _TimeoutApiClient(ApiClient):
+    """
+    ApiClient с таймаутом сокета. SDK не передаёт timeout в запрос, и без него
+    зависший ответ навсегда занимал поток _executor: wait_for перестаёт ждать, но поток не прерывает.
+    """
+
+    def get_session(self):
+        session = super().get_session()
+        session.request = functools.partial(
+            session.request, timeout=(min(YOOKASSA_CONNECT_TIMEOUT, yookassa_timeout), yookassa_timeout)
+        )
+        return session
+
+
+class _Payment(yookassa.Payment):
+    """
+    yookassa.Payment, запросы которого идут через _TimeoutApiClient
+    (методы класса SDK создают экземпляр через cls(), поэтому клиент подменяется только здесь)
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.client = _TimeoutApiClient()
+
+
+# Попытки вызова API при сетевых ошибках, таймауте, 429 и 5xx
+YOOKASSA_MAX_ATTEMPTS = 3
+# Пауза перед повтором (секунды), удваивается с каждой попыткой
+YOOKASSA_RETRY_DELAY = 0.5
+
+# Адреса, с которых ЮKassa отправляет HTTP-уведомления
+YOOKASSA_NETWORKS = [ipaddress.ip_network(network) for network in (
+    '185.71.76.0/27',
+    '185.71.77.0/27',
+    '77.75.153.0/25',
+    '77.75.156.11/32',
+    '77.75.156.35/32',
+    '77.75.154.128/25',
+    '2a02:5180::/32',
+)]
+
+
+def _is_retryable(error: Exception) -> bool:
+    # SDK вызывает raise_for_status до разбора ответа, поэтому ошибки API приходят как HTTPError
+    if isinstance(error, requests.HTTPError):
+        status = error.response.status_code if error.response is not None else 0
+        return status == 429 or status >= 500
+    return isinstance(error, (asyncio.TimeoutError, requests.exceptions.ConnectionError,
+                              requests.exceptions.Timeout))
+
+
+async def _call_api(name: str, func, *args, **kwargs):
+    """
+    Вызов синхронного SDK в пуле потоков с таймаутом, повторами и замером задержки
+
+    Повторять можно только идемпотентные запросы: чтение или создание с ключом идемпотентности.
+
+    :param name: str - Имя операции для гистограммы yookassa.<name>
+    :param func: Метод SDK
+    :return: Результат метода SDK
+    """
+    histogram = get_histogram(f'yookassa.{name}')
+    loop = asyncio.get_running_loop()
+    for attempt in range(1, YOOKASSA_MAX_ATTEMPTS + 1):
+        started = time.monotonic()
+        try:
+            result = await asyncio.wait_for(
+                loop.run_in_executor(_executor, functools.partial(func, *args, **kwargs)), yookassa_timeout
+            )
+        except Exception as e:
+            histogram.observe(time.monotonic() - started, error=True)
+            if attempt == YOOKASSA_MAX_ATTEMPTS or not _is_retryable(e):
+                raise
+            logger.log('warning', f'YooKassa {name} attempt {attempt} failed: {type(e).__name__} {e}, retrying')
+            await asyncio.sleep(YOOKASSA_RETRY_DELAY * 2 ** (attempt - 1))
+        else:
+            histogram.observe(time.monotonic() - started)
+            return result
+
 
 async def create_payment(amount_value: int, count_day: int,
-                         word_day: str, id_user: int) -> (str, yookassa.Payment):
+                         word_day: str, id_user: int, region_server: str = None) -> (str, yookassa.Payment):
     """
     Создание платежа
 
@@ -17,46 +115,64 @@ async def create_payment(amount_value: int, count_day: int,
     :param count_day: количество дней (для описания)
     :param word_day: склонение слова "день" (для описания)
     :param id_user: id пользователя телеграм (для описания)
+    :param region_server: сервер, на котором выдать ключ после оплаты (в metadata для уведомления)
     :return:
     """
 
-    payment = yookassa.Payment.create(
-        {
-            "amount": {
-                "value": amount_value,
-                "currency": "RUB"
-            },
-            "confirmation": {
-                "type": "redirect",
-                "return_url": "https://t.me/OneYearVpb_bot"
+    params = {
+        "amount": {
+            "value": amount_value,
+            "currency": "RUB"
+        },
+        "confirmation": {
+            "type": "redirect",
+            "return_url": "https://t.me/OneYearVpb_bot"
+        },
+        "capture": True,
+        # Параметры покупки для выдачи ключа по HTTP-уведомлению payment.succeeded
+        "metadata": {
+            "account": id_user,
+            "region_server": region_server,
+            "day_count": count_day,
+            "word_days": word_day,
+        },
+        "description": f"Ключ для аккаунта {id_user}\nна {count_day} {word_day}",
+        "receipt": {
+            "customer": {
+                "full_name": str(id_user),
+                "email": "email@email.ru",
             },
-            "capture": True,
-            "description": f"Ключ для аккаунта {id_user}\nна {count_day} {word_day}",
-            "receipt": {
-                "customer": {
-                    "full_name": str(id_user),
-                    "email": "email@email.ru",
-                },
-                "items": [
-                    {
-                        "description": f"Ключ для аккаунта {id_user}\nна {count_day} {word_day}",
-                        "quantity": "1.00",
-                        "amount": {
-                            "value": amount_value,
-                            "currency": "RUB"
-                        },
-                        "vat_code": "1",
-                        "payment_mode": "full_payment"
+            "items": [
+                {
+                    "description": f"Ключ для аккаунта {id_user}\nна {count_day} {word_day}",
+                    "quantity": "1.00",
+                    "amount": {
+                        "value": amount_value,
+                        "currency": "RUB"
                     },
-                ]
-            }
+                    "vat_code": "1",
+                    "payment_mode": "full_payment"
+                },
+            ]
         }
-    )
+    }
+    # Один ключ идемпотентности на все попытки: повтор не создаст второй платеж
+    payment = await _call_api('create_payment', _Payment.create, params, str(uuid.uuid4()))
 
     url = payment.confirmation.confirmation_url
     return url, payment
 
 
+async def get_payment(payment_id: str) -> PaymentResponse:
+    """
+    Получить платеж из API ЮKassa
+
+    :param payment_id: id платежа
+    :return: PaymentResponse
+    """
+    return await _call_api('find_one', _Payment.find_one, payment_id)
+
+
 async def check_payment(payment_id: PaymentResponse) -> bool:
     """
     Проверка платежа
@@ -64,36 +180,50 @@ async def check_payment(payment_id: PaymentResponse) -> bool:
     :param payment_id: id платежа для проверки
     :return: True в случае если платеж прошел, False в противном
     """
-    payment = yookassa.Payment.find_one(payment_id)
+    payment = await get_payment(payment_id)
     if payment.status == "succeeded":
         return True
     return False
 
 
-async def get_user_payments(find_id: int) -> list:
+def is_yookassa_ip(ip: str) -> bool:
     """
-    Поиск платежей по id телеграм пользователя
-    :return:
+    Проверка, что запрос пришёл с адреса ЮKassa
+
+    :param ip: str - IP-адрес отправителя
+    :return: bool
+    """
+    try:
+        address = ipaddress.ip_address(ip)
+    except ValueError:
+        return False
+    return any(address in network for network in YOOKASSA_NETWORKS)
+
+
+async def list_payments_page(params: dict) -> tuple[list[PaymentResponse], str | None]:
+    """
+    Одна страница списка платежей (курсорная пагинация ЮKassa, новые первыми)
+
+    :param params: dict - Фильтры API (status, created_at.gte, limit, cursor)
+    :return: tuple[list[PaymentResponse], str | None] - Платежи и курсор следующей страницы
     """
-    list_payments_from_youkassa = yookassa.Payment.list(params={'status': 'succeeded', 'limit': '50'})['items']
-    list_payments = []
-    for payment in list_payments_from_youkassa:
-        if str(find_id) in payment['description'] and payment['status'] == 'succeeded':
-            list_payments.append((payment['id'], payment['captured_at']))
-    return await build_records_user_payments(list_payments)
+    page = await _call_api('list', _Payment.list, params=params)
+    return list(page.items or []), getattr(page, 'next_cursor', None)
 
 
 async def build_records_user_payments(user_payments: list) -> list:
     """
     Создание списка, для шаблона к ответу на команду /findpay <id>
 
-    :param user_payments: list - список из БД с записями об оплаченных покупках
+    :param user_payments: list[Payment] - записи локального индекса платежей
     """
     str_user_payments = []
     for payment in user_payments:
-        payment_key = payment[0]
-        payment_time = format_iso_datetime(payment[1])
-        str_user_payments.append(f"[*{payment_key[29:]}|{payment_time}]")
+        payment_key = payment.id
+        paid_at = payment.captured_at or payment.created_at
+        payment_time = paid_at.strftime("%d.%m.%y - %H:%M") if paid_at else '—'
+        amount = f" {payment.amount} ₽" if payment.amount else ""
+        str_user_payments.append(f"[*{payment_key[29:]}|{payment_time}]{amount}")
     return str_user_payments
 
 
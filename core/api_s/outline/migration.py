@@ -0,0 +1,158 @@
+import asyncio
+import math
+import uuid
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+
+from core.api_s.outline.outline_api import get_outline_manager
+from core.sql.function_db_user_vpn.users_vpn import replace_user_keys
+from logs.log_main import RotatingFileLogger
+
+logger = RotatingFileLogger()
+
+# Сколько запросов одновременно выполняется к одному серверу Outline при миграции
+MIGRATION_CONCURRENCY_PER_SERVER = 5
+
+# Общие для всех миграций ограничители по серверам (создаются в работающем event loop)
+_server_semaphores: dict[str, asyncio.Semaphore] = {}
+
+
+def _server_semaphore(region_server: str) -> asyncio.Semaphore:
+    semaphore = _server_semaphores.get(region_server)
+    if semaphore is None:
+        semaphore = asyncio.Semaphore(MIGRATION_CONCURRENCY_PER_SERVER)
+        _server_semaphores[region_server] = semaphore
+    return semaphore
+
+
+@dataclass
+class MigratedKey:
+    """
+    Ключ, перенесённый на целевой сервер
+
+    Attributes:
+    - old_key (UserKey): Исходная запись.
+    - outline_id (str): id нового ключа на целевом сервере.
+    - access_url (str): Ссылка нового ключа.
+    """
+    old_key: object
+    outline_id: str
+    access_url: str
+
+
+@dataclass
+class MigrationBatchResult:
+    """
+    Итог переноса одной пачки ключей
+    """
+    migrated: list[MigratedKey] = field(default_factory=list)
+    failed: int = 0
+    old_deleted: int = 0
+    old_delete_failed: int = 0
+
+
+@dataclass
+class MigrationEstimate:
+    """
+    Оценка длительности миграции (dry-run)
+    """
+    keys: int
+    source_latency: float
+    target_latency: float
+    seconds: float
+
+
+async def _create_on_target(old_key, to_server: str) -> MigratedKey | None:
+    async with _server_semaphore(to_server):
+        unique_name = f"{old_key.account}-migrated-{uuid.uuid4().hex[:8]}"
+        try:
+            new_key = await get_outline_manager(to_server).create_key_with_name(unique_name)
+        except Exception as e:
+            logger.log('error', f'Migration: failed to create key for user {old_key.account} on {to_server}: {e}')
+            return None
+    new_outline_id = getattr(new_key, 'key_id', None) if new_key else None
+    new_access_url = getattr(new_key, 'access_url', None) if new_key else None
+    if not new_outline_id or not new_access_url:
+        logger.log('error', f'Migration: new key for user {old_key.account} missing required attributes')
+        return None
+    return MigratedKey(old_key=old_key, outline_id=str(new_outline_id), access_url=new_access_url)
+
+
+async def _delete_on_server(outline_id: str, region_server: str) -> bool:
+    async with _server_semaphore(region_server):
+        try:
+            return await get_outline_manager(region_server).delete_key_by_id(outline_id)
+        except Exception as e:
+            logger.log('warning', f'Migration: failed to delete key {outline_id} on {region_server}: {e}')
+            return False
+
+
+async def migrate_keys_batch(old_keys: list, from_server: str, to_server: str) -> MigrationBatchResult:
+    """
+    Перенести пачку ключей с сервера на сервер.
+
+    1. Новые ключи создаются на целевом сервере параллельно (не больше
+       MIGRATION_CONCURRENCY_PER_SERVER запросов к одному серверу).
+    2. Новые записи user_keys вставляются, а старые удаляются одной транзакцией.
+    3. Только после этого старые ключи удаляются на исходном сервере.
+    Если шаг 2 не прошёл, созданные новые ключи удаляются, старые остаются рабочими.
+
+    :param old_keys: list[UserKey] - Переносимые ключи
+    :param from_server: str - Исходный сервер
+    :param to_server: str - Целевой сервер
+    :return: MigrationBatchResult
+    """
+    result = MigrationBatchResult()
+    created = await asyncio.gather(*(_create_on_target(old_key, to_server) for old_key in old_keys))
+    migrated = [item for item in created if item is not None]
+    result.failed = len(old_keys) - len(migrated)
+    if not migrated:
+        return result
+
+    new_rows = [
+        {
+            'account': item.old_key.account,
+            'access_url': item.access_url,
+            'outline_id': item.outline_id,
+            'region_server': to_server,
+            # Если нет даты, устанавливаем +30 дней
+            'date': item.old_key.date or (datetime.now() + timedelta(days=30)),
+            'promo': item.old_key.promo,
+        }
+        for item in migrated
+    ]
+    try:
+        await replace_user_keys(new_rows, [item.old_key.id for item in migrated])
+    except Exception:
+        # Откатываем созданные ключи, чтобы не оставлять на целевом сервере ключи без записей
+        await asyncio.gather(*(_delete_on_server(item.outline_id, to_server) for item in migrated))
+        raise
+
+    result.migrated = migrated
+    deleted = await asyncio.gather(*(_delete_on_server(item.old_key.outline_id, from_server) for item in migrated))
+    result.old_deleted = sum(1 for ok in deleted if ok)
+    result.old_delete_failed = len(deleted) - result.old_deleted
+    return result
+
+
+async def estimate_migration(keys_count: int, from_server: str, to_server: str, samples: int = 3) -> MigrationEstimate:
+    """
+    Оценить длительность миграции по замеренной задержке серверов (без изменений)
+
+    На каждый ключ приходится одно создание на целевом сервере и одно удаление
+    на исходном; запросы к серверу идут MIGRATION_CONCURRENCY_PER_SERVER параллельно.
+
+    :param keys_count: int - Количество переносимых ключей
+    :param from_server: str - Исходный сервер
+    :param to_server: str - Целевой сервер
+    :param samples: int - Количество замеров задержки каждого сервера
+    :return: MigrationEstimate
+    """
+    source_latency, target_latency = await asyncio.gather(
+        get_outline_manager(from_server).measure_latency(samples),
+        get_outline_manager(to_server).measure_latency(samples),
+    )
+    rounds = math.ceil(keys_count / MIGRATION_CONCURRENCY_PER_SERVER)
+    seconds = rounds * (source_latency + target_latency)
+    return MigrationEstimate(keys=keys_count, source_latency=source_latency,
+                             target_latency=target_latency, seconds=seconds)
@@ -1,23 +1,32 @@
-import json
+import asyncio
+import functools
+import re
+import statistics
+import threading
+import time
 
+from core.api_s.outline.server_registry import server_registry
+from core.settings import outline_request_timeout, outline_metrics_ttl
+from core.utils.metrics import observe
+from outline_vpn.async_outline_vpn import AsyncOutlineVPN
 from outline_vpn.outline_vpn import OutlineVPN, OutlineServerErrorException
 
+# Пул асинхронных клиентов: один клиент (и одно keep-alive соединение) на сервер
+_async_clients: dict[tuple, AsyncOutlineVPN] = {}
+
+# Реестр менеджеров: (класс менеджера, регион) -> менеджер с живым клиентом
+_managers: dict[tuple, object] = {}
+_managers_lock = threading.Lock()
+
 
 def get_name_all_active_server_ol() -> list:
     """
     Получение всех активных серверов
-    Данные для сервера берутся из settings_api_outline.json
+    Данные для сервера берутся из реестра серверов (settings_api_outline.json)
 
     :return: list - name_en всех активных серверов
     """
-    config_file = 'core/api_s/outline/settings_api_outline.json'
-    active_servers = []
-    with open(config_file, 'r') as f:
-        config = json.load(f)
-    for value in config.values():
-        if value['is_active']:
-            active_servers.append(value['name_en'])
-    return active_servers
+    return server_registry.active_names()
 
 def get_server_display_name(region_server: str) -> str:
     """
@@ -26,16 +35,25 @@ def get_server_display_name(region_server: str) -> str:
     :param region_server: название региона (name_en)
     :return: отображаемое имя с флагом (name_ru)
     """
-    config_file = 'core/api_s/outline/settings_api_outline.json'
     try:
-        with open(config_file, 'r') as f:
-            config = json.load(f)
-        if region_server in config:
-            return config[region_server].get('name_ru', region_server)
-        return region_server
+        return server_registry.display_name(region_server)
     except Exception:
         return region_server
 
+
+def get_server_entry(region_server: str) -> tuple:
+    """
+    Получить параметры подключения к серверу из реестра серверов
+
+    :param region_server: str - Регион сервера (name_en)
+    :return: tuple - (api_url, cert_sha256)
+    """
+    record = server_registry.get(region_server)
+    if record is None:
+        raise KeyError(region_server)
+    return record.api_url, record.cert_sha256
+
+
 class OutlineManager:
     """
     Класс для управления ключами в Outline VPN.
@@ -58,30 +76,28 @@ class OutlineManager:
     def __client_init(self) -> OutlineVPN:
         """
         Инициализация клиента
-        Данные для сервера берутся из settings_api_outline.json
+        Данные для сервера берутся из реестра серверов (settings_api_outline.json)
 
         :return: OutlineVPN - Объект OutlineVPN
         """
-        config_file = 'core/api_s/outline/settings_api_outline.json'
-        with open(config_file, 'r') as f:
-            config = json.load(f)
-        data_server = config[self.region_server]
-        api_url = data_server['api_url']
-        cert_sha256 = data_server['cert_sha256']
+        self.server_entry = get_server_entry(self.region_server)
+        api_url, cert_sha256 = self.server_entry
         return OutlineVPN(api_url=api_url,
-                          cert_sha256=cert_sha256)
+                          cert_sha256=cert_sha256,
+                          metrics_ttl=outline_metrics_ttl)
 
-    def get_key_from_ol(self, id_user: str) -> str or None:
+    def get_key_from_ol(self, id_user: str, with_metrics: bool = True) -> str or None:
         """
         Получить ключ для указанного пользователя.
 
         Args:
         - id_user: str - Идентификатор пользователя.
+        - with_metrics: bool - Заполнять ли used_bytes (берётся из общего кэша метрик сервера).
         Returns:
         - str or None: Ключ пользователя или None, если ключ не найден.
         """
         try:
-            key = self._client.get_key(id_user)
+            key = self._client.get_key(id_user, with_metrics=with_metrics)
         except OutlineServerErrorException:
             key = None
         return key
@@ -108,23 +124,24 @@ class OutlineManager:
         Returns:
         - bool: True, если ключ успешно удален, False в противном случае.
         """
-        key = self.get_key_from_ol(id_user=id_user)
+        key = self.get_key_from_ol(id_user=id_user, with_metrics=False)
         if key is None:
             return False
         return self._client.delete_key(key.key_id)
 
     # --- Multiple keys support ---
-    def get_key_by_id(self, outline_id: str) -> str or None:
+    def get_key_by_id(self, outline_id: str, with_metrics: bool = True) -> str or None:
         """
         Получить ключ по его уникальному идентификатору outline_id.
 
         Args:
         - outline_id: str - Уникальный идентификатор ключа в Outline.
+        - with_metrics: bool - Заполнять ли used_bytes (берётся из общего кэша метрик сервера).
         Returns:
         - Key or None
         """
         try:
-            key = self._client.get_key(outline_id)
+            key = self._client.get_key(outline_id, with_metrics=with_metrics)
         except OutlineServerErrorException:
             key = None
         return key
@@ -145,13 +162,273 @@ class OutlineManager:
         except OutlineServerErrorException:
             # Пытаемся проверить существование ключа; если его нет — считаем удалённым
             try:
-                key = self._client.get_key(outline_id)
+                key = self._client.get_key(outline_id, with_metrics=False)
+                if not key:
+                    return True
+            except OutlineServerErrorException:
+                return True
+            return False
+
+
+# id ключа в пути заменяется, чтобы число серий метрик не росло с числом ключей
+_KEY_PATH_RE = re.compile(r'^/access-keys/[^/]+')
+
+
+def _observe_outline_request(server: str, method: str, path: str, status: int | None, seconds: float) -> None:
+    """
+    Замер запроса к API Outline для /metrics (ошибка — сбой соединения или ответ 5xx)
+    """
+    endpoint = f'{method} {_KEY_PATH_RE.sub("/access-keys/{id}", path)}'
+    observe('outline_request_seconds', seconds, error=status is None or status >= 500,
+            server=server, endpoint=endpoint)
+
+
+def get_async_client(api_url: str, cert_sha256: str, server: str = '') -> AsyncOutlineVPN:
+    """
+    Получить асинхронный клиент для сервера из пула.
+    Клиент создаётся один раз на пару (api_url, cert_sha256) и переиспользует соединения.
+
+    :param api_url: str - API URL сервера Outline
+    :param cert_sha256: str - SHA256 сертификата сервера
+    :param server: str - Имя сервера для метрик
+    :return: AsyncOutlineVPN - Клиент сервера
+    """
+    pool_key = (api_url, cert_sha256)
+    client = _async_clients.get(pool_key)
+    if client is None:
+        client = AsyncOutlineVPN(api_url=api_url, cert_sha256=cert_sha256,
+                                 timeout=outline_request_timeout,
+                                 metrics_ttl=outline_metrics_ttl,
+                                 on_request=functools.partial(_observe_outline_request, server or api_url))
+        _async_clients[pool_key] = client
+    return client
+
+
+async def close_async_clients() -> None:
+    """
+    Закрыть соединения всех асинхронных клиентов (при остановке бота)
+    """
+    clients = list(_async_clients.values())
+    _async_clients.clear()
+    for client in clients:
+        await client.close()
+
+
+class AsyncOutlineManager:
+    """
+    Асинхронный вариант OutlineManager для вызова из обработчиков aiogram.
+    Не блокирует event loop при медленном ответе сервера Outline.
+
+    Attributes:
+    - client (AsyncOutlineVPN): Клиент из общего пула для выбранного сервера.
+    """
+
+    def __init__(self, region_server: str = 'nederland'):
+        """
+        Инициализация объекта AsyncOutlineManager
+
+        Args:
+        - region_server: str - Регион сервера для инициализации клиента
+        """
+
+        self.region_server = region_server
+        self._client = self.__client_init()
+
+    def __client_init(self) -> AsyncOutlineVPN:
+        """
+        Получение клиента из пула
+        Данные для сервера берутся из реестра серверов (settings_api_outline.json)
+
+        :return: AsyncOutlineVPN - Объект AsyncOutlineVPN
+        """
+        self.server_entry = get_server_entry(self.region_server)
+        api_url, cert_sha256 = self.server_entry
+        return get_async_client(api_url=api_url, cert_sha256=cert_sha256, server=self.region_server)
+
+    async def get_key_from_ol(self, id_user: str, with_metrics: bool = True):
+        """
+        Получить ключ для указанного пользователя.
+
+        Args:
+        - id_user: str - Идентификатор пользователя.
+        - with_metrics: bool - Заполнять ли used_bytes (берётся из общего кэша метрик сервера).
+        Returns:
+        - OutlineKey or None: Ключ пользователя или None, если ключ не найден.
+        """
+        try:
+            key = await self._client.get_key(id_user, with_metrics=with_metrics)
+        except OutlineServerErrorException:
+            key = None
+        return key
+
+    async def create_key_from_ol(self, id_user: str):
+        """
+        Создать новый ключ для пользователя.
+
+        Args:
+        - id_user: str - Идентификатор пользователя.
+
+        Returns:
+        - OutlineKey: Информация о созданном ключе.
+        """
+        return await self._client.create_key(key_id=id_user, name=id_user)
+
+    async def delete_key_from_ol(self, id_user: str) -> bool:
+        """
+        Удалить ключ указанного пользователя.
+
+        Args:
+        - id_user: str - Идентификатор пользователя.
+
+        Returns:
+        - bool: True, если ключ успешно удален, False в противном случае.
+        """
+        key = await self.get_key_from_ol(id_user=id_user, with_metrics=False)
+        if key is None:
+            return False
+        return await self._client.delete_key(key.key_id)
+
+    # --- Multiple keys support ---
+    async def get_key_by_id(self, outline_id: str, with_metrics: bool = True):
+        """
+        Получить ключ по его уникальному идентификатору outline_id.
+
+        Args:
+        - outline_id: str - Уникальный идентификатор ключа в Outline.
+        - with_metrics: bool - Заполнять ли used_bytes (берётся из общего кэша метрик сервера).
+        Returns:
+        - OutlineKey or None
+        """
+        try:
+            key = await self._client.get_key(outline_id, with_metrics=with_metrics)
+        except OutlineServerErrorException:
+            key = None
+        return key
+
+    async def delete_key_by_id(self, outline_id: str) -> bool:
+        """
+        Удалить ключ по его уникальному идентификатору outline_id.
+
+        Args:
+        - outline_id: str - Уникальный идентификатор ключа в Outline.
+
+        Returns:
+        - bool: True, если удаление прошло успешно, иначе False.
+        """
+        try:
+            return await self._client.delete_key(outline_id)
+        except OutlineServerErrorException:
+            # Пытаемся проверить существование ключа; если его нет — считаем удалённым
+            try:
+                key = await self._client.get_key(outline_id, with_metrics=False)
                 if not key:
                     return True
             except OutlineServerErrorException:
                 return True
             return False
 
+    async def create_key_with_name(self, name: str):
+        """
+        Создать ключ с id, назначенным сервером, и указанным именем.
+
+        Args:
+        - name: str - Имя ключа в Outline.
+
+        Returns:
+        - OutlineKey: Информация о созданном ключе.
+        """
+        return await self._client.create_key(name=name)
+
+    async def measure_latency(self, samples: int = 3) -> float:
+        """
+        Замерить задержку API сервера (медиана нескольких запросов GET /server).
+
+        Args:
+        - samples: int - Количество запросов.
+
+        Returns:
+        - float: Задержка в секундах.
+        """
+        timings = []
+        for _ in range(samples):
+            started = time.monotonic()
+            await self._client.get_server_information()
+            timings.append(time.monotonic() - started)
+        return statistics.median(timings)
+
+
+def _close_stale_client(manager) -> None:
+    """
+    Закрыть клиент менеджера, у которого сменились параметры сервера.
+
+    :param manager: OutlineManager | AsyncOutlineManager - Устаревший менеджер
+    """
+    client = manager._client
+    if isinstance(client, AsyncOutlineVPN):
+        _async_clients.pop(manager.server_entry, None)
+        try:
+            asyncio.get_running_loop().create_task(client.close())
+        except RuntimeError:
+            # Event loop не запущен — сессия не создавалась или уже закрыта
+            pass
+    else:
+        client.session.close()
+
+
+def _get_registered_manager(manager_cls, region_server: str):
+    """
+    Вернуть долгоживущий менеджер для региона.
+    Менеджер пересоздаётся только если в конфиге изменились api_url или cert_sha256 сервера.
+
+    :param manager_cls: type - OutlineManager или AsyncOutlineManager
+    :param region_server: str - Регион сервера (name_en)
+    :return: Менеджер для региона
+    """
+    server_entry = get_server_entry(region_server)
+    registry_key = (manager_cls, region_server)
+    with _managers_lock:
+        manager = _managers.get(registry_key)
+        if manager is not None and manager.server_entry == server_entry:
+            return manager
+        if manager is not None:
+            _close_stale_client(manager)
+        manager = manager_cls(region_server=region_server)
+        _managers[registry_key] = manager
+        return manager
+
+
+def get_outline_manager(region_server: str = 'nederland') -> AsyncOutlineManager:
+    """
+    Получить общий асинхронный менеджер для региона (с тёплым пулом соединений)
+
+    :param region_server: str - Регион сервера (name_en)
+    :return: AsyncOutlineManager
+    """
+    return _get_registered_manager(AsyncOutlineManager, region_server)
+
+
+def get_sync_outline_manager(region_server: str = 'nederland') -> OutlineManager:
+    """
+    Получить общий синхронный менеджер для региона (для скриптов вне event loop)
+
+    :param region_server: str - Регион сервера (name_en)
+    :return: OutlineManager
+    """
+    return _get_registered_manager(OutlineManager, region_server)
+
+
+async def close_outline_managers() -> None:
+    """
+    Очистить реестр менеджеров и закрыть все соединения (при остановке бота)
+    """
+    with _managers_lock:
+        managers = list(_managers.values())
+        _managers.clear()
+    for manager in managers:
+        if isinstance(manager, OutlineManager):
+            manager._client.session.close()
+    await close_async_clients()
+
 
 if __name__ == "__main__":
     ol = OutlineManager()
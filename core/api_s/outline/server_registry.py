@@ -0,0 +1,185 @@
+import copy
+import json
+import os
+import tempfile
+import threading
+from dataclasses import dataclass, asdict
+
+CONFIG_FILE = 'core/api_s/outline/settings_api_outline.json'
+
+
+@dataclass(frozen=True)
+class ServerRecord:
+    """
+    Запись о сервере Outline из settings_api_outline.json
+    """
+
+    name_en: str
+    name_ru: str
+    api_url: str
+    cert_sha256: str
+    is_active: bool
+
+    @classmethod
+    def from_dict(cls, data: dict) -> 'ServerRecord':
+        return cls(name_en=data['name_en'],
+                   name_ru=data.get('name_ru', data['name_en']),
+                   api_url=data.get('api_url', ''),
+                   cert_sha256=data.get('cert_sha256', ''),
+                   is_active=bool(data.get('is_active', False)))
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+
+class ServerRegistry:
+    """
+    Кэш конфигурации серверов Outline.
+
+    Файл читается один раз и перечитывается только при изменении mtime или размера,
+    поэтому правки через /addserver и /deleteserver (и ручные правки файла)
+    подхватываются без перезапуска.
+
+    Attributes:
+    - version (int): Увеличивается при каждой перезагрузке конфигурации.
+    """
+
+    def __init__(self, config_file: str = CONFIG_FILE):
+        """
+        Args:
+        - config_file: str - Путь к settings_api_outline.json
+        """
+        self.config_file = config_file
+        self.version = 0
+        self._stamp = None
+        self._servers: dict[str, ServerRecord] = {}
+        self._order: list[str] = []
+        # Содержимое файла как есть: as_config не теряет поля, которых нет в ServerRecord
+        self._raw: dict = {}
+        self._lock = threading.Lock()
+
+    def _file_stamp(self) -> tuple | None:
+        try:
+            stat = os.stat(self.config_file)
+        except FileNotFoundError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def _refresh(self) -> None:
+        """
+        Перечитать файл, если он изменился с момента последней загрузки
+        """
+        stamp = self._file_stamp()
+        if stamp == self._stamp and self.version:
+            return
+        with self._lock:
+            if stamp == self._stamp and self.version:
+                return
+            config = {}
+            if stamp is not None:
+                with open(self.config_file, 'r', encoding='utf-8') as f:
+                    config = json.load(f)
+            servers = {}
+            for key, value in config.items():
+                record = ServerRecord.from_dict({'name_en': key, **value})
+                servers[record.name_en] = record
+            self._servers = servers
+            self._order = list(servers)
+            self._raw = config
+            self._stamp = stamp
+            self.version += 1
+
+    def get_version(self) -> int:
+        """
+        :return: int - Текущая версия конфигурации (после проверки файла на изменения)
+        """
+        self._refresh()
+        return self.version
+
+    def get(self, name_en: str) -> ServerRecord | None:
+        """
+        :param name_en: str - Название сервера (name_en)
+        :return: ServerRecord | None
+        """
+        self._refresh()
+        return self._servers.get(name_en)
+
+    def all(self) -> list[ServerRecord]:
+        """
+        :return: list[ServerRecord] - Все серверы в порядке из файла
+        """
+        self._refresh()
+        return [self._servers[name] for name in self._order]
+
+    def active(self) -> list[ServerRecord]:
+        """
+        :return: list[ServerRecord] - Активные серверы в порядке из файла
+        """
+        return [record for record in self.all() if record.is_active]
+
+    def active_names(self) -> list[str]:
+        """
+        :return: list[str] - name_en всех активных серверов
+        """
+        return [record.name_en for record in self.active()]
+
+    def display_name(self, name_en: str) -> str:
+        """
+        :param name_en: str - Название сервера (name_en)
+        :return: str - name_ru сервера с флагом, либо name_en если сервера нет
+        """
+        record = self.get(name_en)
+        return record.name_ru if record else name_en
+
+    def as_config(self) -> dict:
+        """
+        Копия конфигурации в формате файла (для редактирования и последующего save).
+        Записи возвращаются целиком, включая поля, которых нет в ServerRecord
+
+        :return: dict - {name_en: {...}}
+        """
+        self._refresh()
+        return copy.deepcopy(self._raw)
+
+    def _copy_permissions(self, tmp_path: str) -> None:
+        """
+        mkstemp создаёт файл с правами 0600: переносим права (и владельца, если позволено)
+        текущего файла конфигурации, для нового файла — 0644
+        """
+        try:
+            stat = os.stat(self.config_file)
+        except FileNotFoundError:
+            os.chmod(tmp_path, 0o644)
+            return
+        os.chmod(tmp_path, stat.st_mode & 0o7777)
+        if hasattr(os, 'chown'):
+            try:
+                os.chown(tmp_path, stat.st_uid, stat.st_gid)
+            except PermissionError:
+                pass
+
+    def save(self, config: dict, indent: int = 4) -> None:
+        """
+        Атомарно записать конфигурацию и сразу обновить кэш
+
+        :param config: dict - {name_en: {...}} в формате файла
+        :param indent: int - Отступ в json
+        """
+        directory = os.path.dirname(self.config_file) or '.'
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(config, f, indent=indent, ensure_ascii=False)
+            self._copy_permissions(tmp_path)
+            os.replace(tmp_path, self.config_file)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        # Сбрасываем отметку, чтобы следующее обращение перечитало файл
+        with self._lock:
+            self._stamp = None
+        self._refresh()
+
+
+server_registry = ServerRegistry()
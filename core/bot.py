@@ -1,77 +1,39 @@
-from aiogram.client.default import DefaultBotProperties
-from aiogram.filters import Command, StateFilter
-from aiogram import Bot, Dispatcher, Router
-from aiogram.types import BotCommand, BotCommandScopeChat
 import asyncio
 
-from core.handlers.find_user_payments import command_findpay
-from core.handlers.get_db import command_get_db
-from core.handlers.get_log_payments import command_get_log_pay
-from core.handlers.message_to_admin import send_admin_message
-from core.handlers.give_promo import command_promo
-from core.handlers.key_info import command_keyinfo
-from core.handlers.active_keys import command_active_keys
-from core.handlers.admin_block_reason import command_block_reason
-from core.handlers.mass_block import command_mass_block
-from core.handlers.seed_test_data import command_seed
-from core.handlers.unseed_test_data import command_unseed
-from core.handlers.server_stats import command_server_stats
-from core.handlers.bot_statistics import command_stats
-from core.handlers.pin_disclaimer import pin_disclaimer_handler
-from core.handlers.docs import command_docs
-from core.handlers.migrate_old_keys import (
-    command_migrate,
-    command_check_migration_status,
-    command_fix_migration_dates,
-    command_debug_keys,
-    command_show_old_keys
-)
-from core.handlers.migrate_server import (
-    command_migrate_server, 
-    select_source_server,
-    select_target_server,
-    handle_migration_confirmation, 
-    MigrateServerStates
-)
-from core.handlers.add_server import (
-    command_addserver, 
-    process_country_choice,
-    process_country_ru_input,
-    process_api_url_input, 
-    process_cert_input,
-    AddServerStates
-)
-from core.handlers.delete_server import (
-    deleteserver_handler,
-    confirm_delete_server,
-    execute_delete_server,
-    cancel_delete
-)
-from core.handlers.edit_price import (
-    editprice_handler,
-    select_period_to_edit,
-    process_new_price,
-    EditPriceStates
-)
-from core.handlers.test_key_broadcast import (
-    command_testkey,
-    process_testkey_server_choice,
-    TestKeyStates
-)
-from core.handlers.replace_key import replace_key_handler
-from core.settings import api_key_tlg, admin_tlg
-from core.api_s.outline.outline_api import OutlineManager
-from core.handlers.handler_keyboard import build_and_edit_message
-from core.handlers.start import command_start
-
-router: Router = Router()
-olm = OutlineManager()
+from core.settings import api_key_tlg, admin_tlg, bot_mode, metrics_port, run_mode, support_bot_token, yookassa_webhook
+from core.utils.startup_profiler import startup_profiler
+from logs.log_main import RotatingFileLogger
+
+logger = RotatingFileLogger()
+
 BOT_TOKEN = api_key_tlg
-bot: Bot = Bot(token=BOT_TOKEN, default=DefaultBotProperties(parse_mode="HTML"))
+_bot = None
+
+
+def get_bot():
+    """
+    Основной бот. Создаётся при первом обращении: импорт core.bot не тянет aiogram,
+    а процесс проверки подписок не открывает сессию, пока ему нечего отправлять
+
+    :return: Bot
+    """
+    global _bot
+    if _bot is None:
+        from aiogram import Bot
+        from aiogram.client.default import DefaultBotProperties
+        from core.webhook import telegram_session
+        _bot = Bot(token=BOT_TOKEN, session=telegram_session(), default=DefaultBotProperties(parse_mode="HTML"))
+    return _bot
+
 
+async def setup_bot_commands(bot) -> None:
+    """
+    Установка команд для меню бота
+
+    :param bot: Bot - Основной бот
+    """
+    from aiogram.types import BotCommand, BotCommandScopeChat
 
-async def setup_bot_commands(bot: Bot):
-    """Установка команд для меню бота"""
     # Команды для обычных пользователей
     user_commands = [
         BotCommand(command="start", description="🏠 Главное меню"),
@@ -81,6 +43,7 @@ async def setup_bot_commands(bot: Bot):
     admin_commands = [
         BotCommand(command="start", description="🏠 Главное меню"),
         BotCommand(command="stats", description="📊 Статистика бота"),
+        BotCommand(command="perf", description="⏱ Задержки обработчиков"),
         BotCommand(command="pindisclaimer", description="📌 Закрепить дисклеймер"),
         BotCommand(command="promo", description="🎁 Выдать промо-ключ"),
         BotCommand(command="testkey", description="🎉 Рассылка тестовых ключей"),
@@ -93,6 +56,7 @@ async def setup_bot_commands(bot: Bot):
         BotCommand(command="editprice", description="💰 Редактировать цены"),
         BotCommand(command="addserver", description="➕ Добавить сервер"),
         BotCommand(command="deleteserver", description="🗑️ Удалить сервер"),
+        BotCommand(command="jobs", description="🧰 Фоновые задачи"),
         BotCommand(command="seed", description="🧪 Создать тестовые данные"),
         BotCommand(command="unseed", description="🗑️ Удалить тестовые данные"),
         BotCommand(command="get_db", description="💾 Скачать БД"),
@@ -115,108 +79,221 @@ async def setup_bot_commands(bot: Bot):
 
 async def start_bot():
     """Запуск бота"""
-    dp: Dispatcher = Dispatcher()
-    dp.include_router(router=router)
+    with startup_profiler.phase('imports'):
+        from aiogram import Dispatcher
+        from aiogram.filters import Command
+        from core.api_s.outline.outline_api import close_outline_managers
+        from core.handlers.lazy import lazy_handler
+        from core.handlers.message_to_admin import send_admin_message
+        from core.handlers.states import AddServerStates, EditPriceStates
+        from core.jobs.runner import job_runner
+        from core.metrics_server import start_metrics_server
+        from core.middlewares.latency import latency_middleware
+        from core.middlewares.throttling import throttling_middleware
+        from core.sql.engine import init_db, dispose_engine
+        from core.utils.message_queue import outbound_queue
+
+    bot = get_bot()
+    dp = Dispatcher()
+
+    # Ограничение частоты событий для каждого пользователя (до проверки фильтров)
+    dp.message.outer_middleware(throttling_middleware)
+    dp.callback_query.outer_middleware(throttling_middleware)
+    # Задержки обработчиков для /perf (отклонённые ограничением события не учитываются)
+    dp.message.outer_middleware(latency_middleware)
+    dp.callback_query.outer_middleware(latency_middleware)
     
     # Регистрация команд (порядок важен!)
+    # Модули обработчиков импортируются при первом событии (lazy_handler)
     # 1. Команды с фильтрами Command регистрируются РАНЬШЕ
-    dp.message.register(command_start, Command('start'))
-    dp.message.register(command_stats, Command('stats'))
-    dp.message.register(command_docs, Command('docs'))
-    dp.message.register(lambda m: pin_disclaimer_handler(m, bot), Command('pindisclaimer'))
-    dp.message.register(command_migrate, Command('migrate'))
-    dp.message.register(command_check_migration_status, Command('checkstatus'))
-    dp.message.register(command_fix_migration_dates, Command('fixmigration'))
-    dp.message.register(command_debug_keys, Command('debugkeys'))
-    dp.message.register(command_show_old_keys, Command('showoldkeys'))
-    dp.message.register(command_findpay, Command('findpay'))
-    dp.message.register(command_get_log_pay, Command('get_log_pay'))
-    dp.message.register(command_get_db, Command('get_db'))
-    dp.message.register(command_promo, Command('promo'))
-    dp.message.register(command_keyinfo, Command('keyinfo'))
-    dp.message.register(command_active_keys, Command('activekeys'))
-    dp.message.register(command_mass_block, Command('massblock'))
-    dp.message.register(command_server_stats, Command('serverstats'))
-    dp.message.register(command_migrate_server, Command('migrateserver'))
-    dp.message.register(command_seed, Command('seed'))
-    dp.message.register(command_unseed, Command('unseed'))
-    dp.message.register(command_addserver, Command('addserver'))
-    dp.message.register(deleteserver_handler, Command('deleteserver'))
-    dp.message.register(editprice_handler, Command('editprice'))
-    dp.message.register(command_testkey, Command('testkey'))
+    commands = {
+        'start': 'core.handlers.start:command_start',
+        'stats': 'core.handlers.bot_statistics:command_stats',
+        'docs': 'core.handlers.docs:command_docs',
+        'pindisclaimer': 'core.handlers.pin_disclaimer:pin_disclaimer_handler',
+        'migrate': 'core.handlers.migrate_old_keys:command_migrate',
+        'checkstatus': 'core.handlers.migrate_old_keys:command_check_migration_status',
+        'fixmigration': 'core.handlers.migrate_old_keys:command_fix_migration_dates',
+        'debugkeys': 'core.handlers.migrate_old_keys:command_debug_keys',
+        'showoldkeys': 'core.handlers.migrate_old_keys:command_show_old_keys',
+        'findpay': 'core.handlers.find_user_payments:command_findpay',
+        'get_log_pay': 'core.handlers.get_log_payments:command_get_log_pay',
+        'get_db': 'core.handlers.get_db:command_get_db',
+        'promo': 'core.handlers.give_promo:command_promo',
+        'keyinfo': 'core.handlers.key_info:command_keyinfo',
+        'activekeys': 'core.handlers.active_keys:command_active_keys',
+        'massblock': 'core.handlers.mass_block:command_mass_block',
+        'serverstats': 'core.handlers.server_stats:command_server_stats',
+        'migrateserver': 'core.handlers.migrate_server:command_migrate_server',
+        'seed': 'core.handlers.seed_test_data:command_seed',
+        'unseed': 'core.handlers.unseed_test_data:command_unseed',
+        'addserver': 'core.handlers.add_server:command_addserver',
+        'deleteserver': 'core.handlers.delete_server:deleteserver_handler',
+        'editprice': 'core.handlers.edit_price:editprice_handler',
+        'testkey': 'core.handlers.test_key_broadcast:command_testkey',
+        'jobs': 'core.handlers.jobs:command_jobs',
+        'jobpause': 'core.handlers.jobs:command_job_pause',
+        'jobresume': 'core.handlers.jobs:command_job_resume',
+        'jobcancel': 'core.handlers.jobs:command_job_cancel',
+        'perf': 'core.handlers.perf:command_perf',
+    }
+    for command, path in commands.items():
+        dp.message.register(lazy_handler(path), Command(command))
     
     # 2. Обработчики состояний (FSM) для добавления сервера
     dp.callback_query.register(
-        process_country_choice,
+        lazy_handler('core.handlers.add_server:process_country_choice'),
         lambda c: c.data.startswith('addsvr_')
     )
-    dp.message.register(process_country_ru_input, AddServerStates.waiting_for_country_ru)
-    dp.message.register(process_api_url_input, AddServerStates.waiting_for_api_url)
-    dp.message.register(process_cert_input, AddServerStates.waiting_for_cert)
+    dp.message.register(lazy_handler('core.handlers.add_server:process_country_ru_input'),
+                        AddServerStates.waiting_for_country_ru)
+    dp.message.register(lazy_handler('core.handlers.add_server:process_api_url_input'),
+                        AddServerStates.waiting_for_api_url)
+    dp.message.register(lazy_handler('core.handlers.add_server:process_cert_input'),
+                        AddServerStates.waiting_for_cert)
     
     # 2a. Обработчики состояний (FSM) для редактирования цен
     dp.callback_query.register(
-        select_period_to_edit,
+        lazy_handler('core.handlers.edit_price:select_period_to_edit'),
         lambda c: c.data.startswith('edprc_')
     )
-    dp.message.register(process_new_price, EditPriceStates.waiting_for_new_price)
+    dp.message.register(lazy_handler('core.handlers.edit_price:process_new_price'),
+                        EditPriceStates.waiting_for_new_price)
     
     # 3. Обработчики для тестовых ключей (callback для выбора сервера)
     dp.callback_query.register(
-        process_testkey_server_choice,
+        lazy_handler('core.handlers.test_key_broadcast:process_testkey_server_choice'),
         lambda c: c.data.startswith('testkey_')
     )
     
     # 4. Callback'и для удаления сервера
     dp.callback_query.register(
-        confirm_delete_server,
+        lazy_handler('core.handlers.delete_server:confirm_delete_server'),
         lambda c: c.data.startswith('delsvr_')
     )
     dp.callback_query.register(
-        execute_delete_server,
+        lazy_handler('core.handlers.delete_server:execute_delete_server'),
         lambda c: c.data.startswith('cfmdel_')
     )
     dp.callback_query.register(
-        cancel_delete,
+        lazy_handler('core.handlers.delete_server:cancel_delete'),
         lambda c: c.data == 'cancel_delete'
     )
     
     # 4a. Callback для замены ключа
     dp.callback_query.register(
-        replace_key_handler,
+        lazy_handler('core.handlers.replace_key:replace_key_handler'),
         lambda c: c.data.startswith('rpl_key_')
     )
     
     # 4b. Callback'и для миграции сервера
     dp.callback_query.register(
-        select_source_server,
+        lazy_handler('core.handlers.migrate_server:select_source_server'),
         lambda c: c.data.startswith('migrate_from_')
     )
     dp.callback_query.register(
-        select_target_server,
+        lazy_handler('core.handlers.migrate_server:select_target_server'),
         lambda c: c.data.startswith('migrate_to_')
     )
     dp.callback_query.register(
-        handle_migration_confirmation,
-        lambda c: c.data in ['confirm_migrate', 'cancel_migrate']
+        lazy_handler('core.handlers.migrate_server:handle_migration_confirmation'),
+        lambda c: c.data in ['confirm_migrate', 'cancel_migrate', 'dryrun_migrate']
     )
     
     # 5. Обработчик блокировки с причиной (БЕЗ фильтра, регистрируется ПОСЛЕДНИМ)
-    dp.message.register(command_block_reason)
+    dp.message.register(lazy_handler('core.handlers.admin_block_reason:command_block_reason'))
     
     # 6. Callback query обработчик (общий, регистрируется после специфичных)
-    dp.callback_query.register(build_and_edit_message)
+    dp.callback_query.register(lazy_handler('core.handlers.handler_keyboard:build_and_edit_message'))
 
+    checker_task = None
+    metrics_runner = None
     try:
+        with startup_profiler.phase('init_db'):
+            await init_db()
+        with startup_profiler.phase('metrics_server'):
+            metrics_runner = await start_metrics_server(metrics_port)
+        if run_mode == 'single':
+            # Проверка подписок в этом же цикле событий: общие Bot, движок БД и клиенты Outline
+            with startup_profiler.phase('checker'):
+                from core.check_time_subscribe import check_subscribe_loop
+                checker_task = asyncio.create_task(check_subscribe_loop())
+                checker_task.add_done_callback(_log_checker_exit)
+        # Продолжаем фоновые задачи, прерванные перезапуском
+        with startup_profiler.phase('resume_jobs'):
+            await job_runner.resume_unfinished()
         # Устанавливаем команды бота в меню
-        await setup_bot_commands(bot)
+        with startup_profiler.phase('bot_commands'):
+            await setup_bot_commands(bot)
         
         await send_admin_message(bot, "Бот был запущен.")
-        await dp.start_polling(bot, skip_updates=True)
+        await run_updates(dp)
     finally:
         await send_admin_message(bot, "Бот был остановлен.")
+        if checker_task is not None:
+            checker_task.cancel()
+            await asyncio.gather(checker_task, return_exceptions=True)
+        await job_runner.shutdown()
+        if metrics_runner is not None:
+            await metrics_runner.cleanup()
+        await outbound_queue.drain()
+        await close_outline_managers()
+        await dispose_engine()
         await bot.session.close()
 
 
+def _log_checker_exit(task: asyncio.Task) -> None:
+    """
+    Проверка подписок в режиме single завершилась не по остановке бота — пишем причину в лог
+    """
+    if task.cancelled():
+        return
+    error = task.exception()
+    if error is not None:
+        logger.log('error', f'Subscription checker stopped: {error!r}')
+
+
+async def run_updates(dp) -> None:
+    """
+    Приём обновлений до остановки процесса: polling или webhook (BOT_MODE).
+    В режиме webhook бот техподдержки (если задан SUPPORT_BOT_TOKEN) обслуживается тем же сервером.
+    При YOOKASSA_WEBHOOK этот же сервер принимает уведомления ЮKassa (в любом режиме).
+
+    :param dp: Dispatcher - Диспетчер основного бота
+    """
+    bot = get_bot()
+    if bot_mode != 'webhook' and not yookassa_webhook:
+        startup_profiler.finish()
+        await dp.start_polling(bot, skip_updates=True)
+        return
+
+    from core.webhook import WebhookServer
+
+    server = WebhookServer()
+    if yookassa_webhook:
+        from core.handlers.payment_notification import YOOKASSA_PATH, handle_yookassa_notification
+        server.add_route(YOOKASSA_PATH, handle_yookassa_notification)
+    support = None
+    if bot_mode == 'webhook':
+        server.add_bot('main', bot, dp, drop_pending_updates=True)
+        if support_bot_token:
+            import support_bot as support
+            await support.on_startup()
+            server.add_bot('support', support.bot, support.dp)
+
+    with startup_profiler.phase('webhook_server'):
+        await server.start()
+    startup_profiler.finish()
+    try:
+        if bot_mode == 'webhook':
+            await asyncio.Event().wait()
+        else:
+            await dp.start_polling(bot, skip_updates=True)
+    finally:
+        await server.stop()
+        if support is not None:
+            await support.on_shutdown()
+
+
 if __name__ == '__main__':
     asyncio.run(start_bot())
@@ -1,9 +1,25 @@
 import asyncio
+import time
+from dataclasses import dataclass, field
 from datetime import datetime
-from aiogram import Bot
 
-from core.api_s.outline.outline_api import OutlineManager
-from core.sql.function_db_user_vpn.users_vpn import get_premium_status
+from core.api_s.api_youkassa.payment_sync import payment_sync_loop
+from core.api_s.outline.outline_api import get_outline_manager, close_outline_managers
+from core.metrics_server import start_metrics_server
+from core.settings import metrics_port
+from core.sql.engine import init_db, dispose_engine
+from core.utils.message_queue import outbound_queue, PRIORITY_TRANSACTIONAL
+from logs.log_main import RotatingFileLogger
+
+logger = RotatingFileLogger()
+
+# Размер пачки истёкших записей, обрабатываемой за один запрос
+EXPIRY_BATCH_SIZE = 100
+# Границы паузы между проверками (секунды)
+MIN_CHECK_INTERVAL = 1
+MAX_CHECK_INTERVAL = 5 * 60
+# Сколько ключей одновременно удаляется на одном сервере Outline
+SWEEP_CONCURRENCY_PER_SERVER = 5
 
 
 def check_time_subscribe(date: datetime) -> bool:
@@ -20,100 +36,213 @@ def check_time_subscribe(date: datetime) -> bool:
             return True
 
 
-async def get_and_check_records(all_records: list) -> list:
+def send_notification_to_user(id_user: int) -> None:
     """
-    Отправка на проверку подписки каждой записи из БД
-    :param all_records: Все записи из БД списком
-    :return: Записи на которых закончилась подписка
+    Уведомление пользователя об окончании подписки.
+    Сообщение ставится в очередь отправки, проверка подписок не ждёт доставки.
+    :param id_user: id пользователя
+    :return: None
     """
-    finish_subscribe = []
-    for record in all_records:
-        if check_time_subscribe(record.date):
-            finish_subscribe.append(record)
-    return finish_subscribe
+    text = 'Действие вашего ключа завершено\nВы можете купить новый,\nчто бы продолжить пользоваться сервисом'
+    outbound_queue.send_message(chat_id=id_user, text=text, priority=PRIORITY_TRANSACTIONAL)
 
 
-async def send_notification_to_user(bot: Bot, id_user: int) -> None:
+@dataclass
+class ServerSweepStats:
     """
-    Сообщение администратору о запуске и остановке бота
-    :param bot: объект Bot, полученный при вызове команды.
-    :param id_user: id пользователя
-    :return: None
+    Итог удаления истёкших ключей на одном сервере
     """
-    text = 'Действие вашего ключа завершено\nВы можете купить новый,\nчто бы продолжить пользоваться сервисом'
-    await bot.send_message(chat_id=id_user, text=text)
+    keys: int = 0
+    deleted_on_server: int = 0
+    errors: int = 0
+    seconds: float = 0.0
+
+
+@dataclass
+class SweepResult:
+    """
+    Итог одного прохода проверки подписок
+    """
+    deleted_count: int = 0
+    reset_users: int = 0
+    seconds: float = 0.0
+    servers: dict[str, ServerSweepStats] = field(default_factory=dict)
+
+
+async def _delete_keys_on_server(region_server: str, keys: list, stats: ServerSweepStats) -> None:
+    """
+    Удалить ключи одного сервера на Outline с ограничением параллельных запросов
+
+    :param region_server: str - Регион сервера
+    :param keys: list[UserKey] - Истёкшие ключи этого сервера
+    :param stats: ServerSweepStats - Куда записать счётчики и время
+    """
+    started = time.monotonic()
+    semaphore = asyncio.Semaphore(SWEEP_CONCURRENCY_PER_SERVER)
+
+    async def delete_one(uk) -> None:
+        async with semaphore:
+            try:
+                olm = get_outline_manager(region_server)
+                if await olm.delete_key_by_id(uk.outline_id):
+                    stats.deleted_on_server += 1
+            except Exception as e:
+                stats.errors += 1
+                logger.log('warning', f'Expiry: failed to delete key {uk.outline_id} on {region_server}: {e}')
+
+    await asyncio.gather(*(delete_one(uk) for uk in keys))
+    stats.keys += len(keys)
+    stats.seconds += time.monotonic() - started
+
+
+async def _sweep_keys_batch(due_keys: list, result: SweepResult) -> None:
+    """
+    Обработать пачку истёкших ключей: параллельно по серверам удалить на Outline,
+    одним запросом удалить из БД, сбросить статусы пользователей без ключей и поставить уведомления в очередь
+
+    :param due_keys: list[UserKey] - Пачка истёкших ключей
+    :param result: SweepResult - Итог прохода
+    """
+    from core.sql.function_db_user_vpn.users_vpn import (
+        delete_user_key_records,
+        get_accounts_with_keys,
+        reset_users_state,
+    )
+    by_server: dict[str, list] = {}
+    for uk in due_keys:
+        by_server.setdefault(uk.region_server or 'nederland', []).append(uk)
+
+    await asyncio.gather(*(
+        _delete_keys_on_server(region, keys, result.servers.setdefault(region, ServerSweepStats()))
+        for region, keys in by_server.items()
+    ))
 
+    # Записи в БД удаляются даже если сервер Outline недоступен
+    result.deleted_count += await delete_user_key_records([uk.id for uk in due_keys])
 
-async def finish_set_date_and_premium() -> int:
+    # если после удаления у пользователя не осталось ключей — сбросить статусы и уведомить
+    accounts = list({uk.account for uk in due_keys})
+    still_with_keys = await get_accounts_with_keys(accounts)
+    finished = [account for account in accounts if account not in still_with_keys]
+    result.reset_users += await reset_users_state(finished)
+    for account in finished:
+        send_notification_to_user(id_user=account)
+
+
+async def finish_set_date_and_premium() -> SweepResult:
     """
     Изменение параметров (дата, премиум, ключ) в БД в случае окончания подписки
     Удаление ключа из Outline
 
-    :return: int - Количество удалённых ключей
+    Выбираются только истёкшие записи (запрос по индексу даты) пачками по EXPIRY_BATCH_SIZE,
+    поэтому стоимость зависит от числа истечений, а не от размера таблиц.
+
+    :return: SweepResult - Количество удалённых ключей и время по серверам
     """
     from core.sql.function_db_user_vpn.users_vpn import (
-        get_all_records_from_table_users,
         set_premium_status,
         set_date_to_table_users,
         set_key_to_table_users,
-        get_all_user_keys,
         get_user_keys,
-        delete_user_key_record,
+        get_due_user_keys,
+        get_due_premium_users,
     )
-    from core.bot import bot
-    deleted_count = 0
+    result = SweepResult()
+    started = time.monotonic()
+    now = datetime.now()
     # Сначала обрабатываем истекшие ключи на уровне UserKey
-    all_keys = await get_all_user_keys()
-    for uk in all_keys:
-        if check_time_subscribe(uk.date):
-            # удалить конкретный ключ на Outline и из БД
-            try:
-                olm = OutlineManager(region_server=uk.region_server or 'nederland')
-                try:
-                    olm.delete_key_by_id(uk.outline_id)
-                except Exception:
-                    pass
-            finally:
-                await delete_user_key_record(uk.id)
-                deleted_count += 1
-            # если после удаления у пользователя не осталось ключей — сбросить статусы и уведомить
-            remaining = await get_user_keys(account=uk.account)
-            if not remaining:
-                await set_key_to_table_users(account=uk.account, value_key=None)
-                await set_premium_status(account=uk.account, value_premium=False)
-                await set_date_to_table_users(account=uk.account, value_date=None)
-                await send_notification_to_user(bot=bot, id_user=uk.account)
+    last = None
+    while True:
+        due_keys = await get_due_user_keys(now=now, limit=EXPIRY_BATCH_SIZE, after=last)
+        if not due_keys:
+            break
+        last = (due_keys[-1].date, due_keys[-1].id)
+        await _sweep_keys_batch(due_keys, result)
+        if len(due_keys) < EXPIRY_BATCH_SIZE:
+            break
 
     # Совместимость: если где-то ещё сохраняется Users.date — обработаем и это
-    all_records = await get_all_records_from_table_users()
-    all_finish_records = await get_and_check_records(all_records)
-    if all_finish_records:
-        for record in all_finish_records:
+    last = None
+    while True:
+        due_users = await get_due_premium_users(now=now, limit=EXPIRY_BATCH_SIZE, after=last)
+        if not due_users:
+            break
+        last = (due_users[-1].date, due_users[-1].id)
+        for record in due_users:
             # если у пользователя ещё есть действующие ключи, пропускаем сброс флагов Users
             remaining = await get_user_keys(account=record.account)
             if remaining:
                 continue
-            if await get_premium_status(account=record.account):
-                await set_key_to_table_users(account=record.account, value_key=None)
-                await set_premium_status(account=record.account, value_premium=False)
-                await set_date_to_table_users(account=record.account, value_date=None)
-                olm = OutlineManager(region_server=record.region_server)
-                try:
-                    olm.delete_key_from_ol(id_user=str(record.account))
-                except Exception:
-                    pass
-                await send_notification_to_user(bot=bot, id_user=record.account)
-    return deleted_count
+            await set_key_to_table_users(account=record.account, value_key=None)
+            await set_premium_status(account=record.account, value_premium=False)
+            await set_date_to_table_users(account=record.account, value_date=None)
+            result.reset_users += 1
+            olm = get_outline_manager(record.region_server)
+            try:
+                await olm.delete_key_from_ol(id_user=str(record.account))
+            except Exception:
+                pass
+            send_notification_to_user(id_user=record.account)
+        if len(due_users) < EXPIRY_BATCH_SIZE:
+            break
+    result.seconds = time.monotonic() - started
+    if result.deleted_count or result.reset_users:
+        logger.log('info', f'Expiry sweep: {result}')
+    return result
+
+
+async def get_sleep_seconds() -> float:
+    """
+    Сколько спать до следующей проверки: до ближайшего истечения,
+    но не меньше MIN_CHECK_INTERVAL и не больше MAX_CHECK_INTERVAL
+    (ключи, выданные за это время ботом, подхватываются не позже чем через MAX_CHECK_INTERVAL)
+
+    :return: float - Пауза в секундах
+    """
+    from core.sql.function_db_user_vpn.users_vpn import get_next_expiry
+    now = datetime.now()
+    next_expiry = await get_next_expiry(now=now)
+    if next_expiry is None:
+        return MAX_CHECK_INTERVAL
+    delay = (next_expiry - now).total_seconds()
+    return max(MIN_CHECK_INTERVAL, min(delay, MAX_CHECK_INTERVAL))
+
+
+async def check_subscribe_loop() -> None:
+    """
+    Цикл проверки истёкших подписок и синхронизации платежей (до отмены).
+    БД должна быть инициализирована; ресурсы процесса (движок, клиенты Outline,
+    очередь сообщений) закрывает вызывающий код.
+    :return: None
+    """
+    # Локальный индекс платежей для /findpay обновляется вместе с проверкой подписок
+    sync_task = asyncio.create_task(payment_sync_loop())
+    try:
+        while True:
+            await finish_set_date_and_premium()
+            await asyncio.sleep(await get_sleep_seconds())
+    finally:
+        sync_task.cancel()
+        await asyncio.gather(sync_task, return_exceptions=True)
 
 
 async def main_check_subscribe() -> None:
     """
-    Запуск цикла проверки БД на активную подписку
+    Запуск цикла проверки БД на активную подписку (отдельным процессом)
     :return: None
     """
-    while True:
-        await finish_set_date_and_premium()
-        await asyncio.sleep(5*60)  # Проверка раз в 5 минут
+    await init_db()
+    # Порт рядом с эндпоинтом процесса бота
+    metrics_runner = await start_metrics_server(metrics_port + 1 if metrics_port else 0)
+    try:
+        await check_subscribe_loop()
+    finally:
+        if metrics_runner is not None:
+            await metrics_runner.cleanup()
+        await outbound_queue.drain()
+        await outbound_queue.close()
+        await close_outline_managers()
+        await dispose_engine()
 
 
 if __name__ == '__main__':
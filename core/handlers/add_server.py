@@ -1,11 +1,11 @@
 from aiogram.types import Message, CallbackQuery
 from aiogram.fsm.context import FSMContext
-from aiogram.fsm.state import State, StatesGroup
 from aiogram.utils.keyboard import InlineKeyboardBuilder
-import json
 import traceback
 
+from core.api_s.outline.server_registry import server_registry
 from core.settings import admin_tlg
+from core.handlers.states import AddServerStates
 from logs.log_main import RotatingFileLogger
 
 logger = RotatingFileLogger()
@@ -46,12 +46,6 @@ COUNTRY_FLAGS = {
 }
 
 
-class AddServerStates(StatesGroup):
-    waiting_for_country_ru = State()
-    waiting_for_api_url = State()
-    waiting_for_cert = State()
-
-
 async def command_addserver(message: Message, state: FSMContext) -> None:
     """
     -- Админ-команда --
@@ -236,12 +230,7 @@ async def process_cert_input(message: Message, state: FSMContext) -> None:
         api_url = data.get('api_url', '')
         
         # Читаем текущую конфигурацию
-        config_file = 'core/api_s/outline/settings_api_outline.json'
-        try:
-            with open(config_file, 'r', encoding='utf-8') as f:
-                config = json.load(f)
-        except FileNotFoundError:
-            config = {}
+        config = server_registry.as_config()
 
         # Добавляем новый сервер
         config[country_name] = {
@@ -253,8 +242,7 @@ async def process_cert_input(message: Message, state: FSMContext) -> None:
         }
 
         # Сохраняем конфигурацию
-        with open(config_file, 'w', encoding='utf-8') as f:
-            json.dump(config, f, indent=4, ensure_ascii=False)
+        server_registry.save(config)
 
         await state.clear()
         
@@ -34,10 +34,9 @@ async def command_block_reason(message: Message, state: FSMContext) -> None:
 
         if pending_key_short:
             # Найти полный ID ключа по short_id
-            from core.sql.function_db_user_vpn.users_vpn import get_all_user_keys
+            from core.sql.function_db_user_vpn.users_vpn import get_user_key_by_short_id
             from core.handlers.handlers_keyboards.admin_block_key_handler import perform_block_userkey
-            all_keys = await get_all_user_keys()
-            k = next((uk for uk in all_keys if str(uk.id).endswith(pending_key_short)), None)
+            k = await get_user_key_by_short_id(pending_key_short)
             if k:
                 text, keyboard = await perform_block_userkey(key_id=str(k.id), admin_id=message.from_user.id, reason=reason)
                 await message.answer(text=text, parse_mode=None)
@@ -2,13 +2,14 @@
 Обработчик команды /stats - статистика бота
 """
 from aiogram.types import Message
-from datetime import datetime, timedelta
 import traceback
 
 from core.settings import admin_tlg
-from core.sql.function_db_user_vpn.users_vpn import get_all_records_from_table_users, get_all_user_keys
-from core.sql.function_db_user_payments.users_payments import get_all_user_payments
+from core.sql.function_db_statistics.statistics import get_bot_statistics
 from core.api_s.outline.outline_api import get_server_display_name
+from core.utils.message_queue import outbound_queue
+from core.middlewares.throttling import throttling_middleware
+from core.utils.latency import get_histograms
 from logs.log_main import RotatingFileLogger
 
 logger = RotatingFileLogger()
@@ -24,87 +25,30 @@ async def command_stats(message: Message) -> None:
             await message.answer('❌ У вас нет доступа к этой команде', parse_mode=None)
             return
 
-        # Получаем данные из БД
-        all_users = await get_all_records_from_table_users()
-        all_keys = await get_all_user_keys()
-        all_payments = await get_all_user_payments()
-        
-        now = datetime.now()
-        today_start = now.replace(hour=0, minute=0, second=0, microsecond=0)
-        week_ago = now - timedelta(days=7)
-        month_ago = now - timedelta(days=30)
-        
-        # === ПОЛЬЗОВАТЕЛИ ===
-        total_users = len(all_users) if all_users else 0
-        
-        # Новые пользователи (по created_at если есть, иначе примерная оценка)
-        new_today = 0
-        new_week = 0
-        new_month = 0
-        
-        # === КЛЮЧИ ===
-        total_keys = len(all_keys) if all_keys else 0
-        active_keys = 0
-        expired_keys = 0
-        paid_keys = 0
-        promo_keys_total = 0
-        promo_keys_active = 0
-        
-        # Распределение по серверам (только активные ключи)
+        # Счётчики считаются агрегатными запросами в БД (с коротким кэшем)
+        stats = await get_bot_statistics()
+        now = stats['generated_at']
+        total_users = stats['total_users']
+        premium_users = stats['premium_users']
+        total_keys = stats['total_keys']
+        active_keys = stats['active_keys']
+        expired_keys = stats['expired_keys']
+        paid_keys = stats['paid_keys']
+        promo_keys_total = stats['promo_keys_total']
+        promo_keys_active = stats['promo_keys_active']
+        new_today = stats['new_today']
+        new_week = stats['new_week']
+        new_month = stats['new_month']
+        total_payments = stats['total_payments']
+        payments_today = stats['payments_today']
+        payments_week = stats['payments_week']
+        payments_month = stats['payments_month']
+
+        # Распределение по серверам (только активные ключи), с отображаемым именем и флагом
         server_distribution = {}
-        
-        if all_keys:
-            for key in all_keys:
-                # Проверяем активность
-                is_active = key.date and key.date > now
-                
-                if is_active:
-                    active_keys += 1
-                else:
-                    expired_keys += 1
-                
-                # Тип ключа
-                if key.promo:
-                    promo_keys_total += 1
-                    if is_active:
-                        promo_keys_active += 1
-                else:
-                    paid_keys += 1
-                
-                # Распределение по серверам - ТОЛЬКО АКТИВНЫЕ КЛЮЧИ
-                if is_active:
-                    server = key.region_server or 'unknown'
-                    # Используем отображаемое имя с флагом
-                    server_display = get_server_display_name(server) if server != 'unknown' else 'unknown'
-                    server_distribution[server_display] = server_distribution.get(server_display, 0) + 1
-                
-                # Новые ключи
-                if key.created_at:
-                    if key.created_at >= today_start:
-                        new_today += 1
-                    if key.created_at >= week_ago:
-                        new_week += 1
-                    if key.created_at >= month_ago:
-                        new_month += 1
-        
-        # === ПЛАТЕЖИ ===
-        total_payments = len(all_payments) if all_payments else 0
-        payments_today = 0
-        payments_week = 0
-        payments_month = 0
-        
-        if all_payments:
-            for payment in all_payments:
-                if payment.time_added:
-                    if payment.time_added >= today_start:
-                        payments_today += 1
-                    if payment.time_added >= week_ago:
-                        payments_week += 1
-                    if payment.time_added >= month_ago:
-                        payments_month += 1
-        
-        # === АКТИВНОСТЬ ===
-        premium_users = sum(1 for u in all_users if u.premium) if all_users else 0
+        for server, count in stats['server_distribution'].items():
+            server_display = get_server_display_name(server) if server != 'unknown' else 'unknown'
+            server_distribution[server_display] = server_distribution.get(server_display, 0) + count
         
         # Формируем сообщение
         stats_text = (
@@ -145,6 +89,15 @@ async def command_stats(message: Message) -> None:
                 # Процент от активных ключей, а не от всех
                 percentage = (count / active_keys * 100) if active_keys > 0 else 0
                 stats_text += f"• {server_display}: <b>{count}</b> ({percentage:.1f}%)\n"
+
+        # Доставка рассылок из очереди исходящих сообщений этого процесса
+        stats_text += f"\n📨 <b>РАССЫЛКИ</b>\n• {outbound_queue.stats.as_text()}\n"
+        stats_text += f"\n🚦 <b>ОГРАНИЧЕНИЕ ЧАСТОТЫ</b>\n• {throttling_middleware.stats_text()}\n"
+        yookassa_stats = "\n".join(f"• {name.split('.', 1)[1]}: {histogram.as_text()}"
+                                   for name, histogram in get_histograms("yookassa.").items())
+        if yookassa_stats:
+            stats_text += f"\n💳 <b>ЗАПРОСЫ К ЮKASSA</b>\n{yookassa_stats}\n"
+        stats_text += "\n⏱ Задержки команд и кнопок: /perf\n"
         
         await message.answer(stats_text, parse_mode='HTML')
         logger.log('info', f'Stats viewed by admin {message.from_user.id}')
@@ -1,8 +1,6 @@
 """
 Обработчик команды /deleteserver - удаление Outline сервера
 """
-import json
-import os
 import traceback
 from aiogram import Router
 from aiogram.filters import Command
@@ -10,22 +8,23 @@ from aiogram.types import Message, CallbackQuery
 from aiogram.utils.keyboard import InlineKeyboardBuilder
 
 from core.settings import admin_tlg
-from core.sql.function_db_user_vpn.users_vpn import get_all_records_from_table_users
-from core.sql.base import Users
-from sqlalchemy.orm import Session
-from sqlalchemy import create_engine
-from core.api_s.outline.outline_api import OutlineManager
+from core.sql.function_db_user_vpn.users_vpn import (
+    get_all_records_from_table_users,
+    count_user_keys,
+    get_user_keys_page,
+    get_user_keys,
+    delete_user_key_record,
+    set_premium_status,
+)
+from core.jobs.runner import JobKind, job_runner
+from core.api_s.outline.outline_api import get_outline_manager
+from core.api_s.outline.server_registry import server_registry
 from logs.log_main import RotatingFileLogger
 
 logger = RotatingFileLogger()
 
 router = Router()
 
-# Подключение к БД
-DATABASE_URL = 'sqlite:///olvpnbot.db'
-engine = create_engine(DATABASE_URL, echo=True)
-
-
 @router.message(Command('deleteserver'))
 async def deleteserver_handler(message: Message) -> None:
     """
@@ -34,19 +33,12 @@ async def deleteserver_handler(message: Message) -> None:
     """
     try:
         # Проверка прав администратора
-        admin_tlg = os.getenv('ADMIN_TLG')
         if not admin_tlg or str(message.from_user.id) != str(admin_tlg):
             await message.answer('❌ Эта команда доступна только администратору', parse_mode=None)
             return
 
         # Читаем конфигурацию серверов
-        config_file = 'core/api_s/outline/settings_api_outline.json'
-        try:
-            with open(config_file, 'r', encoding='utf-8') as f:
-                config = json.load(f)
-        except FileNotFoundError:
-            await message.answer('❌ Файл конфигурации серверов не найден', parse_mode=None)
-            return
+        config = server_registry.as_config()
 
         # Фильтруем только активные серверы
         active_servers = {k: v for k, v in config.items() if v.get('is_active', False)}
@@ -111,9 +103,7 @@ async def confirm_delete_server(callback: CallbackQuery) -> None:
         server_name = callback.data.replace('delsvr_', '')
         
         # Читаем конфигурацию
-        config_file = 'core/api_s/outline/settings_api_outline.json'
-        with open(config_file, 'r', encoding='utf-8') as f:
-            config = json.load(f)
+        config = server_registry.as_config()
         
         if server_name not in config:
             await callback.message.edit_text(
@@ -158,10 +148,73 @@ async def confirm_delete_server(callback: CallbackQuery) -> None:
         await callback.message.edit_text('❌ Ошибка при обработке запроса', parse_mode=None)
 
 
+class DeleteServerJob(JobKind):
+    """
+    Удаление всех ключей сервера из Outline и БД, затем удаление сервера из конфигурации.
+    Параметры: server_name
+    """
+    name = 'delete_server'
+    title = '🗑️ Удаление сервера'
+
+    async def count(self, params: dict) -> int:
+        return await count_user_keys(region_server=params['server_name'])
+
+    async def load_batch(self, params: dict, after_id: str | None, limit: int) -> list:
+        return await get_user_keys_page(limit, after_id, region_server=params['server_name'])
+
+    async def process(self, params: dict, key, counters: dict) -> None:
+        account_id = key.account
+        outline_id = key.outline_id
+
+        # Удаляем ключ из Outline VPN
+        if outline_id:
+            try:
+                await get_outline_manager(params['server_name']).delete_key_by_id(outline_id)
+                counters['deleted_keys'] = counters.get('deleted_keys', 0) + 1
+                logger.log('info', f'Deleted Outline key {outline_id} for user {account_id}')
+            except Exception as e:
+                logger.log('error', f'Failed to delete key {outline_id} from Outline: {e}')
+                counters['errors'] = counters.get('errors', 0) + 1
+
+        # Удаляем запись из таблицы UserKey
+        await delete_user_key_record(key.id)
+        counters['deleted_db_keys'] = counters.get('deleted_db_keys', 0) + 1
+        logger.log('info', f'Deleted DB key record {key.id} for user {account_id}')
+
+        # Обновляем статус пользователя (если у него нет других активных ключей)
+        remaining_keys = await get_user_keys(account=account_id)
+        if not any(k.premium for k in remaining_keys):
+            await set_premium_status(account_id, value_premium=False)
+            counters['affected_users'] = counters.get('affected_users', 0) + 1
+            logger.log('info', f'Set premium=False for user {account_id} (no active keys)')
+
+    async def finish(self, params: dict, counters: dict) -> None:
+        # Удаляем сервер из конфигурации
+        config = server_registry.as_config()
+        if config.pop(params['server_name'], None) is not None:
+            server_registry.save(config, indent=2)
+        logger.log('info', f'Server {params["server_name"]} deleted. Keys removed: '
+                           f'{counters.get("deleted_keys", 0)}, errors: {counters.get("errors", 0)}')
+
+    def report(self, params: dict, counters: dict) -> str:
+        text = (
+            f'<b>Сервер:</b> {params["name_ru"]}\n'
+            f'<b>Удалено ключей из Outline:</b> {counters.get("deleted_keys", 0)}\n'
+            f'<b>Удалено записей из БД:</b> {counters.get("deleted_db_keys", 0)}\n'
+            f'<b>Отключено пользователей:</b> {counters.get("affected_users", 0)}\n'
+        )
+        if counters.get('errors'):
+            text += f'<b>Ошибок:</b> {counters["errors"]}\n'
+        return text
+
+
+job_runner.register(DeleteServerJob())
+
+
 @router.callback_query(lambda c: c.data and c.data.startswith('cfmdel_'))
 async def execute_delete_server(callback: CallbackQuery) -> None:
     """
-    Выполняет удаление сервера и всех связанных ключей
+    Запускает фоновую задачу удаления сервера и всех связанных ключей
     """
     try:
         await callback.answer()
@@ -174,105 +227,26 @@ async def execute_delete_server(callback: CallbackQuery) -> None:
             parse_mode=None
         )
         
-        # Читаем конфигурацию
-        config_file = 'core/api_s/outline/settings_api_outline.json'
-        with open(config_file, 'r', encoding='utf-8') as f:
-            config = json.load(f)
+        record = server_registry.get(server_name)
         
-        if server_name not in config:
+        if record is None:
             await callback.message.edit_text(
                 '❌ Сервер не найден в конфигурации',
                 parse_mode=None
             )
             return
         
-        server_data = config[server_name]
-        name_ru = server_data.get('name_ru', server_name)
-        
-        # Получаем все ключи на этом сервере из таблицы UserKey
-        from core.sql.function_db_user_vpn.users_vpn import get_all_user_keys, delete_user_key_record
-        all_keys = await get_all_user_keys()
-        keys_on_server = [k for k in all_keys if k.region_server == server_name]
-        
-        # Инициализируем Outline Manager для этого сервера
-        olm = OutlineManager(server_name)
-        
-        deleted_keys = 0
-        deleted_db_keys = 0
-        errors = 0
-        affected_users = set()
-        
-        # Удаляем ключи из Outline и БД
-        for key in keys_on_server:
-            try:
-                account_id = key.account
-                outline_id = key.outline_id
-                affected_users.add(account_id)
-                
-                # Удаляем ключ из Outline VPN
-                if outline_id:
-                    try:
-                        result = olm.delete_key_by_id(outline_id)
-                        deleted_keys += 1
-                        logger.log('info', f'Deleted Outline key {outline_id} for user {account_id}')
-                    except Exception as e:
-                        logger.log('error', f'Failed to delete key {outline_id} from Outline: {e}')
-                        errors += 1
-                
-                # Удаляем запись из таблицы UserKey
-                try:
-                    await delete_user_key_record(key.id)
-                    deleted_db_keys += 1
-                    logger.log('info', f'Deleted DB key record {key.id} for user {account_id}')
-                except Exception as e:
-                    logger.log('error', f'Failed to delete DB key record {key.id}: {e}')
-                    errors += 1
-                
-            except Exception as e:
-                logger.log('error', f'Error processing key {key.id}: {e}')
-                errors += 1
-        
-        # Обновляем статус пользователей (если у них нет других активных ключей)
-        from core.sql.function_db_user_vpn.users_vpn import get_user_keys, set_premium_status
-        for account_id in affected_users:
-            try:
-                remaining_keys = await get_user_keys(account=account_id)
-                # Проверяем есть ли у пользователя другие активные ключи
-                has_active_keys = any(k.premium for k in remaining_keys)
-                if not has_active_keys:
-                    await set_premium_status(account_id, value_premium=False)
-                    logger.log('info', f'Set premium=False for user {account_id} (no active keys)')
-            except Exception as e:
-                logger.log('error', f'Failed to update user {account_id}: {e}')
-        
-        # Удаляем сервер из конфигурации
-        del config[server_name]
-        
-        # Сохраняем обновленную конфигурацию
-        with open(config_file, 'w', encoding='utf-8') as f:
-            json.dump(config, f, ensure_ascii=False, indent=2)
-        
-        # Формируем итоговое сообщение
-        result_text = (
-            f'✅ <b>Сервер удален</b>\n\n'
-            f'<b>Сервер:</b> {name_ru}\n'
-            f'<b>Удалено ключей из Outline:</b> {deleted_keys}\n'
-            f'<b>Удалено записей из БД:</b> {deleted_db_keys}\n'
-            f'<b>Затронуто пользователей:</b> {len(affected_users)}\n'
+        job_id = await job_runner.submit(
+            'delete_server',
+            {'server_name': server_name, 'name_ru': record.name_ru},
+            chat_id=callback.message.chat.id,
+            message_id=callback.message.message_id,
         )
-        
-        if errors > 0:
-            result_text += f'<b>Ошибок:</b> {errors}\n'
-        
-        result_text += '\n⚠️ Для применения изменений требуется перезапуск бота'
-        
-        await callback.message.edit_text(
-            text=result_text,
-            parse_mode='HTML'
+        await callback.message.answer(
+            f'Задача #{job_id} запущена. Пауза: /jobpause {job_id}, отмена: /jobcancel {job_id}',
+            parse_mode=None
         )
         
-        logger.log('info', f'Server {server_name} deleted. Keys removed: {deleted_keys}, errors: {errors}')
-        
     except Exception as e:
         tb = traceback.format_exc()
         logger.log('error', f'execute_delete_server error: {e}\n{tb}')
@@ -8,10 +8,10 @@ from aiogram import Router
 from aiogram.filters import Command
 from aiogram.types import Message, CallbackQuery
 from aiogram.fsm.context import FSMContext
-from aiogram.fsm.state import State, StatesGroup
 from aiogram.utils.keyboard import InlineKeyboardBuilder
 
 from core.settings import admin_tlg
+from core.handlers.states import EditPriceStates
 from logs.log_main import RotatingFileLogger
 
 logger = RotatingFileLogger()
@@ -20,10 +20,6 @@ router = Router()
 PRICES_FILE = 'core/settings_prices.json'
 
 
-class EditPriceStates(StatesGroup):
-    waiting_for_new_price = State()
-
-
 def load_prices() -> dict:
     """Загрузить цены из JSON файла"""
     try:
@@ -2,8 +2,11 @@ from aiogram.types import Message
 from aiogram.utils.keyboard import InlineKeyboardBuilder
 import traceback
 
-from core.api_s.api_youkassa.youkassa_api import get_user_payments
+from core.api_s.api_youkassa.payment_sync import SYNC_NAME
+from core.api_s.api_youkassa.youkassa_api import build_records_user_payments
+from core.keyboards.callback_data import UserCallback, USER_CHECK
 from core.settings import admin_tlg
+from core.sql.function_db_payments.payments import get_account_payments, get_sync_state
 from core.sql.function_db_user_payments.users_payments import get_all_accounts_from_db
 from core.sql.function_db_user_vpn.users_vpn import get_user_data_from_table_users
 from core.utils.create_view import create_answer_from_html
@@ -19,6 +22,7 @@ async def command_findpay(message: Message) -> None:
     Обработчик команды /findpay <id>.
     Проверяет наличие записей о покупках пользователя по id
     Выдает их если есть с кнопкой для проверки ключа.
+    Платежи берутся из локального индекса (payments), который синхронизируется с ЮKassa.
 
     :param message: Message - Объект Message, полученный при вызове команды.
     """
@@ -33,8 +37,9 @@ async def command_findpay(message: Message) -> None:
                     await message.answer("user_id должен быть числом", parse_mode=None)
                     return
                 
-                # Получаем платежи
-                user_payments = await get_user_payments(find_id=id_find_user_int)
+                # Получаем платежи из локального индекса
+                user_payments = await build_records_user_payments(await get_account_payments(id_find_user_int))
+                sync_state = await get_sync_state(SYNC_NAME)
                 # Получаем имя пользователя
                 user_record = await get_user_data_from_table_users(account=id_find_user_int)
                 user_name = user_record.account_name if user_record else "Unknown"
@@ -42,10 +47,12 @@ async def command_findpay(message: Message) -> None:
                 # Формируем ответ
                 payments_text = "\n".join(user_payments) if user_payments else "нет платежей"
                 response = f"Пользователь: {user_name} (ID: {id_find_user_int})\n\nПлатежи:\n{payments_text}"
+                if sync_state and sync_state.updated_at:
+                    response += f"\n\nИндекс платежей обновлён {sync_state.updated_at.strftime('%d.%m.%y - %H:%M')}"
                 
                 # Создаём кнопку для проверки ключа
                 keyboard = InlineKeyboardBuilder()
-                keyboard.button(text="Проверить ключ /keyinfo", callback_data=f"chk_usr_{id_find_user_int}")
+                keyboard.button(text="Проверить ключ /keyinfo", callback_data=UserCallback(action=USER_CHECK, user_id=id_find_user_int))
                 
                 await message.answer(text=response, reply_markup=keyboard.as_markup(), parse_mode=None)
             elif len(data) == 1:
@@ -62,7 +69,7 @@ async def command_findpay(message: Message) -> None:
                             user_record = await get_user_data_from_table_users(account=user_id_int)
                             user_name = user_record.account_name if user_record else "Unknown"
                             response += f"{user_name} (ID: {user_id_int})\n"
-                            keyboard.button(text=f"{user_name} ({user_id_int})", callback_data=f"chk_usr_{user_id_int}")
+                            keyboard.button(text=f"{user_name} ({user_id_int})", callback_data=UserCallback(action=USER_CHECK, user_id=user_id_int))
                         except:
                             pass
                     keyboard.adjust(1)
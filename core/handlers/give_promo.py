@@ -4,20 +4,16 @@ from datetime import datetime, timedelta
 import traceback
 import uuid
 
-from core.api_s.outline.outline_api import OutlineManager
+from core.api_s.outline.outline_api import get_outline_manager
+from core.keyboards.callback_data import UserCallback, USER_PROMO
 from core.settings import admin_tlg
 from core.sql.function_db_user_vpn.users_vpn import (
-    set_promo_status,
-    set_key_to_table_users,
-    set_premium_status,
-    set_date_to_table_users,
-    set_region_server,
     get_promo_status,
     get_user_data_from_table_users,
-    add_user_key,
     get_region_server,
     get_all_records_from_table_users,
     get_user_keys,
+    update_user_state,
 )
 from logs.log_main import RotatingFileLogger
 
@@ -81,7 +77,7 @@ async def command_promo(message: Message) -> None:
             uname = user.account_name or '—'
             lines.append(f"<b>{idx}.</b> <code>{user.account}</code> | <b>{uname}</b>")
             # Добавляем кнопку промо для каждого пользователя
-            kb.button(text=f"🎁 Промо {user.account}", callback_data=f"give_promo_{user.account}")
+            kb.button(text=f"🎁 Промо {user.account}", callback_data=UserCallback(action=USER_PROMO, user_id=user.account))
         
         lines.append(f"\n<b>Всего пользователей:</b> {len(users_without_paid_keys)}")
         response_text = "\n".join(lines)
@@ -101,7 +97,7 @@ async def command_promo(message: Message) -> None:
                 for idx, user in enumerate(chunk, i+1):
                     uname = user.account_name or '—'
                     chunk_lines.append(f"<b>{idx}.</b> <code>{user.account}</code> | <b>{uname}</b>")
-                    chunk_kb.button(text=f"🎁 Промо {user.account}", callback_data=f"give_promo_{user.account}")
+                    chunk_kb.button(text=f"🎁 Промо {user.account}", callback_data=UserCallback(action=USER_PROMO, user_id=user.account))
                 
                 chunk_kb.adjust(2)
                 await message.answer("\n".join(chunk_lines), reply_markup=chunk_kb.as_markup())
@@ -126,7 +122,8 @@ async def give_promo_to_user(callback: CallbackQuery, target_user_id: int) -> No
     :param target_user_id: int - ID пользователя, которому выдается промо
     """
     try:
-        from core.bot import bot
+        from core.bot import get_bot
+        bot = get_bot()
         
         # Check user exists
         user = await get_user_data_from_table_users(account=target_user_id)
@@ -151,10 +148,10 @@ async def give_promo_to_user(callback: CallbackQuery, target_user_id: int) -> No
         # Create key on Outline server (without key_id, let server generate it)
         # Use unique name for identification
         unique_name = f"{target_user_id}-promo-{uuid.uuid4().hex[:8]}"
-        olm = OutlineManager(region_server=region)
+        olm = get_outline_manager(region)
         try:
             # Create key without key_id parameter - only with name
-            key_data = olm._client.create_key(name=unique_name)
+            key_data = await olm._client.create_key(name=unique_name)
         except Exception as e:
             logger.log('error', f'Promo create_key error for {target_user_id}: {e}')
             await callback.answer(f'❌ Ошибка создания промо-ключа на сервере: {e}', show_alert=True)
@@ -167,20 +164,22 @@ async def give_promo_to_user(callback: CallbackQuery, target_user_id: int) -> No
         # Получаем сгенерированный сервером outline_id (конвертируем в строку)
         outline_id = str(key_data.key_id)
 
-        # Update DB - add to UserKey table and update Users for compatibility
-        await add_user_key(
+        # Update DB - add to UserKey table and update Users for compatibility (one transaction)
+        await update_user_state(
             account=target_user_id,
-            access_url=key_data.access_url,
-            outline_id=outline_id,
+            user_key={
+                'access_url': key_data.access_url,
+                'outline_id': outline_id,
+                'region_server': region,
+                'date': expiry_date,
+                'promo': True,
+            },
+            premium=True,
+            date=expiry_date,
             region_server=region,
-            date_str=fmt(expiry_date),
-            promo=True,
+            key=key_data.access_url,
+            promo_key=True,
         )
-        await set_premium_status(account=target_user_id, value_premium=True)
-        await set_date_to_table_users(account=target_user_id, value_date=fmt(expiry_date))
-        await set_region_server(account=target_user_id, value_region=region)
-        await set_key_to_table_users(account=target_user_id, value_key=key_data.access_url)
-        await set_promo_status(account=target_user_id, value_promo=True)
 
         # Отправляем уведомление пользователю
         try:
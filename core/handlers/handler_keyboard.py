@@ -1,323 +1,362 @@
-import json
-from typing import Callable, Tuple
+from typing import Awaitable, Callable, Tuple
 import traceback
 
+from aiogram.filters.callback_data import CallbackData
 from aiogram.fsm.context import FSMContext
-from aiogram.types import CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton
+from aiogram.types import CallbackQuery, InlineKeyboardMarkup
 from aiogram.utils.keyboard import InlineKeyboardBuilder
 
+from core.api_s.outline.server_registry import server_registry
 from core.handlers.handlers_keyboards.after_pay_handler import pay_check_key
 from core.handlers.handlers_keyboards.back_key_handler import back_key
-from core.handlers.handlers_keyboards.get_key_handler import choise_region, day_key, month_key, year_key, my_key
+from core.handlers.handlers_keyboards.get_key_handler import (
+    choise_region,
+    day_key,
+    month_key,
+    year_key,
+    my_key,
+    replace_key_choose_server,
+    replace_key_execute,
+)
 from core.handlers.handlers_keyboards.del_key_handler import del_key, ask_del_key
 from core.handlers.handlers_keyboards.get_promo_handler import get_promo
 from core.handlers.handlers_keyboards.choise_region import region_handler
-from core.handlers.handlers_keyboards.admin_block_key_handler import admin_block_key_handler
-from core.utils.throttle import throttle
+from core.handlers.handlers_keyboards.admin_block_key_handler import perform_block_user, perform_block_userkey
+from core.keyboards.callback_data import (
+    KeyCallback,
+    UserCallback,
+    decode_legacy,
+    KEY_COPY,
+    KEY_ASK_DELETE,
+    KEY_DELETE,
+    KEY_REPLACE_CHOOSE,
+    KEY_REPLACE_DO,
+    KEY_BLOCK_CONFIRM,
+    KEY_BLOCK,
+    KEY_BLOCK_REASON,
+    KEY_BLOCK_CANCEL,
+    USER_PROMO,
+    USER_CHECK,
+    USER_COPY,
+    USER_BLOCK_CONFIRM,
+    USER_BLOCK,
+    USER_BLOCK_REASON,
+    USER_BLOCK_CANCEL,
+)
+from core.sql.function_db_user_vpn.users_vpn import get_user_key_by_short_id
 from logs.log_main import RotatingFileLogger
 
 logger = RotatingFileLogger()
 
+MenuResult = Tuple[str, InlineKeyboardMarkup] | None
 
-@throttle(seconds=0.2)
-async def build_and_edit_message(call: CallbackQuery, state: FSMContext):
-    """
-    Обработчик для вывода меню и редактирования сообщения.
 
-    :param call: CallbackQuery - Объект CallbackQuery.
-    :param state: FSMContext - Объект FSMContext.
-    """
+def _parse_mode_for(text: str) -> str | None:
+    # Choose parse_mode automatically when templates contain HTML tags
+    return 'HTML' if any(tag in text for tag in ('<a ', '<code>', '<b>', '<i>', '<pre>')) else None
+
+
+# --- Обработчики действий с параметрами (получают разобранный CallbackData) ---
+
+async def _give_promo(call: CallbackQuery, state: FSMContext, cb: UserCallback) -> MenuResult:
     try:
-        await call.answer()
-        data = call.data
-        
-        # Handle promo give callback
-        if data.startswith('give_promo_'):
-            try:
-                user_id = int(data.split('_')[-1])
-                from core.handlers.give_promo import give_promo_to_user
-                await give_promo_to_user(call, user_id)
-            except Exception as e:
-                logger.log('error', f'give_promo callback error: {e}')
-                await call.answer("Ошибка при выдаче промо", show_alert=True)
-            return
-        
-        # Handle docs callback
-        if data == 'docs':
-            try:
-                from core.handlers.docs import docs_handler
-                await docs_handler(call)
-            except Exception as e:
-                logger.log('error', f'docs callback error: {e}')
-                await call.answer("Ошибка при загрузке документации", show_alert=True)
-            return
-        
-        # Handle special callbacks that perform side-effects (copy key, confirmations)
-        if data.startswith('confirm_block_key_'):
-            try:
-                user_id = int(data.split('_')[-1])
-                kb = InlineKeyboardBuilder()
-                kb.button(text='✅ Да, заблокировать', callback_data=f'admin_block_key_{user_id}')
-                kb.button(text='✍️ Заблокировать с причиной', callback_data=f'block_with_reason_{user_id}')
-                kb.button(text='❌ Отмена', callback_data=f'cancel_block_{user_id}')
-                kb.adjust(1)
-                await call.message.answer(text=f'Вы уверены, что хотите заблокировать доступ пользователя {user_id}?', reply_markup=kb.as_markup())
-            except Exception:
-                pass
-            return
+        from core.handlers.give_promo import give_promo_to_user
+        await give_promo_to_user(call, cb.user_id)
+    except Exception as e:
+        logger.log('error', f'give_promo callback error: {e}')
+        await call.answer("Ошибка при выдаче промо", show_alert=True)
 
-        if data.startswith('cfm_blk_'):
-            try:
-                short_id = data.split('_')[-1]  # Последние 8 символов UUID
-                kb = InlineKeyboardBuilder()
-                kb.button(text='✅ Да, заблокировать', callback_data=f'adm_blk_{short_id}')
-                kb.button(text='✍️ С причиной', callback_data=f'blk_rsn_{short_id}')
-                kb.button(text='❌ Отмена', callback_data=f'cnl_blk_{short_id}')
-                kb.adjust(1)
-                await call.message.answer(text=f'Заблокировать выбранный доступ?', reply_markup=kb.as_markup())
-            except Exception:
-                pass
-            return
 
-        if data.startswith('block_with_reason_'):
-            try:
-                user_id = int(data.split('_')[-1])
-                # store pending block request in state and ask admin to send reason
-                await state.update_data(pending_block_user=user_id)
-                await call.message.answer(text=f'Введите причину блокировки для пользователя {user_id}. Отправьте сообщение с текстом причины.', parse_mode=None)
-            except Exception:
-                pass
-            return
+async def _check_user(call: CallbackQuery, state: FSMContext, cb: UserCallback) -> MenuResult:
+    # Вызываем логику keyinfo
+    from core.handlers.key_info import get_key_info_response
+    return await get_key_info_response(cb.user_id)
 
-        if data.startswith('blk_rsn_'):
-            try:
-                short_id = data.split('_')[-1]
-                await state.update_data(pending_block_key_short_id=short_id)
-                await call.message.answer(text='Введите причину блокировки для выбранного доступа.', parse_mode=None)
-            except Exception:
-                pass
-            return
 
-        if data.startswith('cancel_block_'):
-            # simple cancel acknowledgement
-            await call.message.answer(text='Операция блокировки отменена.', parse_mode=None)
-            return
+async def _copy_user_key(call: CallbackQuery, state: FSMContext, cb: UserCallback) -> MenuResult:
+    from core.sql.function_db_user_vpn.users_vpn import get_key_from_table_users
+    key = await get_key_from_table_users(account=cb.user_id)
+    if key:
+        await call.message.answer(text=f"🔑 Доступ для копирования:\n{key}", parse_mode=None)
+    else:
+        await call.message.answer(text="Доступ не найден.", parse_mode=None)
 
-        if data.startswith('cnl_blk_'):
-            await call.message.answer(text='Операция блокировки отменена.', parse_mode=None)
-            return
 
-        if data.startswith('copy_key_'):
-            try:
-                user_id = int(data.split('_')[-1])
-                from core.sql.function_db_user_vpn.users_vpn import get_key_from_table_users
-                key = await get_key_from_table_users(account=user_id)
-                if key:
-                    await call.message.answer(text=f"🔑 Доступ для копирования:\n{key}", parse_mode=None)
-                else:
-                    await call.message.answer(text="Доступ не найден.", parse_mode=None)
-            except Exception:
-                pass
-            # do not edit the menu message
+async def _confirm_block_user(call: CallbackQuery, state: FSMContext, cb: UserCallback) -> MenuResult:
+    kb = InlineKeyboardBuilder()
+    kb.button(text='✅ Да, заблокировать', callback_data=UserCallback(action=USER_BLOCK, user_id=cb.user_id))
+    kb.button(text='✍️ Заблокировать с причиной', callback_data=UserCallback(action=USER_BLOCK_REASON, user_id=cb.user_id))
+    kb.button(text='❌ Отмена', callback_data=UserCallback(action=USER_BLOCK_CANCEL, user_id=cb.user_id))
+    kb.adjust(1)
+    await call.message.answer(text=f'Вы уверены, что хотите заблокировать доступ пользователя {cb.user_id}?', reply_markup=kb.as_markup())
+
+
+async def _block_user(call: CallbackQuery, state: FSMContext, cb: UserCallback) -> MenuResult:
+    return await perform_block_user(user_id=cb.user_id, admin_id=call.from_user.id)
+
+
+async def _block_user_with_reason(call: CallbackQuery, state: FSMContext, cb: UserCallback) -> MenuResult:
+    # store pending block request in state and ask admin to send reason
+    await state.update_data(pending_block_user=cb.user_id)
+    await call.message.answer(text=f'Введите причину блокировки для пользователя {cb.user_id}. Отправьте сообщение с текстом причины.', parse_mode=None)
+
+
+async def _cancel_block(call: CallbackQuery, state: FSMContext, cb: CallbackData) -> MenuResult:
+    await call.message.answer(text='Операция блокировки отменена.', parse_mode=None)
+
+
+async def _copy_key(call: CallbackQuery, state: FSMContext, cb: KeyCallback) -> MenuResult:
+    k = await get_user_key_by_short_id(cb.short_id)
+    if k and k.access_url:
+        await call.message.answer(text=f"🔑 Доступ для копирования:\n{k.access_url}", parse_mode=None)
+    else:
+        await call.message.answer(text="Доступ не найден.", parse_mode=None)
+
+
+async def _ask_delete_key(call: CallbackQuery, state: FSMContext, cb: KeyCallback) -> MenuResult:
+    try:
+        from core.keyboards.accept_del_button import accept_del_userkey_keyboard
+        from core.utils.create_view import create_answer_from_html
+        content = await create_answer_from_html(name_temp='ask_del_key', result='Подтверждаете удаление доступа?')
+        await call.message.edit_text(text=content, reply_markup=accept_del_userkey_keyboard(cb.short_id), parse_mode='HTML')
+    except Exception:
+        # fallback notify
+        try:
+            await call.message.answer(text='Не удалось сформировать подтверждение удаления.', parse_mode=None)
+        except Exception:
+            pass
+
+
+async def _delete_key(call: CallbackQuery, state: FSMContext, cb: KeyCallback) -> MenuResult:
+    try:
+        from core.sql.function_db_user_vpn.users_vpn import (
+            delete_user_key_record,
+            get_user_keys,
+            set_key_to_table_users,
+            set_premium_status,
+            set_region_server,
+            set_date_to_table_users,
+        )
+        from core.api_s.outline.outline_api import get_outline_manager
+
+        # Найдем ключ по short_id
+        k = await get_user_key_by_short_id(cb.short_id)
+        if not k:
+            await call.message.answer(text='Доступ не найден.', parse_mode=None)
             return
 
-        if data.startswith('cpy_k_'):
+        # Удаляем на сервере Outline по outline_id
+        olm = get_outline_manager(k.region_server or 'nederland')
+        try:
+            await olm.delete_key_by_id(k.outline_id)
+        except Exception:
+            # Игнорируем ошибки сервера, продолжаем чистить БД
+            pass
+
+        # Удаляем запись из БД
+        await delete_user_key_record(str(k.id))
+
+        # Синхронизируем поле users_vpn.key и статусы
+        remaining = await get_user_keys(account=k.account)
+        if remaining:
+            # Если в users_vpn.key был удалённый ключ — заменим на любой оставшийся
             try:
-                short_id = data.split('_')[-1]
-                from core.sql.function_db_user_vpn.users_vpn import get_all_user_keys
-                all_keys = await get_all_user_keys()
-                k = next((uk for uk in all_keys if str(uk.id).endswith(short_id)), None)
-                if k and k.access_url:
-                    await call.message.answer(text=f"🔑 Доступ для копирования:\n{k.access_url}", parse_mode=None)
-                else:
-                    await call.message.answer(text="Доступ не найден.", parse_mode=None)
+                await set_key_to_table_users(account=k.account, value_key=remaining[0].access_url)
             except Exception:
                 pass
-            return
+            # Перерисовываем список ключей
+            text, reply_markup = await my_key(call, state)
+            await call.message.edit_text(text=text, reply_markup=reply_markup, parse_mode=_parse_mode_for(text))
+        else:
+            # Ключей больше нет — сбрасываем флаги пользователя
+            await set_key_to_table_users(account=k.account, value_key=None)
+            await set_premium_status(account=k.account, value_premium=False)
+            await set_region_server(account=k.account, value_region=None)
+            await set_date_to_table_users(account=k.account, value_date=None)
 
-        if data.startswith('ask_del_'):
-            try:
-                short_id = data.split('_')[-1]
-                from core.keyboards.accept_del_button import accept_del_userkey_keyboard
-                from core.utils.create_view import create_answer_from_html
-                content = await create_answer_from_html(name_temp='ask_del_key', result='Подтверждаете удаление доступа?')
-                await call.message.edit_text(text=content, reply_markup=accept_del_userkey_keyboard(short_id), parse_mode='HTML')
-            except Exception:
-                # fallback notify
-                try:
-                    await call.message.answer(text='Не удалось сформировать подтверждение удаления.', parse_mode=None)
-                except Exception:
-                    pass
-            return
+            from core.utils.create_view import create_answer_from_html
+            from core.keyboards.start_button import start_keyboard
+            content = await create_answer_from_html(name_temp='del_key', result='удален.')
+            await call.message.edit_text(text=content, reply_markup=start_keyboard(), parse_mode=None)
+    except Exception:
+        tb = traceback.format_exc()
+        logger.log('error', f'del_k error for user {call.from_user.id}, data={call.data}: {tb}')
+        try:
+            await call.message.answer(text='Ошибка при удалении доступа.', parse_mode=None)
+        except Exception:
+            pass
+
+
+async def _replace_choose(call: CallbackQuery, state: FSMContext, cb: KeyCallback) -> MenuResult:
+    return await replace_key_choose_server(call, state, short_id=cb.short_id)
+
+
+async def _replace_do(call: CallbackQuery, state: FSMContext, cb: KeyCallback) -> MenuResult:
+    return await replace_key_execute(call, state, short_id=cb.short_id, new_server=cb.server)
+
+
+async def _confirm_block_key(call: CallbackQuery, state: FSMContext, cb: KeyCallback) -> MenuResult:
+    kb = InlineKeyboardBuilder()
+    kb.button(text='✅ Да, заблокировать', callback_data=KeyCallback(action=KEY_BLOCK, short_id=cb.short_id))
+    kb.button(text='✍️ С причиной', callback_data=KeyCallback(action=KEY_BLOCK_REASON, short_id=cb.short_id))
+    kb.button(text='❌ Отмена', callback_data=KeyCallback(action=KEY_BLOCK_CANCEL, short_id=cb.short_id))
+    kb.adjust(1)
+    await call.message.answer(text=f'Заблокировать выбранный доступ?', reply_markup=kb.as_markup())
+
+
+async def _block_key(call: CallbackQuery, state: FSMContext, cb: KeyCallback) -> MenuResult:
+    # Найти ключ по короткому ID
+    k = await get_user_key_by_short_id(cb.short_id)
+    if k:
+        return await perform_block_userkey(key_id=str(k.id), admin_id=call.from_user.id)
+    return ("Доступ не найден", InlineKeyboardBuilder().as_markup())
+
+
+async def _block_key_with_reason(call: CallbackQuery, state: FSMContext, cb: KeyCallback) -> MenuResult:
+    await state.update_data(pending_block_key_short_id=cb.short_id)
+    await call.message.answer(text='Введите причину блокировки для выбранного доступа.', parse_mode=None)
 
-        if data.startswith('del_k_'):
-            try:
-                short_id = data.split('_')[-1]
-                from core.sql.function_db_user_vpn.users_vpn import (
-                    get_all_user_keys,
-                    get_user_key_by_id,
-                    delete_user_key_record,
-                    get_user_keys,
-                    set_key_to_table_users,
-                    set_premium_status,
-                    set_region_server,
-                    set_date_to_table_users,
-                )
-                from core.api_s.outline.outline_api import OutlineManager
-
-                # Найдем ключ по short_id
-                all_keys = await get_all_user_keys()
-                k = next((uk for uk in all_keys if str(uk.id).endswith(short_id)), None)
-                if not k:
-                    await call.message.answer(text='Доступ не найден.', parse_mode=None)
-                    return
-
-                # Удаляем на сервере Outline по outline_id
-                olm = OutlineManager(region_server=k.region_server or 'nederland')
-                try:
-                    olm.delete_key_by_id(k.outline_id)
-                except Exception:
-                    # Игнорируем ошибки сервера, продолжаем чистить БД
-                    pass
-
-                # Удаляем запись из БД
-                await delete_user_key_record(str(k.id))
-
-                # Синхронизируем поле users_vpn.key и статусы
-                remaining = await get_user_keys(account=k.account)
-                if remaining:
-                    # Если в users_vpn.key был удалённый ключ — заменим на любой оставшийся
-                    try:
-                        await set_key_to_table_users(account=k.account, value_key=remaining[0].access_url)
-                    except Exception:
-                        pass
-                    # Перерисовываем список ключей
-                    from core.handlers.handlers_keyboards.get_key_handler import my_key as my_key_view
-                    text, reply_markup = await my_key_view(call, state)
-                    parse_mode = 'HTML' if any(tag in text for tag in ('<a ', '<code>', '<b>', '<i>', '<pre>')) else None
-                    await call.message.edit_text(text=text, reply_markup=reply_markup, parse_mode=parse_mode)
-                else:
-                    # Ключей больше нет — сбрасываем флаги пользователя
-                    await set_key_to_table_users(account=k.account, value_key=None)
-                    await set_premium_status(account=k.account, value_premium=False)
-                    await set_region_server(account=k.account, value_region=None)
-                    await set_date_to_table_users(account=k.account, value_date=None)
-
-                    from core.utils.create_view import create_answer_from_html
-                    from core.keyboards.start_button import start_keyboard
-                    content = await create_answer_from_html(name_temp='del_key', result='удален.')
-                    await call.message.edit_text(text=content, reply_markup=start_keyboard(), parse_mode=None)
-            except Exception:
-                tb = traceback.format_exc()
-                logger.log('error', f'del_k error for user {call.from_user.id}, data={call.data}: {tb}')
-                try:
-                    await call.message.answer(text='Ошибка при удалении доступа.', parse_mode=None)
-                except Exception:
-                    pass
-            return
 
-        text, reply_markup = await switch_menu(data, call, state)
-        if text != call.message.text:
-            # Choose parse_mode automatically when templates contain HTML tags
-            parse_mode = 'HTML' if any(tag in text for tag in ('<a ', '<code>', '<b>', '<i>', '<pre>')) else None
-            await call.message.edit_text(text=text, reply_markup=reply_markup, parse_mode=parse_mode)
+async def _docs(call: CallbackQuery, state: FSMContext) -> MenuResult:
+    try:
+        from core.handlers.docs import docs_handler
+        await docs_handler(call)
     except Exception as e:
-        tb = traceback.format_exc()
-        logger.log('error', f'build_and_edit_message error for user {call.from_user.id}, data={call.data}: {e}\n{tb}')
+        logger.log('error', f'docs callback error: {e}')
+        await call.answer("Ошибка при загрузке документации", show_alert=True)
 
 
-async def switch_menu(case_number: str, call: CallbackQuery, state: FSMContext) -> Tuple[str, InlineKeyboardMarkup]:
+class CallbackRouter:
     """
-    Выбор обработчика, основываясь на callback-ключе.
+    Таблица маршрутов callback_data, построенная один раз при импорте.
+
+    - Точные маршруты (пункты меню) ищутся по callback_data в словаре.
+    - Действия с параметрами ищутся по (префикс CallbackData, action);
+      старый формат префикс_аргумент разбирается decode_legacy.
+    - Маршруты регионов пересобираются, только когда меняется версия реестра серверов.
+    """
+
+    def __init__(self):
+        self._exact: dict[str, Callable[..., Awaitable[MenuResult]]] = {}
+        self._typed: dict[tuple[str, str], Callable[..., Awaitable[MenuResult]]] = {}
+        self._factories: dict[str, type[CallbackData]] = {}
+        self._regions: dict[str, Callable[..., Awaitable[MenuResult]]] = {}
+        self._regions_version = None
+
+    def exact(self, data: str, handler: Callable[..., Awaitable[MenuResult]]) -> None:
+        self._exact[data] = handler
+
+    def typed(self, factory: type[CallbackData], action: str, handler: Callable[..., Awaitable[MenuResult]]) -> None:
+        prefix = factory.__prefix__
+        self._factories[prefix] = factory
+        self._typed[(prefix, action)] = handler
+
+    def _region_routes(self) -> dict:
+        version = server_registry.get_version()
+        if version != self._regions_version:
+            self._regions = dict(create_region_handler_from_json())
+            self._regions_version = version
+        return self._regions
+
+    def resolve(self, data: str) -> tuple[str, Callable[..., Awaitable[MenuResult]], CallbackData | None] | None:
+        """
+        Найти обработчик для callback_data
+
+        :param data: str - callback_data
+        :return: (имя маршрута, обработчик, CallbackData или None) либо None
+        """
+        handler = self._exact.get(data)
+        if handler is not None:
+            return data, handler, None
+        handler = self._region_routes().get(data)
+        if handler is not None:
+            return 'region', handler, None
+
+        prefix, sep, _ = data.partition(':')
+        factory = self._factories.get(prefix) if sep else None
+        try:
+            cb = factory.unpack(data) if factory is not None else decode_legacy(data)
+        except (TypeError, ValueError):
+            cb = None
+        if cb is None:
+            return None
+        route = f'{cb.__prefix__}:{cb.action}'
+        handler = self._typed.get((cb.__prefix__, cb.action))
+        return (route, handler, cb) if handler is not None else None
+
+    async def dispatch(self, call: CallbackQuery, state: FSMContext) -> None:
+        resolved = self.resolve(call.data or '')
+        if resolved is None:
+            logger.log('warning', f'Unknown callback_data from user {call.from_user.id}: {call.data}')
+            return
+        _, handler, cb = resolved
+        result = await (handler(call, state, cb) if cb is not None else handler(call, state))
+        if result:
+            text, reply_markup = result
+            if text and text != call.message.text:
+                await call.message.edit_text(text=text, reply_markup=reply_markup, parse_mode=_parse_mode_for(text))
+
+
+callback_router = CallbackRouter()
+for _data, _handler in {
+    'get_key': choise_region,
+    'del_key': del_key,
+    'ask_del_key': ask_del_key,
+    'day': day_key,
+    'month': month_key,
+    'year': year_key,
+    'back': back_key,
+    'back_start': back_key,  # Добавлена кнопка "Назад в меню"
+    'pay_check': pay_check_key,
+    'my_key': my_key,
+    'promo': get_promo,
+    'docs': _docs,
+}.items():
+    callback_router.exact(_data, _handler)
+for _factory, _action, _handler in (
+    (UserCallback, USER_PROMO, _give_promo),
+    (UserCallback, USER_CHECK, _check_user),
+    (UserCallback, USER_COPY, _copy_user_key),
+    (UserCallback, USER_BLOCK_CONFIRM, _confirm_block_user),
+    (UserCallback, USER_BLOCK, _block_user),
+    (UserCallback, USER_BLOCK_REASON, _block_user_with_reason),
+    (UserCallback, USER_BLOCK_CANCEL, _cancel_block),
+    (KeyCallback, KEY_COPY, _copy_key),
+    (KeyCallback, KEY_ASK_DELETE, _ask_delete_key),
+    (KeyCallback, KEY_DELETE, _delete_key),
+    (KeyCallback, KEY_REPLACE_CHOOSE, _replace_choose),
+    (KeyCallback, KEY_REPLACE_DO, _replace_do),
+    (KeyCallback, KEY_BLOCK_CONFIRM, _confirm_block_key),
+    (KeyCallback, KEY_BLOCK, _block_key),
+    (KeyCallback, KEY_BLOCK_REASON, _block_key_with_reason),
+    (KeyCallback, KEY_BLOCK_CANCEL, _cancel_block),
+):
+    callback_router.typed(_factory, _action, _handler)
+
+
+async def build_and_edit_message(call: CallbackQuery, state: FSMContext):
+    """
+    Обработчик для вывода меню и редактирования сообщения.
+    Маршрут выбирается по callback_data через callback_router.
 
-    :param case_number: str - Ключ для определения необходимого обработчика.
     :param call: CallbackQuery - Объект CallbackQuery.
     :param state: FSMContext - Объект FSMContext.
-    :return: Результат работы соответствующего обработчика.
     """
     try:
-        # Обработка admin callback'ов для блокировки ключей
-        if case_number.startswith('admin_block_key_'):
-            return await admin_block_key_handler(call)
-        if case_number.startswith('adm_blk_'):
-            short_id = case_number.split('_')[-1]
-            from core.sql.function_db_user_vpn.users_vpn import get_all_user_keys
-            from core.handlers.handlers_keyboards.admin_block_key_handler import perform_block_userkey
-            # Найти ключ по короткому ID
-            all_keys = await get_all_user_keys()
-            k = next((uk for uk in all_keys if str(uk.id).endswith(short_id)), None)
-            if k:
-                text, keyboard = await perform_block_userkey(key_id=str(k.id), admin_id=call.from_user.id)
-                return (text, keyboard)
-            return ("Доступ не найден", InlineKeyboardBuilder().as_markup())
-        
-        # Обработка callback для проверки ключа пользователя (из activekeys)
-        if case_number.startswith('chk_usr_'):
-            user_id = int(case_number.split('_')[-1])
-            # Вызываем логику keyinfo
-            from core.handlers.key_info import get_key_info_response
-            response_text, keyboard = await get_key_info_response(user_id)
-            return (response_text, keyboard)
-        
-        # Обработка замены ключа - выбор сервера
-        if case_number.startswith('replace_choose_'):
-            from core.handlers.handlers_keyboards.get_key_handler import replace_key_choose_server
-            return await replace_key_choose_server(call, state)
-        
-        # Обработка замены ключа - выполнение замены
-        if case_number.startswith('replace_do_'):
-            from core.handlers.handlers_keyboards.get_key_handler import replace_key_execute
-            return await replace_key_execute(call, state)
-        
-        switch_dict = {
-            'get_key': choise_region,
-            'del_key': del_key,
-            'ask_del_key': ask_del_key,
-            'day': day_key,
-            'month': month_key,
-            'year': year_key,
-            'back': back_key,
-            'back_start': back_key,  # Добавлена кнопка "Назад в меню"
-            'pay_check': pay_check_key,
-            'my_key': my_key,
-            'promo': get_promo,
-            'docs': None,  # Обработается отдельно
-        }
-        region_handler_switch = create_region_handler_from_json()
-        if region_handler_switch:
-            for region_switch in region_handler_switch:
-                name = region_switch[0]
-                handler = region_switch[1]
-                switch_dict[name] = handler
-        default_handler: Callable[[CallbackQuery, FSMContext],
-                         Tuple[str, InlineKeyboardMarkup]] = \
-                        lambda call, state: ("", InlineKeyboardMarkup())
-
-        handler: Callable[[CallbackQuery, FSMContext],
-                 Tuple[str, InlineKeyboardMarkup]] = (
-                switch_dict.get(case_number, default_handler))
-
-        return await handler(call, state)
+        await call.answer()
+        await callback_router.dispatch(call, state)
     except Exception as e:
         tb = traceback.format_exc()
-        logger.log('error', f'switch_menu error for user {call.from_user.id}, case={case_number}: {e}\n{tb}')
-        return ("Ошибка при обработке команды", InlineKeyboardBuilder().as_markup())
+        logger.log('error', f'build_and_edit_message error for user {call.from_user.id}, data={call.data}: {e}\n{tb}')
 
 
 def create_region_handler_from_json() -> list:
     """
-    Добавление call-back данных и обработку в switch_menu
+    Добавление call-back данных и обработку в callback_router
     в зависимости от выбранного региона сервера
 
-    Поиск осуществляется в settings_api_outline.json
+    Поиск осуществляется в реестре серверов (settings_api_outline.json)
     В случае если параметр is_active true, добавляет в список
     :return: list - список с call-back данными и обработчиком
     """
-    config_file = 'core/api_s/outline/settings_api_outline.json'
-    with open(config_file, 'r') as f:
-        config = json.load(f)
-    filtered_data = []
-    for value in config.values():
-        if value['is_active']:
-            filtered_data.append((value["name_en"], region_handler))
-    return filtered_data
+    return [(name_en, region_handler) for name_en in server_registry.active_names()]
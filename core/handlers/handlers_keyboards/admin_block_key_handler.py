@@ -2,7 +2,7 @@ from aiogram.types import CallbackQuery
 from aiogram.utils.keyboard import InlineKeyboardBuilder
 from aiogram.types import InlineKeyboardMarkup
 
-from core.api_s.outline.outline_api import OutlineManager
+from core.api_s.outline.outline_api import get_outline_manager
 from core.sql.function_db_user_vpn.users_vpn import (
     get_user_data_from_table_users,
     set_premium_status,
@@ -29,8 +29,8 @@ async def perform_block_user(user_id: int, admin_id: int = None, reason: str = N
             return "❌ У пользователя нет активного ключа", InlineKeyboardBuilder().as_markup()
 
         region_server = user_record.region_server or "nederland"
-        olm = OutlineManager(region_server=region_server)
-        delete_result = olm.delete_key_from_ol(id_user=str(user_id))
+        olm = get_outline_manager(region_server)
+        delete_result = await olm.delete_key_from_ol(id_user=str(user_id))
 
         # Update DB regardless of server result
         await set_premium_status(account=user_id, value_premium=False)
@@ -49,7 +49,8 @@ async def perform_block_user(user_id: int, admin_id: int = None, reason: str = N
         if reason:
             notification_text += f"\n\nПричина: {reason}"
         try:
-            from core.bot import bot
+            from core.bot import get_bot
+            bot = get_bot()
             await bot.send_message(chat_id=user_id, text=notification_text)
         except Exception:
             pass
@@ -85,8 +86,8 @@ async def perform_block_userkey(key_id: str, admin_id: int = None, reason: str =
 
         # Удаляем на сервере Outline по outline_id
         try:
-            olm = OutlineManager(region_server=k.region_server or 'nederland')
-            olm.delete_key_by_id(k.outline_id)
+            olm = get_outline_manager(k.region_server or 'nederland')
+            await olm.delete_key_by_id(k.outline_id)
         except Exception:
             pass
 
@@ -118,7 +119,8 @@ async def perform_block_userkey(key_id: str, admin_id: int = None, reason: str =
             if reason:
                 notification_text += f"\n\nПричина: {reason}"
             try:
-                from core.bot import bot
+                from core.bot import get_bot
+                bot = get_bot()
                 await bot.send_message(chat_id=k.account, text=notification_text)
             except Exception:
                 pass
@@ -159,8 +161,8 @@ async def admin_block_key_handler(call: CallbackQuery) -> tuple[str, InlineKeybo
         region_server = user_record.region_server or "nederland"
         
         # Удаляем ключ из Outline
-        olm = OutlineManager(region_server=region_server)
-        delete_result = olm.delete_key_from_ol(id_user=str(user_id))
+        olm = get_outline_manager(region_server)
+        delete_result = await olm.delete_key_from_ol(id_user=str(user_id))
         
         if delete_result:
             # Выставляем premium статус на False
@@ -169,7 +171,8 @@ async def admin_block_key_handler(call: CallbackQuery) -> tuple[str, InlineKeybo
             # Отправляем уведомление пользователю
             notification_text = 'Действие вашего ключа завершено\nВы можете купить новый,\nчто бы продолжить пользоваться сервисом'
             try:
-                from core.bot import bot
+                from core.bot import get_bot
+                bot = get_bot()
                 await bot.send_message(chat_id=user_id, text=notification_text)
             except Exception as e:
                 # Если не удалось отправить сообщение, продолжаем
@@ -1,48 +1,80 @@
+import asyncio
+import weakref
+
 from aiogram.fsm.context import FSMContext
 from aiogram.types import CallbackQuery
 
 from core.api_s.api_youkassa.youkassa_api import check_payment
 from core.keyboards.start_button import start_keyboard
 from core.keyboards.url_pay_button import url_pay_keyboard_build
-from core.sql.function_db_user_payments.users_payments import add_payment_to_db
+from core.sql.function_db_user_payments.users_payments import add_payment_to_db, is_payment_recorded
 from core.utils.create_view import create_answer_from_html
-from core.utils.get_key_utils import get_future_date, get_ol_key_func
+from core.utils.get_key_utils import get_future_date, get_ol_key_func, format_date
 from core.utils.get_region_name import get_region_name_from_json
 from logs.log_main import RotatingFileLogger
 
 # Use a dedicated payments logger here to avoid circular imports with main
 logger_payments = RotatingFileLogger(config_file='logs/log_settings_payments.json')
 
+# Блокировки по id платежа: кнопка проверки и уведомление ЮKassa не выдают ключ дважды
+_payment_locks: weakref.WeakValueDictionary[str, asyncio.Lock] = weakref.WeakValueDictionary()
+
 
-async def after_pay(call: CallbackQuery, state: FSMContext) -> str:
+async def after_pay(account: int, region_server: str, add_day: int, word_days: str) -> str:
     """
-    Обработчик после успешной проверки оплаты.
+    Выдача ключа после успешной оплаты.
 
-    :param call: CallbackQuery - Объект CallbackQuery.
-    :param state: FSMContext - Объект FSMContext.
-    :return: Текст ответа и клавиатура.
+    :param account: int - id пользователя телеграм.
+    :param region_server: str - Сервер, на котором создать ключ.
+    :param add_day: int - Количество оплаченных дней.
+    :param word_days: str - Склонение слова "день".
+    :return: Текст ответа с ключом.
     """
     name_temp = 'responce_key'
-    data = await state.get_data()
-    region_server = data.get('region_server', 'nederland')
-    add_day = data.get('day_count', 0)
-    word_days = data.get('word_days')
-    region_server = data.get('region_server', 'back')
     region_name = await get_region_name_from_json(region=region_server)
     untill_date = get_future_date(add_day=add_day)
-    key_user = await get_ol_key_func(call=call, region_server=region_server, untill_date=untill_date)
+    key_user = await get_ol_key_func(call=None, account=account, region_server=region_server, untill_date=untill_date)
     content = await create_answer_from_html(name_temp=name_temp, key_user=key_user.access_url,
                                             day_count=add_day, word_days=word_days,
-                                            untill_date=untill_date, region_name=region_name)
+                                            untill_date=format_date(untill_date), region_name=region_name)
     logger_payments.log('info', f'\tRegion: {region_server}\n\tKey: {key_user}')
-    await state.update_data(pay=(None, None))
     return content
 
 
+async def fulfil_payment(payment_id: str, account: int, region_server: str, add_day: int,
+                         word_days: str, payment_date, amount: str = None) -> str | None:
+    """
+    Выдать ключ по оплаченному платежу ровно один раз.
+
+    Вызывается и из ручной проверки (pay_check_key), и из уведомления ЮKassa:
+    платеж, по которому ключ уже выдан (payments.fulfilled_at), повторно не обрабатывается.
+
+    :param payment_id: str - id платежа ЮKassa.
+    :param account: int - id пользователя телеграм.
+    :param region_server: str - Сервер, на котором создать ключ.
+    :param add_day: int - Количество оплаченных дней.
+    :param word_days: str - Склонение слова "день".
+    :param payment_date: Дата создания платежа.
+    :param amount: str - Сумма платежа.
+    :return: Текст ответа с ключом или None, если ключ по платежу уже выдан.
+    """
+    lock = _payment_locks.get(payment_id)
+    if lock is None:
+        lock = _payment_locks[payment_id] = asyncio.Lock()
+    async with lock:
+        if await is_payment_recorded(payment_id):
+            return None
+        content = await after_pay(account, region_server, add_day, word_days)
+        await add_payment_to_db(account=account, payment_key=payment_id, payment_date=payment_date,
+                                amount=amount, period_days=add_day)
+        logger_payments.log('info', f'{account} - Successful payment\n\tPayment ID: {payment_id}\n\tDate & Time: {payment_date}')
+        return content
+
+
 async def pay_check_key(call: CallbackQuery, state: FSMContext) -> tuple:
     """
     Обработчик проверки оплаты (ручная проверка).
-    В случае удачи отправка на генерацию ответа с данными в after_pay
+    В случае удачи выдача ключа через fulfil_payment
     и сохранение записи о покупке в БД.
 
 
@@ -57,9 +89,14 @@ async def pay_check_key(call: CallbackQuery, state: FSMContext) -> tuple:
     if payment_url and payment:
         result_pay = await check_payment(payment.id)
         if result_pay:
-            content = await after_pay(call, state)
-            await add_payment_to_db(account=id_user, payment_key=payment.id, payment_date=payment.created_at)
-            logger_payments.log('info', f'{id_user} - Successful payment\n\tPayment ID: {payment.id}\n\tDate & Time: {payment.created_at}')
+            content = await fulfil_payment(payment.id, account=id_user, region_server=region_server,
+                                           add_day=data.get('day_count', 0), word_days=data.get('word_days'),
+                                           payment_date=payment.created_at,
+                                           amount=str(payment.amount.value))
+            await state.update_data(pay=(None, None))
+            if content is None:
+                # Ключ уже выдан по уведомлению ЮKassa и отправлен отдельным сообщением
+                content = '<b>✅ Оплата получена, доступ уже отправлен вам сообщением.</b>'
             return content, start_keyboard()
         else:
             name_temp = 'error_pay'
@@ -1,7 +1,7 @@
 from aiogram.fsm.context import FSMContext
 from aiogram.types import CallbackQuery, InlineKeyboardMarkup
 
-from core.api_s.outline.outline_api import OutlineManager
+from core.api_s.outline.outline_api import get_outline_manager
 from core.keyboards.accept_del_button import accept_del_keyboard
 from core.keyboards.start_button import start_keyboard
 from core.sql.function_db_user_vpn.users_vpn import set_key_to_table_users, set_premium_status, set_date_to_table_users, \
@@ -23,10 +23,10 @@ async def ask_del_key(call: CallbackQuery, state: FSMContext) -> (str, InlineKey
     """
     data = await state.get_data()
     region_server = data.get('region_server', 'nederland')
-    olm = OutlineManager(region_server=region_server)
+    olm = get_outline_manager(region_server)
     id_user = call.from_user.id
     key_user_db = await get_key_from_table_users(account=id_user)
-    key_user = olm.get_key_from_ol(id_user=str(id_user))
+    key_user = await olm.get_key_from_ol(id_user=str(id_user), with_metrics=False)
     name_temp = call.data
     if key_user and key_user_db:
         result, return_keyboard = 'Подтверждаете удаление доступа?', accept_del_keyboard()
@@ -46,13 +46,13 @@ async def del_key(call: CallbackQuery, state: FSMContext) -> (str, InlineKeyboar
     """
     data = await state.get_data()
     region_server = data.get('region_server', 'nederland')
-    olm = OutlineManager(region_server=region_server)
+    olm = get_outline_manager(region_server)
     id_user = call.from_user.id
     key_user_db = await set_key_to_table_users(account=id_user, value_key=None)
     premium_user_db = await set_premium_status(account=id_user, value_premium=False)
     region_server_to_db = await set_region_server(account=id_user, value_region=None)
     date_user_db = await set_date_to_table_users(account=id_user, value_date=None)
-    key_user = olm.delete_key_from_ol(id_user=str(id_user))
+    key_user = await olm.delete_key_from_ol(id_user=str(id_user))
     name_temp = call.data
     # Consider deletion successful if DB was cleared even if the key was already absent on the server
     if all((key_user_db, premium_user_db,  region_server_to_db, date_user_db)):
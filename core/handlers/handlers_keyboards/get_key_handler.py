@@ -3,10 +3,11 @@ from aiogram.types import CallbackQuery, InlineKeyboardMarkup
 import json
 from datetime import datetime
 
+from core.keyboards.callback_data import KeyCallback, KEY_COPY, KEY_ASK_DELETE, KEY_REPLACE_CHOOSE, KEY_REPLACE_DO
 from core.keyboards.choise_region_button import choise_region_keyboard
 from aiogram.utils.keyboard import InlineKeyboardBuilder
 from aiogram.types import InlineKeyboardButton
-from core.sql.function_db_user_vpn.users_vpn import get_user_data_from_table_users, get_region_server, get_user_keys, get_all_user_keys
+from core.sql.function_db_user_vpn.users_vpn import get_user_data_from_table_users, get_region_server, get_user_keys, get_user_key_by_short_id
 from core.utils.build_pay import build_pay
 from core.utils.create_view import create_answer_from_html
 from core.utils.get_region_name import get_region_name_from_json
@@ -107,26 +108,19 @@ async def year_key(call: CallbackQuery, state: FSMContext) -> (str, InlineKeyboa
     return content, url_pay_keyboard
 
 
-async def replace_key_choose_server(call: CallbackQuery, state: FSMContext) -> (str, InlineKeyboardMarkup):
+async def replace_key_choose_server(call: CallbackQuery, state: FSMContext, short_id: str) -> (str, InlineKeyboardMarkup):
     """
     Показать выбор сервера для замены ключа
     
     :param call: CallbackQuery - Объект CallbackQuery.
     :param state: FSMContext - Объект FSMContext.
+    :param short_id: str - Короткий ID ключа из callback_data.
     :return: Текст ответа и клавиатура.
     """
     from core.api_s.outline.outline_api import get_name_all_active_server_ol, get_server_display_name
     
-    # Извлекаем короткий ID ключа из callback_data
-    short_id = call.data.replace('replace_choose_', '')
-    
     # Находим ключ по короткому ID
-    all_keys = await get_all_user_keys()
-    target_key = None
-    for k in all_keys:
-        if str(k.id)[-8:] == short_id:
-            target_key = k
-            break
+    target_key = await get_user_key_by_short_id(short_id)
     
     if not target_key:
         return ("❌ Доступ не найден", InlineKeyboardBuilder().as_markup())
@@ -148,7 +142,7 @@ async def replace_key_choose_server(call: CallbackQuery, state: FSMContext) -> (
             server_display = get_server_display_name(server)
             kb.row(InlineKeyboardButton(
                 text=server_display,
-                callback_data=f'replace_do_{short_id}_{server}'
+                callback_data=KeyCallback(action=KEY_REPLACE_DO, short_id=short_id, server=server).pack()
             ))
     
     kb.row(InlineKeyboardButton(text='❌ Отмена', callback_data='my_key'))
@@ -156,40 +150,29 @@ async def replace_key_choose_server(call: CallbackQuery, state: FSMContext) -> (
     return ("\n".join(text_lines), kb.as_markup())
 
 
-async def replace_key_execute(call: CallbackQuery, state: FSMContext) -> (str, InlineKeyboardMarkup):
+async def replace_key_execute(call: CallbackQuery, state: FSMContext, short_id: str, new_server: str | None) -> (str, InlineKeyboardMarkup):
     """
     Выполнить замену ключа на выбранном сервере
     
     :param call: CallbackQuery - Объект CallbackQuery.
     :param state: FSMContext - Объект FSMContext.
+    :param short_id: str - Короткий ID ключа из callback_data.
+    :param new_server: str | None - Новый сервер из callback_data.
     :return: Текст ответа и клавиатура.
     """
     import uuid
-    from core.api_s.outline.outline_api import OutlineManager, get_server_display_name
+    from core.api_s.outline.outline_api import get_outline_manager, get_server_display_name
     from core.sql.function_db_user_vpn.users_vpn import delete_user_key_record, add_user_key
     from logs.log_main import RotatingFileLogger
     
     logger = RotatingFileLogger()
     
     try:
-        # Парсим данные: replace_do_{short_id}_{new_server}
-        # Формат: replace_do_abcd1234_nederland или replace_do_abcd1234_nederland2
-        callback_data = call.data
-        # Убираем префикс "replace_do_"
-        parts = callback_data.replace('replace_do_', '', 1).split('_', 1)
-        short_id = parts[0]  # короткий ID ключа (8 символов)
-        new_server = parts[1] if len(parts) > 1 else None  # новый сервер (может содержать _)
-        
         if not new_server:
             return ("❌ Ошибка: не указан сервер", InlineKeyboardBuilder().as_markup())
         
         # Находим ключ по короткому ID
-        all_keys = await get_all_user_keys()
-        target_key = None
-        for k in all_keys:
-            if str(k.id)[-8:] == short_id:
-                target_key = k
-                break
+        target_key = await get_user_key_by_short_id(short_id)
         
         if not target_key:
             return ("❌ Доступ не найден", InlineKeyboardBuilder().as_markup())
@@ -200,9 +183,9 @@ async def replace_key_execute(call: CallbackQuery, state: FSMContext) -> (str, I
         old_date = target_key.date  # Сохраняем дату истечения
         
         # Создаем новый ключ на новом сервере
-        olm_new = OutlineManager(new_server)
+        olm_new = get_outline_manager(new_server)
         unique_name = f"{user_id}-replaced-{uuid.uuid4().hex[:8]}"
-        new_key = olm_new._client.create_key(name=unique_name)
+        new_key = await olm_new._client.create_key(name=unique_name)
         
         if not new_key:
             return ("❌ Не удалось создать новый доступ", InlineKeyboardBuilder().as_markup())
@@ -232,8 +215,8 @@ async def replace_key_execute(call: CallbackQuery, state: FSMContext) -> (str, I
         
         # Удаляем старый ключ из Outline
         try:
-            olm_old = OutlineManager(old_server)
-            olm_old.delete_key_by_id(old_outline_id)
+            olm_old = get_outline_manager(old_server)
+            await olm_old.delete_key_by_id(old_outline_id)
             logger.log('info', f'Deleted old key {old_outline_id} from server {old_server}')
         except Exception as e:
             logger.log('warning', f'Failed to delete old key from Outline: {e}')
@@ -326,13 +309,13 @@ async def my_key(call: CallbackQuery, state: FSMContext) -> (str, InlineKeyboard
             lines.append(f"<a href=\"{k.access_url}\"><code>{k.access_url}</code></a>\n")
             
             # Кнопки по каждому ключу: копировать / удалить / заменить (используем короткие ID)
-            short_id = str(k.id)[-8:]  # Последние 8 символов UUID
+            short_id = k.short_id
             kb.row(
-                InlineKeyboardButton(text=f'📋 Копировать {idx}', callback_data=f'cpy_k_{short_id}'),
-                InlineKeyboardButton(text=f'🗑️ Удалить {idx}', callback_data=f'ask_del_{short_id}')
+                InlineKeyboardButton(text=f'📋 Копировать {idx}', callback_data=KeyCallback(action=KEY_COPY, short_id=short_id).pack()),
+                InlineKeyboardButton(text=f'🗑️ Удалить {idx}', callback_data=KeyCallback(action=KEY_ASK_DELETE, short_id=short_id).pack())
             )
             kb.row(
-                InlineKeyboardButton(text=f'🔄 Заменить {idx}', callback_data=f'replace_choose_{short_id}')
+                InlineKeyboardButton(text=f'🔄 Заменить {idx}', callback_data=KeyCallback(action=KEY_REPLACE_CHOOSE, short_id=short_id).pack())
             )
         
         # Импортируем настройки для получения username чата поддержки
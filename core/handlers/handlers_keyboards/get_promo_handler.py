@@ -4,7 +4,7 @@ from aiogram.types import CallbackQuery, InlineKeyboardMarkup
 from core.keyboards.start_button import start_keyboard
 from core.sql.function_db_user_vpn.users_vpn import get_promo_status, set_promo_status
 from core.utils.create_view import create_answer_from_html
-from core.utils.get_key_utils import get_future_date, get_ol_key_func
+from core.utils.get_key_utils import get_future_date, get_ol_key_func, format_date
 from core.utils.get_region_name import get_region_name_from_json
 
 
@@ -31,5 +31,5 @@ async def get_promo(call: CallbackQuery, state: FSMContext) -> (str, InlineKeybo
         key_user = await get_ol_key_func(call=call, untill_date=untill_date,
                                          region_server=region_server)
         content = await create_answer_from_html(name_temp=name_temp, key_user=key_user.access_url,
-                                                untill_date=untill_date, region_name=region_name)
+                                                untill_date=format_date(untill_date), region_name=region_name)
     return content, start_keyboard()
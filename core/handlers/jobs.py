@@ -0,0 +1,125 @@
+"""
+Команды администратора для фоновых задач: /jobs, /jobpause, /jobresume, /jobcancel
+"""
+from aiogram.filters import CommandObject
+from aiogram.types import Message
+import json
+import traceback
+
+from core.settings import admin_tlg
+from core.jobs.runner import STATUS_TITLES, job_runner
+from core.sql.function_db_jobs.jobs import get_recent_jobs
+from logs.log_main import RotatingFileLogger
+
+logger = RotatingFileLogger()
+
+
+# Действие -> (метод job_runner, текст при успехе, текст при отказе)
+JOB_ACTIONS = {
+    'pause': (job_runner.pause, '⏸ Задача #{job_id} будет поставлена на паузу',
+              '❌ Задачу #{job_id} нельзя поставить на паузу в текущем состоянии'),
+    'resume': (job_runner.resume, '▶️ Задача #{job_id} продолжена',
+               '❌ Задача #{job_id} не на паузе'),
+    'cancel': (job_runner.cancel, '🚫 Задача #{job_id} будет отменена',
+               '❌ Задача #{job_id} уже завершена'),
+}
+
+
+def _is_admin(message: Message) -> bool:
+    return bool(admin_tlg) and str(message.from_user.id) == str(admin_tlg)
+
+
+def _parse_job_id(command: CommandObject) -> int | None:
+    try:
+        return int((command.args or '').strip())
+    except ValueError:
+        return None
+
+
+async def command_jobs(message: Message) -> None:
+    """
+    -- Админ-команда --
+    /jobs
+    Список последних фоновых задач с прогрессом
+    """
+    try:
+        if not _is_admin(message):
+            await message.answer('❌ У вас нет доступа к этой команде', parse_mode=None)
+            return
+
+        jobs = await get_recent_jobs(limit=10)
+        if not jobs:
+            await message.answer('Фоновых задач пока не было', parse_mode=None)
+            return
+
+        lines = ['<b>🧰 Фоновые задачи</b>\n']
+        for job in jobs:
+            kind = job_runner.get_kind(job.kind)
+            title = kind.title if kind else job.kind
+            counters = json.loads(job.counters or '{}')
+            errors = counters.get('errors', 0)
+            line = (f'#{job.id} {title}\n'
+                    f'   {STATUS_TITLES.get(job.status, job.status)}, '
+                    f'{job.processed}/{job.total}, ошибок {errors}, '
+                    f'{job.created_at.strftime("%d.%m %H:%M") if job.created_at else ""}')
+            if job.status in ('failed', 'paused') and job.error:
+                line += f'\n   {job.error[:100]}'
+            lines.append(line)
+        lines.append('\n/jobpause N — пауза, /jobresume N — продолжить, /jobcancel N — отменить')
+        await message.answer('\n'.join(lines), parse_mode='HTML')
+
+    except Exception as e:
+        tb = traceback.format_exc()
+        logger.log('error', f'command_jobs error: {e}\n{tb}')
+        await message.answer('❌ Ошибка при получении списка задач', parse_mode=None)
+
+
+async def _control_job(message: Message, command: CommandObject, action: str) -> None:
+    if not _is_admin(message):
+        await message.answer('❌ У вас нет доступа к этой команде', parse_mode=None)
+        return
+
+    job_id = _parse_job_id(command)
+    if job_id is None:
+        await message.answer(f'Использование: /{command.command} <номер задачи>', parse_mode=None)
+        return
+
+    handler, done_text, fail_text = JOB_ACTIONS[action]
+    if await handler(job_id):
+        logger.log('info', f'Admin {message.from_user.id}: job #{job_id} {action}')
+        await message.answer(done_text.format(job_id=job_id), parse_mode=None)
+    else:
+        await message.answer(fail_text.format(job_id=job_id), parse_mode=None)
+
+
+async def command_job_pause(message: Message, command: CommandObject) -> None:
+    """
+    -- Админ-команда --
+    /jobpause <номер>
+    """
+    try:
+        await _control_job(message, command, 'pause')
+    except Exception as e:
+        logger.log('error', f'command_job_pause error: {e}\n{traceback.format_exc()}')
+
+
+async def command_job_resume(message: Message, command: CommandObject) -> None:
+    """
+    -- Админ-команда --
+    /jobresume <номер>
+    """
+    try:
+        await _control_job(message, command, 'resume')
+    except Exception as e:
+        logger.log('error', f'command_job_resume error: {e}\n{traceback.format_exc()}')
+
+
+async def command_job_cancel(message: Message, command: CommandObject) -> None:
+    """
+    -- Админ-команда --
+    /jobcancel <номер>
+    """
+    try:
+        await _control_job(message, command, 'cancel')
+    except Exception as e:
+        logger.log('error', f'command_job_cancel error: {e}\n{traceback.format_exc()}')
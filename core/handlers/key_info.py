@@ -3,7 +3,8 @@ from aiogram.utils.keyboard import InlineKeyboardBuilder
 import traceback
 
 from core.settings import admin_tlg
-from core.api_s.outline.outline_api import OutlineManager, get_name_all_active_server_ol
+from core.api_s.outline.outline_api import get_outline_manager, get_name_all_active_server_ol
+from core.keyboards.callback_data import KeyCallback, UserCallback, KEY_BLOCK_CONFIRM, USER_BLOCK_CONFIRM
 from core.sql.function_db_user_vpn.users_vpn import get_all_records_from_table_users, get_user_keys
 from core.utils.create_view import create_answer_from_html
 from logs.log_main import RotatingFileLogger
@@ -50,8 +51,8 @@ async def get_key_info_response(user_id: int) -> tuple:
         
         for idx, uk in enumerate(user_keys, 1):
             try:
-                olm = OutlineManager(region_server=uk.region_server or 'nederland')
-                outline_key = olm.get_key_by_id(uk.outline_id)
+                olm = get_outline_manager(uk.region_server or 'nederland')
+                outline_key = await olm.get_key_by_id(uk.outline_id)
                 used_bytes = getattr(outline_key, 'used_bytes', 0) or 0
                 used_gb = used_bytes / (1024**3)
                 
@@ -99,9 +100,9 @@ async def get_key_info_response(user_id: int) -> tuple:
                 )
             # Добавляем кнопки для каждого ключа
             # uk.id формата "{account}_key_{uuid}", берем последние 8 символов полного ID
-            short_id = str(uk.id)[-8:]
+            short_id = uk.short_id
             keyboard.button(text=f"🔁 Заменить ключ {idx}", callback_data=f"rpl_key_{short_id}")
-            keyboard.button(text=f"🔒 Заблокировать {idx}", callback_data=f"cfm_blk_{short_id}")
+            keyboard.button(text=f"🔒 Заблокировать {idx}", callback_data=KeyCallback(action=KEY_BLOCK_CONFIRM, short_id=short_id))
         keyboard.adjust(2)  # 2 кнопки в ряд для каждого ключа
         return ("\n".join(parts), keyboard.as_markup())
     except Exception as e:
@@ -158,6 +159,6 @@ def create_key_info_keyboard(user_id: int) -> InlineKeyboardMarkup:
     keyboard_builder = InlineKeyboardBuilder()
     keyboard_builder.button(
         text='🔒 Заблокировать ключ',
-        callback_data=f'confirm_block_key_{user_id}'
+        callback_data=UserCallback(action=USER_BLOCK_CONFIRM, user_id=user_id)
     )
     return keyboard_builder.as_markup()
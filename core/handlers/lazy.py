@@ -0,0 +1,32 @@
+"""
+Ленивая регистрация обработчиков: модуль обработчика импортируется при первом
+событии, а не при импорте core.bot (команды администратора нужны редко, а тянут
+yookassa, Jinja2 и клиенты Outline).
+"""
+import importlib
+
+from aiogram.dispatcher.event.handler import CallableObject
+
+
+def lazy_handler(path: str):
+    """
+    Обработчик, загружающий функцию "модуль:имя" при первом вызове
+
+    Аргументы (state, bot, ...) подставляются так же, как aiogram подставил бы их
+    самой функции.
+
+    :param path: str - Например "core.handlers.get_db:command_get_db"
+    :return: Корутина-обработчик для dp.message.register / dp.callback_query.register
+    """
+    module_name, _, name = path.partition(':')
+    target: CallableObject | None = None
+
+    async def handler(event, **kwargs):
+        nonlocal target
+        if target is None:
+            target = CallableObject(getattr(importlib.import_module(module_name), name))
+        return await target.call(event, **kwargs)
+
+    handler.__name__ = name
+    handler.__qualname__ = path
+    return handler
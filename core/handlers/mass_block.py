@@ -1,31 +1,40 @@
-from aiogram.types import Message
-import traceback
-
-from core.settings import admin_tlg
-from logs.log_main import RotatingFileLogger
-
-logger = RotatingFileLogger()
-
-
-async def command_mass_block(message: Message) -> None:
-    """
-    Команда администратора для немедленной массовой блокировки всех просроченных подписок.
-    """
-    try:
-        if not admin_tlg or message.from_user.id != int(admin_tlg):
-            await message.answer('У вас нет доступа к этой команде', parse_mode=None)
-            return
-        from core.check_time_subscribe import finish_set_date_and_premium
-        deleted_count = await finish_set_date_and_premium()
-        
-        if deleted_count == 0:
-            await message.answer('✅ Просроченные ключи не найдены', parse_mode=None)
-        else:
-            await message.answer(f'✅ Массовая проверка выполнена.\n🔒 Заблокировано просроченных ключей: {deleted_count}', parse_mode=None)
-    except Exception as e:
-        tb = traceback.format_exc()
-        logger.log('error', f'command_mass_block error for admin {message.from_user.id}: {e}\n{tb}')
-        try:
-            await message.answer('Ошибка при выполнении массовой блокировки.', parse_mode=None)
-        except:
-            pass
+from aiogram.types import Message
+import traceback
+
+from core.settings import admin_tlg
+from logs.log_main import RotatingFileLogger
+
+logger = RotatingFileLogger()
+
+
+async def command_mass_block(message: Message) -> None:
+    """
+    Команда администратора для немедленной массовой блокировки всех просроченных подписок.
+    """
+    try:
+        if not admin_tlg or message.from_user.id != int(admin_tlg):
+            await message.answer('У вас нет доступа к этой команде', parse_mode=None)
+            return
+        from core.check_time_subscribe import finish_set_date_and_premium
+        result = await finish_set_date_and_premium()
+
+        if result.deleted_count == 0:
+            await message.answer('✅ Просроченные ключи не найдены', parse_mode=None)
+        else:
+            lines = [
+                '✅ Массовая проверка выполнена.',
+                f'🔒 Заблокировано просроченных ключей: {result.deleted_count}',
+                f'⏱ Время: {result.seconds:.2f} с',
+                '',
+            ]
+            for region, stats in sorted(result.servers.items()):
+                lines.append(f'{region}: ключей {stats.keys}, удалено на сервере {stats.deleted_on_server}, '
+                             f'ошибок {stats.errors}, {stats.seconds:.2f} с')
+            await message.answer('\n'.join(lines), parse_mode=None)
+    except Exception as e:
+        tb = traceback.format_exc()
+        logger.log('error', f'command_mass_block error for admin {message.from_user.id}: {e}\n{tb}')
+        try:
+            await message.answer('Ошибка при выполнении массовой блокировки.', parse_mode=None)
+        except:
+            pass
@@ -7,282 +7,255 @@ from datetime import datetime, timedelta
 from aiogram import types
 from aiogram.filters import Command
 
-from core.api_s.outline.outline_api import OutlineManager, get_name_all_active_server_ol
+from core.api_s.outline.outline_api import get_outline_manager, get_name_all_active_server_ol
 from core.sql.function_db_user_vpn.users_vpn import (
     get_all_records_from_table_users,
     get_user_keys,
     get_all_user_keys,
+    count_users,
+    get_users_page,
 )
-from core.sql.function_db_user_payments.users_payments import get_all_user_payments
+from core.sql.function_db_user_payments.users_payments import get_all_user_payments, get_payment_time_added
+from core.jobs.runner import JobKind, job_runner
 from core.sql.base import Users, UserKey
+from core.sql.engine import async_session
 from core.settings import admin_tlg
-from sqlalchemy.orm import Session
-from sqlalchemy import create_engine
+from sqlalchemy import update
 from logs.log_main import RotatingFileLogger
 
-# Инициализируем движок БД и логгер
-engine = create_engine('sqlite:///olvpnbot.db')
 logger = RotatingFileLogger()
 
 
-async def command_migrate(message: types.Message):
-    """
-    Команда миграции старых ключей в новую систему.
-    Доступна только администратору.
-    
-    Процесс:
-    1. Находит всех пользователей со старым полем Users.key
-    2. Проверяет наличие ключа на Outline сервере
-    3. Создает запись в UserKey с сохранением всех параметров
-    4. НЕ удаляет старые данные (для безопасности)
-    """
-    # Проверка прав администратора
-    if str(message.from_user.id) != admin_tlg:
-        await message.answer("❌ Эта команда доступна только администратору")
-        return
+# Сколько строк детального отчёта хранится в счётчиках задачи
+MIGRATION_DETAILS_LIMIT = 20
 
-    await message.answer("🔄 Начинаю миграцию старых ключей...\n\n⏳ Сканирую базу данных...")
 
-    # Статистика миграции
-    stats = {
-        'total_users': 0,
-        'users_with_old_keys': 0,
-        'already_migrated': 0,
-        'successfully_migrated': 0,
-        'failed_migrations': 0,
-        'key_not_found_on_server': 0,
-        'with_payment_date': 0,
-        'estimated_date': 0,
-    }
+def _add_detail(counters: dict, detail: str) -> None:
+    details = counters.setdefault('details', [])
+    if len(details) < MIGRATION_DETAILS_LIMIT:
+        details.append(detail)
+    else:
+        counters['details_more'] = counters.get('details_more', 0) + 1
 
-    try:
-        # Получаем всех пользователей и платежи
-        all_users = await get_all_records_from_table_users()
-        all_payments = await get_all_user_payments()
-        stats['total_users'] = len(all_users)
-        
-        # Создаем мапу платежей по account_id
-        payment_map = {}
-        for payment in all_payments:
-            if payment.time_added:
-                payment_map[payment.account_id] = payment.time_added
 
-        logger.log('info', f"[MIGRATION] Начало миграции. Всего пользователей: {stats['total_users']}, платежей: {len(all_payments)}")
+def _increment(counters: dict, name: str) -> None:
+    counters[name] = counters.get(name, 0) + 1
 
-        # Список для детального отчета
-        migration_details = []
 
-        with Session(engine) as session:
-            for user in all_users:
-                # Проверяем наличие старого ключа
-                if not user.key:
-                    continue
+async def _find_old_key(user) -> tuple:
+    """
+    Найти старый ключ пользователя на серверах Outline
 
-                stats['users_with_old_keys'] += 1
+    :param user: Users - Пользователь со старым полем Users.key
+    :return: tuple - (OutlineKey | None, сервер где найден | None, сервер из БД, попытки поиска)
+    """
+    # Получаем список всех активных серверов для поиска
+    all_servers = get_name_all_active_server_ol()
+
+    # Приоритет поиска: сначала на указанном сервере, потом на остальных
+    region_server = user.region_server if user.region_server else 'nederland'
+    search_order = [region_server] + [s for s in all_servers if s != region_server]
+
+    all_search_attempts = []
+    for server in search_order:
+        try:
+            # Инициализируем Outline Manager для текущего сервера
+            outline_manager = get_outline_manager(server)
+            outline_key = None
+
+            # Используем стратегию множественных попыток:
+            search_strategies = []
+
+            # Стратегия 1: Users.key содержит outline_id напрямую
+            if user.key.isdigit():
+                outline_key = await outline_manager.get_key_by_id(user.key, with_metrics=False)
+                if outline_key:
+                    search_strategies.append(f"outline_id={user.key}")
+
+            # Стратегия 2: Users.key содержит access_url
+            if outline_key is None and user.key.startswith('ss://'):
+                try:
+                    outline_key = await outline_manager.get_key_from_ol(str(user.account), with_metrics=False)
+                    if outline_key:
+                        search_strategies.append(f"by_account={user.account}")
+                except Exception:
+                    pass
+
+            # Стратегия 3: Поиск по account ID
+            if outline_key is None:
+                outline_key = await outline_manager.get_key_from_ol(str(user.account), with_metrics=False)
+                if outline_key:
+                    search_strategies.append(f"by_account={user.account}")
+
+            # Стратегия 4: Поиск по UUID
+            if outline_key is None and user.id:
+                outline_key = await outline_manager.get_key_by_id(user.id, with_metrics=False)
+                if outline_key:
+                    search_strategies.append(f"by_uuid={user.id}")
+
+            # Если ключ найден на этом сервере
+            if outline_key is not None:
+                all_search_attempts.append(f"{server}:✅")
+                logger.log('info',
+                    f"[MIGRATION] Ключ пользователя {user.account} найден на сервере '{server}' "
+                    f"(в БД указан '{region_server}'). Стратегии: {' → '.join(search_strategies)}"
+                )
+                return outline_key, server, region_server, all_search_attempts
+            all_search_attempts.append(f"{server}:❌")
 
-                # Проверяем, есть ли УЖЕ ЭТОТ КОНКРЕТНЫЙ ключ в новой системе
-                existing_keys = await get_user_keys(user.account)
-                already_migrated = False
-                
-                if existing_keys:
-                    # Проверяем есть ли среди существующих ключей тот же самый
-                    for existing_key in existing_keys:
-                        # Сравниваем по access_url или по старому формату Users.key
-                        if (existing_key.access_url == user.key or 
-                            user.key.startswith('ss://') and existing_key.access_url == user.key):
-                            already_migrated = True
-                            break
-                
-                if already_migrated:
-                    stats['already_migrated'] += 1
-                    logger.log('info', f"[MIGRATION] Ключ пользователя {user.account} уже мигрирован")
-                    continue
+        except Exception as e:
+            all_search_attempts.append(f"{server}:⚠️")
+            logger.log('warning', f"[MIGRATION] Ошибка поиска на '{server}' для {user.account}: {e}")
 
-                # Получаем список всех активных серверов для поиска
-                all_servers = get_name_all_active_server_ol()
-                
-                # Приоритет поиска: сначала на указанном сервере, потом на остальных
-                region_server = user.region_server if user.region_server else 'nederland'
-                search_order = [region_server] + [s for s in all_servers if s != region_server]
-                
-                # Попытка найти ключ на серверах
-                outline_key = None
-                found_on_server = None
-                all_search_attempts = []
-                
-                for server in search_order:
-                    try:
-                        # Инициализируем Outline Manager для текущего сервера
-                        outline_manager = OutlineManager(region_server=server)
-                        
-                        # Используем стратегию множественных попыток:
-                        search_strategies = []
-                        
-                        # Стратегия 1: Users.key содержит outline_id напрямую
-                        if user.key.isdigit():
-                            outline_key = outline_manager.get_key_by_id(user.key)
-                            if outline_key:
-                                search_strategies.append(f"outline_id={user.key}")
-                        
-                        # Стратегия 2: Users.key содержит access_url
-                        if outline_key is None and user.key.startswith('ss://'):
-                            try:
-                                outline_key = outline_manager.get_key_from_ol(str(user.account))
-                                if outline_key:
-                                    search_strategies.append(f"by_account={user.account}")
-                            except Exception:
-                                pass
-                        
-                        # Стратегия 3: Поиск по account ID
-                        if outline_key is None:
-                            outline_key = outline_manager.get_key_from_ol(str(user.account))
-                            if outline_key:
-                                search_strategies.append(f"by_account={user.account}")
-                        
-                        # Стратегия 4: Поиск по UUID
-                        if outline_key is None and user.id:
-                            outline_key = outline_manager.get_key_by_id(user.id)
-                            if outline_key:
-                                search_strategies.append(f"by_uuid={user.id}")
-                        
-                        # Если ключ найден на этом сервере
-                        if outline_key is not None:
-                            found_on_server = server
-                            all_search_attempts.append(f"{server}:✅")
-                            logger.log('info', 
-                                f"[MIGRATION] Ключ пользователя {user.account} найден на сервере '{server}' "
-                                f"(в БД указан '{region_server}'). Стратегии: {' → '.join(search_strategies)}"
-                            )
-                            break
-                        else:
-                            all_search_attempts.append(f"{server}:❌")
-                    
-                    except Exception as e:
-                        all_search_attempts.append(f"{server}:⚠️")
-                        logger.log('warning', f"[MIGRATION] Ошибка поиска на '{server}' для {user.account}: {e}")
-                        continue
-                
-                # Если ключ не найден ни на одном сервере
-                try:
-                    if outline_key is None:
-                        stats['key_not_found_on_server'] += 1
-                        attempts_str = " ".join(all_search_attempts)
-                        migration_details.append(
-                            f"❌ @{user.account_name} (ID: {user.account}): "
-                            f"ключ не найден (попытки: {attempts_str})"
-                        )
-                        logger.log('warning',
-                            f"[MIGRATION] Ключ пользователя {user.account} не найден ни на одном сервере. "
-                            f"Попытки: {attempts_str}, старый key={user.key[:50]}"
-                        )
-                        continue
-
-                    # Определяем дату создания ключа
-                    # Приоритет 1: Реальная дата из платежей
-                    if user.account in payment_map:
-                        estimated_created = payment_map[user.account]
-                        stats['with_payment_date'] += 1
-                    # Приоритет 2: Вычисляем по дате истечения
-                    elif user.date:
-                        # Предполагаем что ключ был создан за 30 дней до истечения
-                        estimated_created = user.date - timedelta(days=30)
-                        stats['estimated_date'] += 1
-                    # Приоритет 3: Ставим старую дату
-                    else:
-                        estimated_created = datetime.now() - timedelta(days=365)
-                        stats['estimated_date'] += 1
-
-                    # Создаем новую запись в UserKey с РЕАЛЬНЫМ регионом где найден ключ
-                    new_key_record = UserKey(
-                        id=str(uuid.uuid4()),
-                        account=user.account,
-                        access_url=outline_key.access_url,
-                        outline_id=outline_key.key_id,
-                        region_server=found_on_server,  # Используем сервер где РЕАЛЬНО нашли ключ
-                        premium=user.premium,
-                        date=user.date,
-                        promo=user.promo_key,
-                        created_at=estimated_created,
-                    )
+    return None, None, region_server, all_search_attempts
 
-                    session.add(new_key_record)
-                    session.commit()
 
-                    stats['successfully_migrated'] += 1
-                    server_note = f" (переназначен с '{region_server}')" if found_on_server != region_server else ""
-                    migration_details.append(
-                        f"✅ @{user.account_name} (ID: {user.account}): "
-                        f"мигрирован на {found_on_server}{server_note}"
-                    )
-                    logger.log('info',
-                        f"[MIGRATION] Успешно мигрирован ключ пользователя {user.account} "
-                        f"(outline_id: {outline_key.key_id}, РЕАЛЬНЫЙ сервер: {found_on_server}, "
-                        f"БД указан: {region_server}, premium: {user.premium}, date: {user.date})"
-                    )
-                    new_key_record = UserKey(
-                        id=str(uuid.uuid4()),
-                        account=user.account,
-                        access_url=outline_key.access_url,
-                        outline_id=outline_key.key_id,
-                        region_server=region_server,
-                        premium=user.premium,
-                        date=user.date,
-                        promo=user.promo_key,  # Если был промо, сохраняем флаг
-                        created_at=estimated_created,  # Используем реальную или вычисленную дату
-                    )
+class MigrateOldKeysJob(JobKind):
+    """
+    Перенос старых ключей из Users.key в user_keys (по одному пользователю за шаг)
+    """
+    name = 'migrate_old_keys'
+    title = '🔄 Миграция старых ключей'
 
-                    session.add(new_key_record)
-                    session.commit()
+    async def count(self, params: dict) -> int:
+        return await count_users(with_key=True)
 
-                    stats['successfully_migrated'] += 1
-                    migration_details.append(
-                        f"✅ @{user.account_name} (ID: {user.account}): "
-                        f"мигрирован на {region_server} (outline_id: {outline_key.key_id})"
-                    )
-                    logger.log('info',
-                        f"[MIGRATION] Успешно мигрирован ключ пользователя {user.account} "
-                        f"(outline_id: {outline_key.key_id}, region: {region_server}, "
-                        f"premium: {user.premium}, date: {user.date})"
-                    )
+    async def load_batch(self, params: dict, after_id: str | None, limit: int) -> list:
+        return await get_users_page(limit, after_id, with_key=True)
 
-                except Exception as e:
-                    stats['failed_migrations'] += 1
-                    migration_details.append(
-                        f"❌ @{user.account_name} (ID: {user.account}): ошибка - {str(e)[:50]}"
-                    )
-                    logger.log('error',
-                        f"[MIGRATION] Ошибка миграции ключа пользователя {user.account}: {e}"
-                    )
-                    session.rollback()
+    async def process(self, params: dict, user, counters: dict) -> None:
+        _increment(counters, 'users_with_old_keys')
 
-        # Формируем финальный отчет
-        report = f"""
-📊 <b>Отчет о миграции ключей</b>
+        # Проверяем, есть ли УЖЕ ЭТОТ КОНКРЕТНЫЙ ключ в новой системе
+        existing_keys = await get_user_keys(user.account)
+        if any(existing_key.access_url == user.key for existing_key in existing_keys):
+            _increment(counters, 'already_migrated')
+            logger.log('info', f"[MIGRATION] Ключ пользователя {user.account} уже мигрирован")
+            return
 
-👥 Всего пользователей в БД: {stats['total_users']}
-🔑 Пользователей со старыми ключами: {stats['users_with_old_keys']}
+        outline_key, found_on_server, region_server, all_search_attempts = await _find_old_key(user)
 
-✅ Успешно мигрировано: {stats['successfully_migrated']}
-  📅 С реальной датой покупки: {stats['with_payment_date']}
-  📊 С вычисленной датой: {stats['estimated_date']}
-🔄 Уже были мигрированы: {stats['already_migrated']}
-❌ Ошибки миграции: {stats['failed_migrations']}
-🔍 Ключей не найдено на сервере: {stats['key_not_found_on_server']}
+        # Если ключ не найден ни на одном сервере
+        if outline_key is None:
+            _increment(counters, 'key_not_found_on_server')
+            attempts_str = " ".join(all_search_attempts)
+            _add_detail(counters,
+                f"❌ @{user.account_name} (ID: {user.account}): "
+                f"ключ не найден (попытки: {attempts_str})"
+            )
+            logger.log('warning',
+                f"[MIGRATION] Ключ пользователя {user.account} не найден ни на одном сервере. "
+                f"Попытки: {attempts_str}, старый key={user.key[:50]}"
+            )
+            return
+
+        try:
+            # Определяем дату создания ключа
+            # Приоритет 1: Реальная дата из платежей
+            payment_date = await get_payment_time_added(user.account)
+            if payment_date:
+                estimated_created = payment_date
+                _increment(counters, 'with_payment_date')
+            # Приоритет 2: Вычисляем по дате истечения
+            elif user.date:
+                # Предполагаем что ключ был создан за 30 дней до истечения
+                estimated_created = user.date - timedelta(days=30)
+                _increment(counters, 'estimated_date')
+            # Приоритет 3: Ставим старую дату
+            else:
+                estimated_created = datetime.now() - timedelta(days=365)
+                _increment(counters, 'estimated_date')
+
+            # Создаем новую запись в UserKey с РЕАЛЬНЫМ регионом где найден ключ
+            async with async_session() as session:
+                session.add(UserKey(
+                    id=str(uuid.uuid4()),
+                    account=user.account,
+                    access_url=outline_key.access_url,
+                    outline_id=outline_key.key_id,
+                    region_server=found_on_server,  # Используем сервер где РЕАЛЬНО нашли ключ
+                    premium=user.premium,
+                    date=user.date,
+                    promo=user.promo_key,
+                    created_at=estimated_created,
+                ))
+                await session.commit()
+
+            _increment(counters, 'successfully_migrated')
+            server_note = f" (переназначен с '{region_server}')" if found_on_server != region_server else ""
+            _add_detail(counters,
+                f"✅ @{user.account_name} (ID: {user.account}): "
+                f"мигрирован на {found_on_server}{server_note}"
+            )
+            logger.log('info',
+                f"[MIGRATION] Успешно мигрирован ключ пользователя {user.account} "
+                f"(outline_id: {outline_key.key_id}, РЕАЛЬНЫЙ сервер: {found_on_server}, "
+                f"БД указан: {region_server}, premium: {user.premium}, date: {user.date})"
+            )
+
+        except Exception as e:
+            _increment(counters, 'failed_migrations')
+            _add_detail(counters,
+                f"❌ @{user.account_name} (ID: {user.account}): ошибка - {str(e)[:50]}"
+            )
+            logger.log('error',
+                f"[MIGRATION] Ошибка миграции ключа пользователя {user.account}: {e}"
+            )
+
+    def report(self, params: dict, counters: dict) -> str:
+        report = f"""🔑 Пользователей со старыми ключами: {counters.get('users_with_old_keys', 0)}
+
+✅ Успешно мигрировано: {counters.get('successfully_migrated', 0)}
+  📅 С реальной датой покупки: {counters.get('with_payment_date', 0)}
+  📊 С вычисленной датой: {counters.get('estimated_date', 0)}
+🔄 Уже были мигрированы: {counters.get('already_migrated', 0)}
+❌ Ошибки миграции: {counters.get('failed_migrations', 0) + counters.get('errors', 0)}
+🔍 Ключей не найдено на сервере: {counters.get('key_not_found_on_server', 0)}
 
 💡 Даты покупки взяты из таблицы платежей где возможно
 """
-
         # Если есть детали, добавляем их (макс 20 записей)
-        if migration_details:
+        if counters.get('details'):
             report += "\n<b>Детальный отчет:</b>\n"
-            for detail in migration_details[:20]:
+            for detail in counters['details']:
                 report += f"{detail}\n"
-            
-            if len(migration_details) > 20:
-                report += f"\n... и ещё {len(migration_details) - 20} записей"
+            if counters.get('details_more'):
+                report += f"\n... и ещё {counters['details_more']} записей"
+        return report
 
-        await message.answer(report, parse_mode='HTML')
-        logger.log('info', f"[MIGRATION] Миграция завершена. Статистика: {stats}")
+
+job_runner.register(MigrateOldKeysJob())
+
+
+async def command_migrate(message: types.Message):
+    """
+    Команда миграции старых ключей в новую систему.
+    Доступна только администратору.
+    
+    Процесс (фоновая задача, по одному пользователю за шаг):
+    1. Находит всех пользователей со старым полем Users.key
+    2. Проверяет наличие ключа на Outline сервере
+    3. Создает запись в UserKey с сохранением всех параметров
+    4. НЕ удаляет старые данные (для безопасности)
+    """
+    # Проверка прав администратора
+    if str(message.from_user.id) != admin_tlg:
+        await message.answer("❌ Эта команда доступна только администратору")
+        return
+
+    try:
+        progress = await message.answer("🔄 Начинаю миграцию старых ключей...\n\n⏳ Сканирую базу данных...")
+        job_id = await job_runner.submit(
+            'migrate_old_keys',
+            {},
+            chat_id=message.chat.id,
+            message_id=progress.message_id,
+        )
+        await message.answer(
+            f'Задача #{job_id} запущена. Пауза: /jobpause {job_id}, отмена: /jobcancel {job_id}',
+            parse_mode=None
+        )
+        logger.log('info', f"[MIGRATION] Запущена задача #{job_id}")
 
     except Exception as e:
         error_msg = f"❌ Критическая ошибка при миграции: {str(e)}"
@@ -370,7 +343,7 @@ async def command_fix_migration_dates(message: types.Message):
         
         now = datetime.now()
         
-        with Session(engine) as session:
+        async with async_session() as session:
             for key in all_keys:
                 old_created = key.created_at
                 
@@ -398,9 +371,9 @@ async def command_fix_migration_dates(message: types.Message):
                     continue
                 
                 # Обновляем запись
-                session.query(UserKey).filter(UserKey.id == key.id).update({
-                    'created_at': estimated_created
-                })
+                await session.execute(
+                    update(UserKey).where(UserKey.id == key.id).values(created_at=estimated_created)
+                )
                 updated_count += 1
                 
                 # Добавляем в детали первые 10 записей
@@ -411,7 +384,7 @@ async def command_fix_migration_dates(message: types.Message):
                         f"истекает: {date_str} | создан: {estimated_created.strftime('%d.%m.%Y')} {date_type}"
                     )
             
-            session.commit()
+            await session.commit()
         
         report = f"""
 📊 <b>Отчет об исправлении дат</b>
@@ -3,27 +3,25 @@
 """
 from aiogram.types import Message, CallbackQuery
 from aiogram.fsm.context import FSMContext
-from aiogram.fsm.state import State, StatesGroup
 from aiogram.utils.keyboard import InlineKeyboardBuilder
+import time
 import traceback
 
 from core.settings import admin_tlg
-from core.api_s.outline.outline_api import OutlineManager, get_name_all_active_server_ol, get_server_display_name
+from core.handlers.states import MigrateServerStates
+from core.api_s.outline.outline_api import get_name_all_active_server_ol, get_server_display_name
 from core.sql.function_db_user_vpn.users_vpn import (
-    get_all_user_keys,
-    delete_user_key_record,
-    add_user_key
+    count_user_keys,
+    get_user_keys_page,
 )
+from core.api_s.outline.migration import MIGRATION_CONCURRENCY_PER_SERVER, estimate_migration, migrate_keys_batch
+from core.jobs.runner import JobKind, job_runner
+from core.utils.message_queue import outbound_queue, PRIORITY_BROADCAST
 from logs.log_main import RotatingFileLogger
 
 logger = RotatingFileLogger()
 
 
-class MigrateServerStates(StatesGroup):
-    waiting_for_source_server = State()
-    waiting_for_target_server = State()
-
-
 async def command_migrate_server(message: Message, state: FSMContext) -> None:
     """
     -- Админ-команда --
@@ -82,8 +80,7 @@ async def select_source_server(callback: CallbackQuery, state: FSMContext) -> No
         await state.update_data(from_server=from_server)
         
         # Получаем количество ключей на этом сервере
-        all_keys = await get_all_user_keys()
-        keys_count = len([k for k in all_keys if k.region_server == from_server and k.premium])
+        keys_count = await count_user_keys(region_server=from_server, premium_only=True)
         
         if keys_count == 0:
             await callback.message.edit_text(
@@ -134,23 +131,23 @@ async def select_target_server(callback: CallbackQuery, state: FSMContext) -> No
         from_server = data.get('from_server')
         
         # Получаем количество ключей для миграции
-        all_keys = await get_all_user_keys()
-        keys_to_migrate = [k for k in all_keys if k.region_server == from_server and k.premium]
+        keys_count = await count_user_keys(region_server=from_server, premium_only=True)
         
         # Сохраняем данные
-        await state.update_data(to_server=to_server, keys_count=len(keys_to_migrate))
+        await state.update_data(to_server=to_server, keys_count=keys_count)
         
         # Запрашиваем подтверждение
         kb = InlineKeyboardBuilder()
         kb.button(text='✅ Да, перенести', callback_data='confirm_migrate')
         kb.button(text='❌ Отмена', callback_data='cancel_migrate')
-        kb.adjust(2)
+        kb.button(text='⏱ Оценить время (без переноса)', callback_data='dryrun_migrate')
+        kb.adjust(2, 1)
         
         await callback.message.edit_text(
             f'⚠️ <b>Подтверждение переноса</b>\n\n'
             f'<b>С сервера:</b> {get_server_display_name(from_server)}\n'
             f'<b>На сервер:</b> {get_server_display_name(to_server)}\n'
-            f'<b>Будет перенесено:</b> {len(keys_to_migrate)} активных ключей\n\n'
+            f'<b>Будет перенесено:</b> {keys_count} активных ключей\n\n'
             f'⚠️ Процесс может занять несколько минут.\n'
             f'Всем пользователям будут отправлены уведомления.\n\n'
             f'<b>Вы уверены?</b>',
@@ -165,9 +162,78 @@ async def select_target_server(callback: CallbackQuery, state: FSMContext) -> No
         await state.clear()
 
 
+def _migration_notice(from_server: str, to_server: str, access_url: str) -> str:
+    return (
+        f'🔄 <b>Ваш VPN-ключ был автоматически перенесен на новый сервер!</b>\n\n'
+        f'<b>Старый сервер:</b> {get_server_display_name(from_server)}\n'
+        f'<b>Новый сервер:</b> {get_server_display_name(to_server)}\n\n'
+        f'<b>🔑 Ваш новый ключ доступа:</b>\n'
+        f'<code>{access_url}</code>\n\n'
+        f'<b>📱 Что нужно сделать:</b>\n'
+        f'1️⃣ Скопируйте новый ключ выше\n'
+        f'2️⃣ Откройте приложение Outline\n'
+        f'3️⃣ Добавьте новый ключ\n'
+        f'4️⃣ Удалите старый ключ\n\n'
+        f'⚠️ <i>Старый ключ больше не работает!</i>\n\n'
+        f'❓ Если возникли проблемы, обратитесь в поддержку.'
+    )
+
+
+class MigrateServerJob(JobKind):
+    """
+    Перенос активных ключей с одного сервера на другой пачками через migrate_keys_batch.
+    Параметры: from_server, to_server
+    """
+    name = 'migrate_server'
+    title = '🔄 Миграция между серверами'
+    batch = True
+
+    async def count(self, params: dict) -> int:
+        return await count_user_keys(region_server=params['from_server'], premium_only=True)
+
+    async def load_batch(self, params: dict, after_id: str | None, limit: int) -> list:
+        return await get_user_keys_page(limit, after_id, region_server=params['from_server'], premium_only=True)
+
+    async def process_batch(self, params: dict, old_keys: list, counters: dict) -> None:
+        from_server = params['from_server']
+        to_server = params['to_server']
+        started = time.monotonic()
+        result = await migrate_keys_batch(old_keys, from_server, to_server)
+
+        counters['migrated'] = counters.get('migrated', 0) + len(result.migrated)
+        counters['errors'] = counters.get('errors', 0) + result.failed
+        counters['old_not_deleted'] = counters.get('old_not_deleted', 0) + result.old_delete_failed
+        counters['seconds'] = round(counters.get('seconds', 0) + time.monotonic() - started, 2)
+
+        # Ставим уведомления пользователям в очередь рассылки
+        for item in result.migrated:
+            outbound_queue.send_message(
+                chat_id=item.old_key.account,
+                text=_migration_notice(from_server, to_server, item.access_url),
+                priority=PRIORITY_BROADCAST,
+                parse_mode='HTML'
+            )
+        logger.log('info', f'Migrated {len(result.migrated)}/{len(old_keys)} keys from {from_server} to {to_server} '
+                           f'in {time.monotonic() - started:.2f} s')
+
+    def report(self, params: dict, counters: dict) -> str:
+        text = (f'<b>С сервера:</b> {get_server_display_name(params["from_server"])}\n'
+                f'<b>На сервер:</b> {get_server_display_name(params["to_server"])}\n\n'
+                f'✅ Успешно перенесено: {counters.get("migrated", 0)}\n'
+                f'❌ Ошибок: {counters.get("errors", 0)}\n'
+                f'⏱ Время переноса: {counters.get("seconds", 0):.0f} с')
+        if counters.get('old_not_deleted'):
+            text += f'\n⚠️ Старых ключей не удалено с исходного сервера: {counters["old_not_deleted"]}'
+        return text
+
+
+job_runner.register(MigrateServerJob())
+
+
 async def handle_migration_confirmation(callback: CallbackQuery, state: FSMContext) -> None:
     """
-    Обработчик подтверждения миграции
+    Обработчик подтверждения миграции.
+    Перенос выполняется фоновой задачей, прогресс обновляется в этом же сообщении.
     """
     try:
         await callback.answer()
@@ -177,127 +243,43 @@ async def handle_migration_confirmation(callback: CallbackQuery, state: FSMConte
             await state.clear()
             return
         
+        if callback.data == 'dryrun_migrate':
+            data = await state.get_data()
+            from_server = data.get('from_server')
+            to_server = data.get('to_server')
+            estimate = await estimate_migration(data.get('keys_count', 0), from_server, to_server)
+            await callback.message.answer(
+                f'⏱ <b>Оценка миграции (ничего не изменено)</b>\n\n'
+                f'<b>Ключей:</b> {estimate.keys}\n'
+                f'<b>Задержка {get_server_display_name(from_server)}:</b> {estimate.source_latency * 1000:.0f} мс\n'
+                f'<b>Задержка {get_server_display_name(to_server)}:</b> {estimate.target_latency * 1000:.0f} мс\n'
+                f'<b>Параллельных запросов на сервер:</b> {MIGRATION_CONCURRENCY_PER_SERVER}\n\n'
+                f'<b>Ориентировочное время:</b> ~{max(estimate.seconds, 1):.0f} с',
+                parse_mode='HTML'
+            )
+            return
+
         if callback.data == 'confirm_migrate':
             data = await state.get_data()
             from_server = data.get('from_server')
             to_server = data.get('to_server')
             
-            from_display = get_server_display_name(from_server)
-            to_display = get_server_display_name(to_server)
-            
             await callback.message.edit_text(
                 f'⏳ Начинаем миграцию...\n'
-                f'С {from_display} → {to_display}\n\n'
+                f'С {get_server_display_name(from_server)} → {get_server_display_name(to_server)}\n\n'
                 f'Это может занять несколько минут.',
                 parse_mode='HTML'
             )
             
-            # Выполняем миграцию
-            all_keys = await get_all_user_keys()
-            keys_to_migrate = [k for k in all_keys if k.region_server == from_server and k.premium]
-            
-            success_count = 0
-            error_count = 0
-            
-            olm_to = OutlineManager(region_server=to_server)
-            olm_from = OutlineManager(region_server=from_server)
-            
-            for idx, old_key in enumerate(keys_to_migrate, 1):
-                try:
-                    # Создаем новый ключ на целевом сервере
-                    import uuid
-                    unique_name = f"{old_key.account}-migrated-{uuid.uuid4().hex[:8]}"
-                    new_key = olm_to._client.create_key(name=unique_name)
-                    
-                    if not new_key:
-                        raise Exception("Failed to create key on target server")
-                    
-                    new_outline_id = str(getattr(new_key, 'key_id', None))
-                    new_access_url = getattr(new_key, 'access_url', None)
-                    
-                    if not new_outline_id or not new_access_url:
-                        raise Exception("New key missing required attributes")
-                    
-                    # Сохраняем новый ключ в БД
-                    date_str = old_key.date.strftime('%d.%m.%Y - %H:%M') if old_key.date else None
-                    if not date_str:
-                        # Если нет даты, устанавливаем +30 дней
-                        from datetime import datetime, timedelta
-                        date_str = (datetime.now() + timedelta(days=30)).strftime('%d.%m.%Y - %H:%M')
-                    
-                    save_success = await add_user_key(
-                        account=old_key.account,
-                        outline_id=new_outline_id,
-                        access_url=new_access_url,
-                        region_server=to_server,
-                        date_str=date_str,
-                        promo=old_key.promo
-                    )
-                    
-                    if not save_success:
-                        raise Exception("Failed to save key to database")
-                    
-                    # Удаляем старый ключ
-                    try:
-                        olm_from.delete_key_by_id(old_key.outline_id)
-                    except Exception as e:
-                        logger.log('warning', f'Failed to delete old key {old_key.outline_id}: {e}')
-                    
-                    await delete_user_key_record(old_key.id)
-                    
-                    # Отправляем уведомление пользователю
-                    try:
-                        from core.bot import bot
-                        await bot.send_message(
-                            chat_id=old_key.account,
-                            text=(
-                                f'🔄 <b>Ваш VPN-ключ был автоматически перенесен на новый сервер!</b>\n\n'
-                                f'<b>Старый сервер:</b> {from_display}\n'
-                                f'<b>Новый сервер:</b> {to_display}\n\n'
-                                f'<b>🔑 Ваш новый ключ доступа:</b>\n'
-                                f'<code>{new_access_url}</code>\n\n'
-                                f'<b>📱 Что нужно сделать:</b>\n'
-                                f'1️⃣ Скопируйте новый ключ выше\n'
-                                f'2️⃣ Откройте приложение Outline\n'
-                                f'3️⃣ Добавьте новый ключ\n'
-                                f'4️⃣ Удалите старый ключ\n\n'
-                                f'⚠️ <i>Старый ключ больше не работает!</i>\n\n'
-                                f'❓ Если возникли проблемы, обратитесь в поддержку.'
-                            ),
-                            parse_mode='HTML'
-                        )
-                    except Exception as e:
-                        logger.log('warning', f'Failed to notify user {old_key.account}: {e}')
-                    
-                    success_count += 1
-                    logger.log('info', f'Migrated key for user {old_key.account} from {from_server} to {to_server}')
-                    
-                    # Обновляем статус каждые 5 ключей
-                    if idx % 5 == 0:
-                        try:
-                            await callback.message.edit_text(
-                                f'⏳ Миграция в процессе...\n'
-                                f'С {from_display} → {to_display}\n\n'
-                                f'Перенесено: {success_count}/{len(keys_to_migrate)}\n'
-                                f'Ошибок: {error_count}',
-                                parse_mode='HTML'
-                            )
-                        except:
-                            pass
-                    
-                except Exception as e:
-                    error_count += 1
-                    logger.log('error', f'Migration error for user {old_key.account}: {e}')
-            
-            # Финальный отчет
-            await callback.message.edit_text(
-                f'✅ <b>Миграция завершена!</b>\n\n'
-                f'<b>С сервера:</b> {from_display}\n'
-                f'<b>На сервер:</b> {to_display}\n\n'
-                f'✅ Успешно перенесено: {success_count}\n'
-                f'❌ Ошибок: {error_count}\n\n'
-                f'📧 Всем пользователям отправлены уведомления с инструкциями.',
-                parse_mode='HTML'
+            job_id = await job_runner.submit(
+                'migrate_server',
+                {'from_server': from_server, 'to_server': to_server},
+                chat_id=callback.message.chat.id,
+                message_id=callback.message.message_id,
+            )
+            await callback.message.answer(
+                f'Задача #{job_id} запущена. Пауза: /jobpause {job_id}, отмена: /jobcancel {job_id}',
+                parse_mode=None
             )
             
             await state.clear()
@@ -0,0 +1,80 @@
+"""
+HTTP-уведомления ЮKassa: выдача ключа сразу после оплаты, без нажатия «Проверить оплату»
+"""
+import traceback
+
+from aiohttp import web
+
+from core.api_s.api_youkassa.youkassa_api import get_payment, is_yookassa_ip
+from core.handlers.handlers_keyboards.after_pay_handler import fulfil_payment
+from core.keyboards.start_button import start_keyboard
+from core.settings import yookassa_ip_check
+from core.utils.message_queue import outbound_queue, PRIORITY_TRANSACTIONAL
+from logs.log_main import RotatingFileLogger
+
+logger_payments = RotatingFileLogger(config_file='logs/log_settings_payments.json')
+
+YOOKASSA_PATH = '/yookassa'
+
+
+def _sender_ip(request: web.Request) -> str:
+    # За локальным nginx настоящий адрес передаётся в X-Real-IP
+    if request.remote in ('127.0.0.1', '::1'):
+        return request.headers.get('X-Real-IP', request.remote)
+    return request.remote or ''
+
+
+async def handle_yookassa_notification(request: web.Request) -> web.Response:
+    """
+    Обработчик уведомления payment.succeeded.
+
+    Данные уведомления не используются напрямую: платеж запрашивается из API ЮKassa,
+    и ключ выдаётся только если API подтверждает статус succeeded. Параметры покупки
+    берутся из metadata платежа (см. create_payment). Ответ не 200 заставляет ЮKassa
+    повторить уведомление, поэтому при ошибке выдачи возвращается 500 —
+    повтор безопасен, fulfil_payment выдаёт ключ по платежу один раз.
+
+    :param request: web.Request
+    :return: web.Response
+    """
+    ip = _sender_ip(request)
+    if yookassa_ip_check and not is_yookassa_ip(ip):
+        logger_payments.log('warning', f'YooKassa notification rejected from {ip}')
+        return web.Response(status=403)
+
+    try:
+        body = await request.json()
+        event = body.get('event')
+        payment_id = (body.get('object') or {}).get('id')
+    except (ValueError, AttributeError):
+        return web.Response(status=400)
+    if event != 'payment.succeeded' or not payment_id:
+        return web.Response()
+
+    try:
+        payment = await get_payment(payment_id)
+        if payment.status != 'succeeded':
+            logger_payments.log('warning', f'YooKassa notification for {payment_id}: API status is {payment.status}')
+            return web.Response()
+
+        metadata = payment.metadata or {}
+        if 'account' not in metadata:
+            # Платеж создан до появления metadata — ключ выдаётся ручной проверкой
+            logger_payments.log('warning', f'YooKassa notification for {payment_id}: no metadata, left for manual check')
+            return web.Response()
+
+        account = int(metadata['account'])
+        content = await fulfil_payment(payment_id, account=account,
+                                       region_server=metadata.get('region_server') or 'nederland',
+                                       add_day=int(metadata.get('day_count', 0)),
+                                       word_days=metadata.get('word_days'),
+                                       payment_date=payment.created_at,
+                                       amount=str(payment.amount.value))
+        if content is not None:
+            outbound_queue.send_message(account, content, priority=PRIORITY_TRANSACTIONAL,
+                                        reply_markup=start_keyboard(), parse_mode='HTML')
+        return web.Response()
+    except Exception as e:
+        tb = traceback.format_exc()
+        logger_payments.log('error', f'YooKassa notification for {payment_id} failed: {e}\n{tb}')
+        return web.Response(status=500)
@@ -0,0 +1,36 @@
+"""
+Команда администратора /perf: задержки обработчиков по маршрутам
+"""
+from aiogram.filters import CommandObject
+from aiogram.types import Message
+import traceback
+
+from core.middlewares.latency import WINDOW_MINUTES, perf_report
+from core.settings import admin_tlg
+from logs.log_main import RotatingFileLogger
+
+logger = RotatingFileLogger()
+
+
+async def command_perf(message: Message, command: CommandObject) -> None:
+    """
+    -- Админ-команда --
+    /perf [минуты]
+    p50/p95/p99 обработчиков и самые медленные маршруты с момента запуска
+    или за последние N минут (не больше WINDOW_MINUTES)
+    """
+    try:
+        if not admin_tlg or str(message.from_user.id) != str(admin_tlg):
+            await message.answer('❌ У вас нет доступа к этой команде', parse_mode=None)
+            return
+
+        args = (command.args or '').strip()
+        if args and not args.isdigit():
+            await message.answer(f'Использование: /perf [минуты, до {WINDOW_MINUTES}]', parse_mode=None)
+            return
+
+        await message.answer(perf_report(int(args) if args else None), parse_mode='HTML')
+    except Exception as e:
+        tb = traceback.format_exc()
+        logger.log('error', f'command_perf error: {e}\n{tb}')
+        await message.answer('❌ Ошибка при получении статистики', parse_mode=None)
@@ -6,10 +6,10 @@ import uuid
 from datetime import datetime, timedelta
 from aiogram.types import CallbackQuery
 
-from core.api_s.outline.outline_api import OutlineManager, get_name_all_active_server_ol, get_server_display_name
+from core.api_s.outline.outline_api import get_outline_manager, get_name_all_active_server_ol, get_server_display_name
 from core.sql.function_db_user_vpn.users_vpn import (
     get_user_keys, 
-    get_all_user_keys,
+    get_user_key_by_short_id,
     delete_user_key_record,
     add_user_key,
     get_user_data_from_table_users,
@@ -40,15 +40,9 @@ async def replace_key_handler(callback: CallbackQuery) -> None:
         logger.log('info', f'Replace key request: short_id={short_id}, from admin={callback.from_user.id}')
         
         # Находим полный ключ по короткому ID
-        all_keys = await get_all_user_keys()
-        logger.log('info', f'Total keys in DB: {len(all_keys)}')
-        target_key = None
-        for key in all_keys:
-            key_id_str = str(key.id)
-            if key_id_str.endswith(short_id):
-                target_key = key
-                logger.log('info', f'Found target key: id={key.id}, user={key.account}, server={key.region_server}')
-                break
+        target_key = await get_user_key_by_short_id(short_id)
+        if target_key:
+            logger.log('info', f'Found target key: id={target_key.id}, user={target_key.account}, server={target_key.region_server}')
         
         if not target_key:
             await callback.message.edit_text(
@@ -100,10 +94,10 @@ async def replace_key_handler(callback: CallbackQuery) -> None:
         
         # Создаем новый ключ на новом сервере
         try:
-            olm_new = OutlineManager(new_server)
+            olm_new = get_outline_manager(new_server)
             # Используем уникальное имя вместо key_id (чтобы избежать PUT запроса)
             unique_name = f"{user_id}-replaced-{uuid.uuid4().hex[:8]}"
-            new_key = olm_new._client.create_key(name=unique_name)
+            new_key = await olm_new._client.create_key(name=unique_name)
             
             if not new_key:
                 raise Exception("Failed to create new key")
@@ -156,8 +150,8 @@ async def replace_key_handler(callback: CallbackQuery) -> None:
         
         # Удаляем старый ключ из Outline
         try:
-            olm_old = OutlineManager(old_server)
-            olm_old.delete_key_by_id(old_outline_id)
+            olm_old = get_outline_manager(old_server)
+            await olm_old.delete_key_by_id(old_outline_id)
             logger.log('info', f'Deleted old key {old_outline_id} from server {old_server}')
         except Exception as e:
             logger.log('warning', f'Failed to delete old key from Outline: {e}')
@@ -189,7 +183,8 @@ async def replace_key_handler(callback: CallbackQuery) -> None:
         
         # Отправляем уведомление пользователю
         try:
-            from core.bot import bot
+            from core.bot import get_bot
+            bot = get_bot()
             user_message = (
                 f'🔄 <b>Ваш доступ был заменен!</b>\n\n'
                 f'<b>Новый сервер:</b> {new_display}\n'
@@ -5,7 +5,7 @@ import random
 import string
 
 from core.settings import admin_tlg
-from core.api_s.outline.outline_api import OutlineManager
+from core.api_s.outline.outline_api import get_outline_manager
 from core.sql.function_db_user_vpn.users_vpn import (
     get_user_data_from_table_users,
     add_user_to_db,
@@ -69,12 +69,12 @@ async def command_seed(message: Message) -> None:
         past_date = now - timedelta(days=1)
 
         # Создаем ключи на Outline сервере
-        olm = OutlineManager(region_server=region)
+        olm = get_outline_manager(region)
         
         # 1. Создание активного ключа
         outline_id_active = f"test_{test_id_str}_active"
         try:
-            key_data_active = olm.create_key_from_ol(id_user=outline_id_active)
+            key_data_active = await olm.create_key_from_ol(id_user=outline_id_active)
             access_url_active = key_data_active.access_url if key_data_active else None
         except Exception as e:
             await message.answer(f'❌ Ошибка создания активного ключа на Outline: {e}', parse_mode=None)
@@ -87,13 +87,13 @@ async def command_seed(message: Message) -> None:
         # 2. Создание просроченного ключа
         outline_id_expired = f"test_{test_id_str}_expired"
         try:
-            key_data_expired = olm.create_key_from_ol(id_user=outline_id_expired)
+            key_data_expired = await olm.create_key_from_ol(id_user=outline_id_expired)
             access_url_expired = key_data_expired.access_url if key_data_expired else None
         except Exception as e:
             await message.answer(f'❌ Ошибка создания просроченного ключа на Outline: {e}', parse_mode=None)
             # Удаляем созданный активный ключ
             try:
-                olm.delete_key_by_id(outline_id_active)
+                await olm.delete_key_by_id(outline_id_active)
             except:
                 pass
             return
@@ -102,7 +102,7 @@ async def command_seed(message: Message) -> None:
             await message.answer('❌ Не удалось создать просроченный ключ на Outline', parse_mode=None)
             # Удаляем созданный активный ключ
             try:
-                olm.delete_key_by_id(outline_id_active)
+                await olm.delete_key_by_id(outline_id_active)
             except:
                 pass
             return
@@ -5,7 +5,7 @@ from aiogram.types import Message
 import traceback
 
 from core.settings import admin_tlg
-from core.api_s.outline.outline_api import OutlineManager, get_name_all_active_server_ol, get_server_display_name
+from core.api_s.outline.outline_api import get_outline_manager, get_name_all_active_server_ol, get_server_display_name
 from core.sql.function_db_user_vpn.users_vpn import get_all_user_keys
 from logs.log_main import RotatingFileLogger
 
@@ -53,10 +53,10 @@ async def command_server_stats(message: Message) -> None:
         
         for idx, server in enumerate(all_servers, 1):
             try:
-                olm = OutlineManager(region_server=server)
+                olm = get_outline_manager(server)
                 
                 # Получаем все ключи с сервера
-                server_keys = olm._client.get_keys()
+                server_keys = await olm._client.get_keys()
                 total_keys = len(server_keys) if server_keys else 0
                 
                 # Подсчитываем общий трафик
@@ -6,20 +6,18 @@ from datetime import datetime, timedelta
 import json
 from pathlib import Path
 
-from core.api_s.outline.outline_api import OutlineManager, get_name_all_active_server_ol
+from core.api_s.outline.outline_api import get_outline_manager, get_name_all_active_server_ol
 from core.keyboards.start_button import start_keyboard
 from core.sql.function_db_user_vpn.users_vpn import (
     add_user_to_db, 
     get_user_data_from_table_users,
     set_key_to_table_users, 
     get_region_server,
-    add_user_key,
-    set_premium_status,
-    set_date_to_table_users,
     get_user_keys,
     get_promo_status,
     set_promo_status,
     get_all_user_keys,
+    update_user_state,
 )
 from core.utils.create_view import create_answer_from_html
 from logs.log_main import RotatingFileLogger
@@ -29,10 +27,6 @@ from aiogram.enums import ParseMode
 logger = RotatingFileLogger()
 
 
-def fmt(dt: datetime) -> str:
-    return dt.strftime('%d.%m.%Y - %H:%M')
-
-
 async def command_start(message: Message, state: FSMContext) -> None:
     """
     Обработчик команды /start.
@@ -50,8 +44,8 @@ async def command_start(message: Message, state: FSMContext) -> None:
         check_key = None
         for region_server in name_servers:
             try:
-                olm = OutlineManager(region_server=region_server)
-                check_key = olm.get_key_from_ol(id_user=str(id_user))
+                olm = get_outline_manager(region_server)
+                check_key = await olm.get_key_from_ol(id_user=str(id_user), with_metrics=False)
                 if check_key:
                     break
             except Exception as region_error:
@@ -181,25 +175,27 @@ async def generate_promo_key(user_id: int) -> str:
         
         # Создаем ключ на Outline сервере
         unique_name = f"{user_id}-promo-{uuid.uuid4().hex[:8]}"
-        olm = OutlineManager(region_server=region)
-        key_data = olm._client.create_key(name=unique_name)
+        olm = get_outline_manager(region)
+        key_data = await olm._client.create_key(name=unique_name)
         
         if not key_data or not getattr(key_data, 'access_url', None):
             raise Exception("Ошибка создания ключа на сервере")
         
         outline_id = str(key_data.key_id)
         
-        # Сохраняем в БД
-        await add_user_key(
+        # Сохраняем в БД одной транзакцией
+        await update_user_state(
             account=user_id,
-            access_url=key_data.access_url,
-            outline_id=outline_id,
-            region_server=region,
-            date_str=fmt(expiry_date),
-            promo=True,
+            user_key={
+                'access_url': key_data.access_url,
+                'outline_id': outline_id,
+                'region_server': region,
+                'date': expiry_date,
+                'promo': True,
+            },
+            premium=True,
+            date=expiry_date,
         )
-        await set_premium_status(account=user_id, value_premium=True)
-        await set_date_to_table_users(account=user_id, value_date=fmt(expiry_date))
         
         logger.log('info', f'Auto-generated promo key for new user {user_id}')
         return key_data.access_url
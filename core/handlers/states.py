@@ -0,0 +1,24 @@
+"""
+Состояния FSM админ-команд. Вынесены из модулей обработчиков, чтобы core.bot мог
+зарегистрировать фильтры состояний, не импортируя сами обработчики.
+"""
+from aiogram.fsm.state import State, StatesGroup
+
+
+class AddServerStates(StatesGroup):
+    waiting_for_country_ru = State()
+    waiting_for_api_url = State()
+    waiting_for_cert = State()
+
+
+class EditPriceStates(StatesGroup):
+    waiting_for_new_price = State()
+
+
+class MigrateServerStates(StatesGroup):
+    waiting_for_source_server = State()
+    waiting_for_target_server = State()
+
+
+class TestKeyStates(StatesGroup):
+    waiting_for_server = State()
@@ -1,21 +1,20 @@
 from aiogram.types import Message, CallbackQuery
 from aiogram.fsm.context import FSMContext
-from aiogram.fsm.state import State, StatesGroup
 from aiogram.utils.keyboard import InlineKeyboardBuilder
 from datetime import datetime, timedelta
 import traceback
-import json
 
 from core.settings import admin_tlg
-from core.api_s.outline.outline_api import OutlineManager
+from core.handlers.states import TestKeyStates
+from core.api_s.outline.outline_api import get_outline_manager
+from core.api_s.outline.server_registry import server_registry
 from core.sql.function_db_user_vpn.users_vpn import (
-    get_all_records_from_table_users,
-    add_user_key,
-    set_premium_status,
-    set_date_to_table_users,
-    set_region_server,
-    set_key_to_table_users,
+    count_users,
+    get_users_page,
+    update_user_state,
 )
+from core.jobs.runner import JobKind, job_runner
+from core.utils.message_queue import outbound_queue, PRIORITY_BROADCAST
 from logs.log_main import RotatingFileLogger
 
 logger = RotatingFileLogger()
@@ -25,10 +24,6 @@ def fmt(dt: datetime) -> str:
     return dt.strftime('%d.%m.%Y - %H:%M')
 
 
-class TestKeyStates(StatesGroup):
-    waiting_for_server = State()
-
-
 async def command_testkey(message: Message, state: FSMContext) -> None:
     """
     -- Админ-команда --
@@ -42,16 +37,7 @@ async def command_testkey(message: Message, state: FSMContext) -> None:
             return
 
         # Получаем список активных серверов
-        config_file = 'core/api_s/outline/settings_api_outline.json'
-        try:
-            with open(config_file, 'r', encoding='utf-8') as f:
-                config = json.load(f)
-        except FileNotFoundError:
-            await message.answer('❌ Файл конфигурации серверов не найден', parse_mode=None)
-            return
-
-        # Фильтруем только активные серверы
-        active_servers = {k: v for k, v in config.items() if v.get('is_active', False)}
+        active_servers = server_registry.active()
         
         if not active_servers:
             await message.answer('❌ Нет активных серверов', parse_mode=None)
@@ -59,9 +45,8 @@ async def command_testkey(message: Message, state: FSMContext) -> None:
 
         # Создаем клавиатуру с выбором сервера
         kb = InlineKeyboardBuilder()
-        for server_key, server_data in active_servers.items():
-            server_name = server_data.get('name_ru', server_key)
-            kb.button(text=server_name, callback_data=f"testkey_srv_{server_key}")
+        for server in active_servers:
+            kb.button(text=server.name_ru, callback_data=f"testkey_srv_{server.name_en}")
         
         kb.button(text="❌ Отмена", callback_data="testkey_cancel")
         kb.adjust(2)
@@ -83,13 +68,84 @@ async def command_testkey(message: Message, state: FSMContext) -> None:
         await message.answer('❌ Ошибка при запуске команды', parse_mode=None)
 
 
+class TestKeyBroadcastJob(JobKind):
+    """
+    Выдача тестового ключа на 14 дней всем пользователям.
+    Параметры: server_key, expiry_date (ISO)
+    """
+    name = 'testkey_broadcast'
+    title = '🎉 Рассылка тестовых доступов'
+
+    async def count(self, params: dict) -> int:
+        return await count_users()
+
+    async def load_batch(self, params: dict, after_id: str | None, limit: int) -> list:
+        return await get_users_page(limit, after_id)
+
+    async def process(self, params: dict, user, counters: dict) -> None:
+        server_key = params['server_key']
+        expiry_date = datetime.fromisoformat(params['expiry_date'])
+        user_id = user.account
+
+        # Создаем уникальный ID для тестового ключа
+        outline_id = f"testkey_{user_id}_{server_key}"
+
+        # Создаем ключ на Outline сервере
+        key_data = await get_outline_manager(server_key).create_key_from_ol(id_user=outline_id)
+        access_url = getattr(key_data, 'access_url', None) if key_data else None
+        if not access_url:
+            raise Exception(f'Failed to create test key for user {user_id}')
+
+        # Добавляем ключ в БД и обновляем статусы пользователя одной транзакцией
+        await update_user_state(
+            account=user_id,
+            user_key={
+                'access_url': access_url,
+                'outline_id': outline_id,
+                'region_server': server_key,
+                'date': expiry_date,
+                'promo': True,
+            },
+            premium=True,
+            date=expiry_date,
+            region_server=server_key,
+            key=access_url,
+        )
+        counters['success'] = counters.get('success', 0) + 1
+
+        # Ставим уведомление пользователю в очередь рассылки
+        try:
+            notification_text = (
+                f"🎉 <b>Добавили новый сервер выделенной сетевой среды.</b>\n\n"
+                f"Вам выдан тестовый доступ на 14 дней:\n\n"
+                f"<code>{access_url}</code>\n\n"
+                f"📍 Регион сервера: <b>{server_key}</b>\n"
+                f"⏰ Действует до: <b>{fmt(expiry_date)}</b>\n\n"
+                f"Используйте команду /start для управления доступами."
+            )
+            outbound_queue.send_message(chat_id=user_id, text=notification_text,
+                                        priority=PRIORITY_BROADCAST, parse_mode='HTML')
+        except Exception as notify_error:
+            # Ключ создан, но уведомление не поставлено в очередь - не критично
+            logger.log('warning', f'Failed to notify user {user_id}: {notify_error}')
+
+    def report(self, params: dict, counters: dict) -> str:
+        return (f"📊 <b>Статистика:</b>\n"
+                f"✅ Успешно: {counters.get('success', 0)}\n"
+                f"❌ Ошибок: {counters.get('errors', 0)}\n"
+                f"📍 Сервер: {params['server_key']}\n"
+                f"⏰ Срок действия: 14 дней (до {fmt(datetime.fromisoformat(params['expiry_date']))})")
+
+
+job_runner.register(TestKeyBroadcastJob())
+
+
 async def process_testkey_server_choice(callback: CallbackQuery, state: FSMContext) -> None:
     """
-    Обработка выбора сервера для создания тестовых ключей
+    Обработка выбора сервера для создания тестовых ключей.
+    Ключи создаются фоновой задачей, прогресс обновляется в этом же сообщении.
     """
     try:
-        from core.bot import bot
-        
         if callback.data == "testkey_cancel":
             await state.clear()
             await callback.message.edit_text("❌ Создание тестовых ключей отменено")
@@ -106,94 +162,27 @@ async def process_testkey_server_choice(callback: CallbackQuery, state: FSMConte
         )
         await callback.answer()
 
-        # Получаем всех пользователей
-        all_users = await get_all_records_from_table_users()
-        
-        if not all_users:
+        if not await count_users():
             await callback.message.edit_text("❌ В базе данных нет пользователей")
             await state.clear()
             return
 
-        # Дата истечения - через 14 дней
+        # Дата истечения - через 14 дней (одна для всех, фиксируется при запуске задачи)
         expiry_date = datetime.now() + timedelta(days=14)
-        
-        # Создаем менеджер Outline для выбранного сервера
-        olm = OutlineManager(region_server=server_key)
-        
-        success_count = 0
-        error_count = 0
-        
-        for user in all_users:
-            try:
-                user_id = user.account
-                
-                # Создаем уникальный ID для тестового ключа
-                outline_id = f"testkey_{user_id}_{server_key}"
-                
-                # Создаем ключ на Outline сервере
-                try:
-                    key_data = olm.create_key_from_ol(id_user=outline_id)
-                    access_url = getattr(key_data, 'access_url', None) if key_data else None
-                    if not access_url:
-                        error_count += 1
-                        logger.log('warning', f'Failed to create test key for user {user_id}')
-                        continue
-                except Exception as e:
-                    error_count += 1
-                    logger.log('error', f'Outline error for user {user_id}: {e}')
-                    continue
-
-                # Добавляем ключ в БД
-                await add_user_key(
-                    account=user_id,
-                    access_url=access_url,
-                    outline_id=outline_id,
-                    region_server=server_key,
-                    date_str=fmt(expiry_date),
-                    promo=True,
-                )
-
-                # Обновляем статусы пользователя
-                await set_premium_status(account=user_id, value_premium=True)
-                await set_date_to_table_users(account=user_id, value_date=fmt(expiry_date))
-                await set_region_server(account=user_id, value_region=server_key)
-                await set_key_to_table_users(account=user_id, value_key=access_url)
-
-                # Отправляем уведомление пользователю
-                try:
-                    notification_text = (
-                        f"🎉 <b>Добавили новый сервер выделенной сетевой среды.</b>\n\n"
-                        f"Вам выдан тестовый доступ на 14 дней:\n\n"
-                        f"<code>{access_url}</code>\n\n"
-                        f"📍 Регион сервера: <b>{server_key}</b>\n"
-                        f"⏰ Действует до: <b>{fmt(expiry_date)}</b>\n\n"
-                        f"Используйте команду /start для управления доступами."
-                    )
-                    await bot.send_message(chat_id=user_id, text=notification_text, parse_mode='HTML')
-                    success_count += 1
-                except Exception as notify_error:
-                    # Ключ создан, но уведомление не отправлено - не критично
-                    success_count += 1
-                    logger.log('warning', f'Failed to notify user {user_id}: {notify_error}')
-
-            except Exception as e:
-                error_count += 1
-                logger.log('error', f'Error processing user {user.account}: {e}')
-                continue
-
-        # Отчет администратору
-        await callback.message.edit_text(
-            f"✅ <b>Рассылка тестовых доступов завершена!</b>\n\n"
-            f"📊 <b>Статистика:</b>\n"
-            f"✅ Успешно: {success_count}\n"
-            f"❌ Ошибок: {error_count}\n"
-            f"📍 Сервер: {server_key}\n"
-            f"⏰ Срок действия: 14 дней (до {fmt(expiry_date)})",
-            parse_mode='HTML'
+
+        job_id = await job_runner.submit(
+            'testkey_broadcast',
+            {'server_key': server_key, 'expiry_date': expiry_date.isoformat()},
+            chat_id=callback.message.chat.id,
+            message_id=callback.message.message_id,
         )
-        
+        await callback.message.answer(
+            f'Задача #{job_id} запущена. Пауза: /jobpause {job_id}, отмена: /jobcancel {job_id}',
+            parse_mode=None
+        )
+
         await state.clear()
-        logger.log('info', f'Admin {callback.from_user.id} broadcasted test keys: success={success_count}, errors={error_count}')
+        logger.log('info', f'Admin {callback.from_user.id} started test key broadcast job #{job_id} on {server_key}')
 
     except Exception as e:
         tb = traceback.format_exc()
@@ -2,17 +2,17 @@ from aiogram.types import Message
 import traceback
 
 from core.settings import admin_tlg
-from core.api_s.outline.outline_api import OutlineManager
+from core.api_s.outline.outline_api import get_outline_manager
 from core.sql.function_db_user_vpn.users_vpn import (
-    get_all_user_keys,
-    get_all_records_from_table_users,
+    count_users,
+    get_users_page,
     get_user_keys,
     delete_user_key_record,
-    set_key_to_table_users,
-    set_premium_status,
-    set_region_server,
-    set_date_to_table_users,
 )
+from core.jobs.runner import JobKind, job_runner
+from logs.log_main import RotatingFileLogger
+
+logger = RotatingFileLogger()
 
 
 def is_test_user(account_name: str | None, account_id: int | None) -> bool:
@@ -31,19 +31,16 @@ def is_test_key(outline_id: str | None) -> bool:
 
 async def _delete_user_from_db(user_id: int):
     """Удаляет пользователя из таблицы Users"""
-    from sqlalchemy import create_engine
-    from sqlalchemy.orm import Session
+    from sqlalchemy import select
     from core.sql.base import Users
+    from core.sql.engine import async_session
     
-    DATABASE_URL = 'sqlite:///olvpnbot.db'
-    engine = create_engine(DATABASE_URL, echo=True)
-    
-    with Session(engine) as session:
+    async with async_session() as session:
         try:
-            user = session.query(Users).filter_by(account=user_id).first()
+            user = await session.scalar(select(Users).filter_by(account=user_id))
             if user:
-                session.delete(user)
-                session.commit()
+                await session.delete(user)
+                await session.commit()
                 return True
         except Exception:
             pass
@@ -51,27 +48,72 @@ async def _delete_user_from_db(user_id: int):
 
 
 async def _delete_user_payments(user_id: int):
-    """Удаляет платежи пользователя из таблицы UserPay"""
-    from sqlalchemy import create_engine
-    from sqlalchemy.orm import Session
-    from core.sql.base import UserPay
+    """Удаляет платежи пользователя из таблицы payments"""
+    from core.sql.function_db_user_payments.users_payments import delete_account_payments
     
-    DATABASE_URL = 'sqlite:///olvpnbot.db'
-    engine = create_engine(DATABASE_URL, echo=True)
-    
-    with Session(engine) as session:
-        try:
-            payments = session.query(UserPay).filter_by(account_id=user_id).all()
-            count = len(payments)
-            for payment in payments:
-                session.delete(payment)
-            session.commit()
-            return count
-        except Exception:
-            pass
+    try:
+        return await delete_account_payments(user_id)
+    except Exception:
+        pass
     return 0
 
 
+class UnseedJob(JobKind):
+    """
+    Удаление тестовых пользователей (account_name test_*) вместе с ключами и платежами
+    """
+    name = 'unseed'
+    title = '🗑️ Очистка тестовых данных'
+
+    async def count(self, params: dict) -> int:
+        return await count_users(name_prefix='test_')
+
+    async def load_batch(self, params: dict, after_id: str | None, limit: int) -> list:
+        return await get_users_page(limit, after_id, name_prefix='test_')
+
+    async def process(self, params: dict, user, counters: dict) -> None:
+        user_id = user.account
+        user_name = user.account_name or f'ID {user_id}'
+
+        # 1. Получаем все ключи пользователя
+        user_keys = await get_user_keys(account=user_id)
+
+        # 2. Удаляем ключи с Outline сервера и из БД
+        for key in user_keys:
+            # Удаляем с Outline если это тестовый ключ
+            if is_test_key(key.outline_id):
+                olm = get_outline_manager(key.region_server or 'nederland')
+                try:
+                    await olm.delete_key_by_id(key.outline_id)
+                except Exception as e:
+                    logger.log('warning', f'Failed to delete key {key.outline_id} from Outline: {e}')
+
+            # Удаляем из БД
+            await delete_user_key_record(key.id)
+            counters['keys'] = counters.get('keys', 0) + 1
+
+        # 3. Удаляем платежи пользователя
+        counters['payments'] = counters.get('payments', 0) + await _delete_user_payments(user_id)
+
+        # 4. Удаляем самого пользователя из таблицы Users
+        if not await _delete_user_from_db(user_id):
+            raise Exception(f'Не удалось удалить пользователя {user_name}')
+        counters['users'] = counters.get('users', 0) + 1
+
+    def report(self, params: dict, counters: dict) -> str:
+        text = '\n'.join([
+            f'<b>Удалено пользователей:</b> {counters.get("users", 0)}',
+            f'<b>Удалено ключей:</b> {counters.get("keys", 0)}',
+            f'<b>Удалено платежей:</b> {counters.get("payments", 0)}',
+        ])
+        if counters.get('errors'):
+            text += f'\n<b>⚠️ Ошибок:</b> {counters["errors"]} (подробности в логах)'
+        return text
+
+
+job_runner.register(UnseedJob())
+
+
 async def command_unseed(message: Message) -> None:
     """
     -- Админ-команда --
@@ -81,89 +123,31 @@ async def command_unseed(message: Message) -> None:
     - Удаляет записи о ключах из БД
     - Удаляет платежи пользователя
     - Удаляет самого пользователя из БД
+    Удаление выполняется фоновой задачей, прогресс обновляется в ответном сообщении.
     """
     try:
         if not admin_tlg or message.from_user.id != int(admin_tlg):
             await message.answer('❌ У вас нет доступа к этой команде', parse_mode=None)
             return
 
-        # Находим всех тестовых пользователей
-        all_users = await get_all_records_from_table_users()
-        test_users = [u for u in all_users if is_test_user(u.account_name, u.account)]
-        
-        if not test_users:
+        if not await count_users(name_prefix='test_'):
             await message.answer('✅ Тестовые пользователи не найдены', parse_mode=None)
             return
 
-        deleted_keys_count = 0
-        deleted_payments_count = 0
-        deleted_users_count = 0
-        errors = []
-
-        for user in test_users:
-            user_id = user.account
-            user_name = user.account_name or f'ID {user_id}'
-            
-            try:
-                # 1. Получаем все ключи пользователя
-                user_keys = await get_user_keys(account=user_id)
-                
-                # 2. Удаляем ключи с Outline сервера и из БД
-                for key in user_keys:
-                    try:
-                        # Удаляем с Outline если это тестовый ключ
-                        if is_test_key(key.outline_id):
-                            olm = OutlineManager(region_server=key.region_server or 'nederland')
-                            try:
-                                olm.delete_key_by_id(key.outline_id)
-                            except Exception as e:
-                                from logs.log_main import RotatingFileLogger
-                                logger = RotatingFileLogger()
-                                logger.log('warning', f'Failed to delete key {key.outline_id} from Outline: {e}')
-                        
-                        # Удаляем из БД
-                        await delete_user_key_record(key.id)
-                        deleted_keys_count += 1
-                    except Exception as e:
-                        errors.append(f'Ошибка удаления ключа {key.id}: {str(e)}')
-                
-                # 3. Удаляем платежи пользователя
-                payments_deleted = await _delete_user_payments(user_id)
-                deleted_payments_count += payments_deleted
-                
-                # 4. Удаляем самого пользователя из таблицы Users
-                if await _delete_user_from_db(user_id):
-                    deleted_users_count += 1
-                else:
-                    errors.append(f'Не удалось удалить пользователя {user_name}')
-                    
-            except Exception as e:
-                errors.append(f'Ошибка обработки пользователя {user_name}: {str(e)}')
-
-        # Формируем ответ
-        response_lines = [
-            '✅ Очистка тестовых данных завершена\n',
-            f'<b>Удалено пользователей:</b> {deleted_users_count}',
-            f'<b>Удалено ключей:</b> {deleted_keys_count}',
-            f'<b>Удалено платежей:</b> {deleted_payments_count}',
-        ]
-        
-        if errors:
-            response_lines.append(f'\n<b>⚠️ Предупреждения ({len(errors)}):</b>')
-            for error in errors[:5]:  # Показываем только первые 5 ошибок
-                response_lines.append(f'  • {error}')
-            if len(errors) > 5:
-                response_lines.append(f'  • ...и ещё {len(errors) - 5}')
-
+        progress = await message.answer('⏳ Очистка тестовых данных...', parse_mode=None)
+        job_id = await job_runner.submit(
+            'unseed',
+            {},
+            chat_id=message.chat.id,
+            message_id=progress.message_id,
+        )
         await message.answer(
-            text='\n'.join(response_lines),
-            parse_mode='HTML',
+            f'Задача #{job_id} запущена. Пауза: /jobpause {job_id}, отмена: /jobcancel {job_id}',
+            parse_mode=None
         )
         
     except Exception as e:
         tb = traceback.format_exc()
-        from logs.log_main import RotatingFileLogger
-        logger = RotatingFileLogger()
         logger.log('error', f'command_unseed error: {e}\n{tb}')
         try:
             await message.answer(f'❌ Ошибка при удалении тестовых данных:\n{str(e)}', parse_mode=None)
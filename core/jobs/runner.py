@@ -0,0 +1,308 @@
+import asyncio
+import importlib
+import json
+import time
+import traceback
+
+from core.sql.function_db_jobs.jobs import (
+    create_job,
+    get_job,
+    get_unfinished_jobs,
+    save_job_checkpoint,
+    set_job_status,
+)
+from logs.log_main import RotatingFileLogger
+
+logger = RotatingFileLogger()
+
+# Модули, регистрирующие типы задач; импортируются при первом обращении к типу,
+# поэтому задачи, прерванные перезапуском, продолжаются и без загрузки обработчиков
+JOB_KIND_MODULES = {
+    'delete_server': 'core.handlers.delete_server',
+    'migrate_old_keys': 'core.handlers.migrate_old_keys',
+    'migrate_server': 'core.handlers.migrate_server',
+    'testkey_broadcast': 'core.handlers.test_key_broadcast',
+    'unseed': 'core.handlers.unseed_test_data',
+}
+
+# Сколько элементов задача выбирает из БД за один запрос
+JOB_BATCH_SIZE = 50
+# Не чаще одного редактирования сообщения о прогрессе за столько секунд
+PROGRESS_INTERVAL = 5
+
+STATUS_TITLES = {
+    'pending': '🕓 в очереди',
+    'running': '⏳ выполняется',
+    'paused': '⏸ на паузе',
+    'cancelled': '🚫 отменена',
+    'done': '✅ завершена',
+    'failed': '❌ ошибка',
+}
+
+
+class JobKind:
+    """
+    Тип фоновой задачи.
+
+    Задача проходит по элементам (ключам, пользователям) в порядке id пачками,
+    после каждого элемента (или пачки, если batch = True) сохраняется контрольная
+    точка, поэтому после перезапуска бота задача продолжается со следующего элемента.
+    Исключение в process считается ошибкой элемента и не останавливает задачу.
+    Исключение в process_batch ставит задачу на паузу без сдвига контрольной точки,
+    чтобы после продолжения пачка была обработана повторно.
+    """
+
+    name = ''
+    title = ''
+    # True — пачка обрабатывается целиком через process_batch, контрольная точка сохраняется после пачки
+    batch = False
+
+    async def count(self, params: dict) -> int:
+        """Сколько элементов предстоит обработать (для прогресса)"""
+        return 0
+
+    async def load_batch(self, params: dict, after_id: str | None, limit: int) -> list:
+        """Следующая пачка элементов после after_id, упорядоченная по id"""
+        raise NotImplementedError
+
+    def item_id(self, item) -> str:
+        return item.id
+
+    async def process(self, params: dict, item, counters: dict) -> None:
+        """Обработать один элемент и обновить счётчики"""
+        raise NotImplementedError
+
+    async def process_batch(self, params: dict, items: list, counters: dict) -> None:
+        """Обработать пачку элементов целиком (для batch = True)"""
+        raise NotImplementedError
+
+    async def finish(self, params: dict, counters: dict) -> None:
+        """Действия после обработки всех элементов"""
+
+    def report(self, params: dict, counters: dict) -> str:
+        """Строки отчёта по счётчикам (для прогресса и итогового сообщения)"""
+        return '\n'.join(f'{name}: {value}' for name, value in counters.items())
+
+
+def format_job_text(job_id: int, kind: JobKind, status: str, processed: int, total: int,
+                    params: dict, counters: dict) -> str:
+    """
+    Текст сообщения о состоянии задачи
+
+    :return: str - HTML для parse_mode='HTML'
+    """
+    text = (f'<b>{kind.title}</b> — задача #{job_id}\n'
+            f'Статус: {STATUS_TITLES.get(status, status)}\n'
+            f'Обработано: {processed}/{total}\n')
+    report = kind.report(params, counters)
+    if report:
+        text += f'\n{report}'
+    return text
+
+
+class JobRunner:
+    """
+    Запуск фоновых задач в процессе бота.
+
+    Состояние задач хранится в таблице jobs, поэтому задачи, прерванные
+    перезапуском, подхватываются resume_unfinished() при старте.
+    Пауза и отмена передаются работающей задаче через _control и
+    применяются перед следующим элементом.
+    """
+
+    def __init__(self, batch_size: int = JOB_BATCH_SIZE, progress_interval: float = PROGRESS_INTERVAL):
+        """
+        Args:
+        - batch_size: int - Размер пачки элементов
+        - progress_interval: float - Минимальный интервал между обновлениями прогресса (секунды)
+        """
+        self.batch_size = batch_size
+        self.progress_interval = progress_interval
+        self._kinds: dict[str, JobKind] = {}
+        self._tasks: dict[int, asyncio.Task] = {}
+        self._control: dict[int, str] = {}
+
+    def register(self, kind: JobKind) -> JobKind:
+        """
+        Зарегистрировать тип задачи (вызывается при импорте модуля обработчика)
+
+        :param kind: JobKind
+        :return: JobKind
+        """
+        self._kinds[kind.name] = kind
+        return kind
+
+    def get_kind(self, name: str) -> JobKind | None:
+        if name not in self._kinds and name in JOB_KIND_MODULES:
+            importlib.import_module(JOB_KIND_MODULES[name])
+        return self._kinds.get(name)
+
+    async def submit(self, kind_name: str, params: dict, chat_id: int, message_id: int | None = None) -> int:
+        """
+        Создать задачу и запустить её в фоне
+
+        :param kind_name: str - Имя зарегистрированного типа задачи
+        :param params: dict - Параметры задачи (JSON-сериализуемые)
+        :param chat_id: int - Чат администратора
+        :param message_id: int | None - Сообщение, в котором показывать прогресс
+        :return: int - Номер задачи
+        """
+        kind = self.get_kind(kind_name)
+        total = await kind.count(params)
+        job = await create_job(kind_name, params, total=total, chat_id=chat_id, message_id=message_id)
+        self._start(job.id)
+        logger.log('info', f'Job #{job.id} {kind_name} submitted: {params}')
+        return job.id
+
+    def _start(self, job_id: int) -> None:
+        task = asyncio.get_running_loop().create_task(self._run(job_id))
+        self._tasks[job_id] = task
+        task.add_done_callback(lambda _: self._tasks.pop(job_id, None))
+
+    async def resume_unfinished(self) -> int:
+        """
+        Продолжить задачи, прерванные перезапуском (вызывается при старте бота)
+
+        :return: int - Сколько задач запущено
+        """
+        resumed = 0
+        for job in await get_unfinished_jobs():
+            if job.id in self._tasks:
+                continue
+            if self.get_kind(job.kind) is None:
+                await set_job_status(job.id, 'failed', error=f'Unknown job kind {job.kind}')
+                continue
+            self._start(job.id)
+            resumed += 1
+            logger.log('info', f'Job #{job.id} {job.kind} resumed from cursor {job.cursor}')
+        return resumed
+
+    async def pause(self, job_id: int) -> bool:
+        """
+        :param job_id: int - Номер задачи
+        :return: bool - False, если задачу нельзя поставить на паузу
+        """
+        job = await get_job(job_id)
+        if job is None or job.status not in ('pending', 'running'):
+            return False
+        if job_id in self._tasks:
+            self._control[job_id] = 'paused'
+        else:
+            await set_job_status(job_id, 'paused')
+        return True
+
+    async def resume(self, job_id: int) -> bool:
+        """
+        :param job_id: int - Номер задачи
+        :return: bool - False, если задача не на паузе
+        """
+        job = await get_job(job_id)
+        if job is None or job.status != 'paused' or job_id in self._tasks or self.get_kind(job.kind) is None:
+            return False
+        # Сбрасываем ошибку пачки, из-за которой задача могла встать на паузу
+        await set_job_status(job_id, 'pending', error='')
+        self._start(job_id)
+        return True
+
+    async def cancel(self, job_id: int) -> bool:
+        """
+        :param job_id: int - Номер задачи
+        :return: bool - False, если задача уже завершена
+        """
+        job = await get_job(job_id)
+        if job is None or job.status not in ('pending', 'running', 'paused'):
+            return False
+        if job_id in self._tasks:
+            self._control[job_id] = 'cancelled'
+        else:
+            await set_job_status(job_id, 'cancelled')
+        return True
+
+    async def shutdown(self) -> None:
+        """
+        Остановить задачи при остановке бота.
+        Статус остаётся running, и задачи продолжатся после запуска.
+        """
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _edit_progress(self, job, text: str) -> None:
+        if not job.chat_id or not job.message_id:
+            return
+        try:
+            from core.bot import get_bot
+            bot = get_bot()
+            await bot.edit_message_text(text=text, chat_id=job.chat_id, message_id=job.message_id, parse_mode='HTML')
+        except Exception as e:
+            # "message is not modified" и удалённое сообщение не влияют на задачу
+            logger.log('debug', f'Job #{job.id} progress edit skipped: {e}')
+
+    async def _run(self, job_id: int) -> None:
+        job = await get_job(job_id)
+        kind = self.get_kind(job.kind)
+        params = json.loads(job.params or '{}')
+        counters = json.loads(job.counters or '{}')
+        cursor = job.cursor
+        processed = job.processed or 0
+        total = job.total or 0
+        await set_job_status(job_id, 'running')
+        last_edit = 0.0
+        try:
+            while True:
+                items = await kind.load_batch(params, cursor, self.batch_size)
+                if not items:
+                    break
+                # Пачечные задачи обрабатывают все элементы за один шаг
+                steps = [items] if kind.batch else [[item] for item in items]
+                for step in steps:
+                    control = self._control.pop(job_id, None)
+                    if control:
+                        await set_job_status(job_id, control)
+                        await self._edit_progress(job, format_job_text(job_id, kind, control, processed, total, params, counters))
+                        logger.log('info', f'Job #{job_id} {job.kind} {control} at {processed}/{total}')
+                        return
+                    try:
+                        if kind.batch:
+                            await kind.process_batch(params, step, counters)
+                        else:
+                            await kind.process(params, step[0], counters)
+                    except Exception as e:
+                        if kind.batch:
+                            # Пачка не обработана: контрольная точка не сдвигается, задача встаёт на паузу
+                            # и после /jobresume повторит эту же пачку
+                            tb = traceback.format_exc()
+                            logger.log('error', f'Job #{job_id} {job.kind} batch after {cursor} failed, pausing: {e}\n{tb}')
+                            await set_job_status(job_id, 'paused', error=str(e))
+                            await self._edit_progress(job, format_job_text(job_id, kind, 'paused', processed, total, params, counters))
+                            return
+                        counters['errors'] = counters.get('errors', 0) + len(step)
+                        logger.log('error', f'Job #{job_id} {job.kind} item {kind.item_id(step[-1])} failed: {e}')
+                    cursor = kind.item_id(step[-1])
+                    processed += len(step)
+                    await save_job_checkpoint(job_id, cursor, processed, counters)
+                    if time.monotonic() - last_edit >= self.progress_interval:
+                        last_edit = time.monotonic()
+                        await self._edit_progress(job, format_job_text(job_id, kind, 'running', processed, max(total, processed), params, counters))
+                if len(items) < self.batch_size:
+                    break
+
+            await kind.finish(params, counters)
+            await save_job_checkpoint(job_id, cursor, processed, counters)
+            await set_job_status(job_id, 'done')
+            await self._edit_progress(job, format_job_text(job_id, kind, 'done', processed, max(total, processed), params, counters))
+            logger.log('info', f'Job #{job_id} {job.kind} done: {counters}')
+        except asyncio.CancelledError:
+            # Остановка процесса: контрольная точка уже сохранена, задача продолжится после запуска
+            raise
+        except Exception as e:
+            tb = traceback.format_exc()
+            logger.log('error', f'Job #{job_id} {job.kind} failed: {e}\n{tb}')
+            await set_job_status(job_id, 'failed', error=str(e))
+            await self._edit_progress(job, format_job_text(job_id, kind, 'failed', processed, total, params, counters))
+        finally:
+            self._control.pop(job_id, None)
+
+
+job_runner = JobRunner()
@@ -1,6 +1,8 @@
 from aiogram.types import InlineKeyboardMarkup
 from aiogram.utils.keyboard import InlineKeyboardBuilder
 
+from core.keyboards.callback_data import KeyCallback, KEY_DELETE
+
 
 def accept_del_keyboard() -> InlineKeyboardMarkup:
     """
@@ -23,7 +25,7 @@ def accept_del_userkey_keyboard(short_id: str) -> InlineKeyboardMarkup:
     :return: InlineKeyboardMarkup
     """
     keyboard_builder = InlineKeyboardBuilder()
-    keyboard_builder.button(text='✅ Подтверждаю', callback_data=f'del_k_{short_id}')
+    keyboard_builder.button(text='✅ Подтверждаю', callback_data=KeyCallback(action=KEY_DELETE, short_id=short_id))
     keyboard_builder.button(text='❌ Отмена', callback_data='my_key')
     keyboard_builder.adjust(2)
     return keyboard_builder.as_markup()
\ No newline at end of file
@@ -0,0 +1,101 @@
+from typing import Optional
+
+from aiogram.filters.callback_data import CallbackData
+
+
+class KeyCallback(CallbackData, prefix='key'):
+    """
+    Действие с конкретным доступом (UserKey), например key:copy:ab12cd34:
+
+    Attributes:
+    - action (str): Одно из KEY_* ниже.
+    - short_id (str): Короткий идентификатор ключа (UserKey.short_id).
+    - server (str | None): Целевой сервер (для замены ключа).
+    """
+    action: str
+    short_id: str
+    server: Optional[str] = None
+
+
+class UserCallback(CallbackData, prefix='usr'):
+    """
+    Действие администратора с пользователем, например usr:check:123456
+
+    Attributes:
+    - action (str): Одно из USER_* ниже.
+    - user_id (int): id пользователя телеграм.
+    """
+    action: str
+    user_id: int
+
+
+# Действия KeyCallback
+KEY_COPY = 'copy'
+KEY_ASK_DELETE = 'ask_del'
+KEY_DELETE = 'del'
+KEY_REPLACE_CHOOSE = 'rpl_choose'
+KEY_REPLACE_DO = 'rpl_do'
+KEY_BLOCK_CONFIRM = 'blk_cfm'
+KEY_BLOCK = 'blk'
+KEY_BLOCK_REASON = 'blk_rsn'
+KEY_BLOCK_CANCEL = 'blk_cnl'
+
+# Действия UserCallback
+USER_PROMO = 'promo'
+USER_CHECK = 'check'
+USER_COPY = 'copy'
+USER_BLOCK_CONFIRM = 'blk_cfm'
+USER_BLOCK = 'blk'
+USER_BLOCK_REASON = 'blk_rsn'
+USER_BLOCK_CANCEL = 'blk_cnl'
+
+# Старый формат callback_data (префикс_аргумент) в уже отправленных сообщениях:
+# префикс -> (фабрика, действие)
+LEGACY_PREFIXES = {
+    'cpy_k_': (KeyCallback, KEY_COPY),
+    'ask_del_': (KeyCallback, KEY_ASK_DELETE),
+    'del_k_': (KeyCallback, KEY_DELETE),
+    'replace_choose_': (KeyCallback, KEY_REPLACE_CHOOSE),
+    'replace_do_': (KeyCallback, KEY_REPLACE_DO),
+    'cfm_blk_': (KeyCallback, KEY_BLOCK_CONFIRM),
+    'adm_blk_': (KeyCallback, KEY_BLOCK),
+    'blk_rsn_': (KeyCallback, KEY_BLOCK_REASON),
+    'cnl_blk_': (KeyCallback, KEY_BLOCK_CANCEL),
+    'give_promo_': (UserCallback, USER_PROMO),
+    'chk_usr_': (UserCallback, USER_CHECK),
+    'copy_key_': (UserCallback, USER_COPY),
+    'confirm_block_key_': (UserCallback, USER_BLOCK_CONFIRM),
+    'admin_block_key_': (UserCallback, USER_BLOCK),
+    'block_with_reason_': (UserCallback, USER_BLOCK_REASON),
+    'cancel_block_': (UserCallback, USER_BLOCK_CANCEL),
+}
+
+
+def decode_legacy(data: str) -> CallbackData | None:
+    """
+    Разобрать callback_data старого формата (например replace_do_ab12cd34_nederland)
+
+    Префикс ищется по позициям '_' слева направо, поэтому поиск не зависит от числа префиксов.
+
+    :param data: str - callback_data
+    :return: KeyCallback | UserCallback | None - None, если формат не распознан
+    """
+    position = data.find('_')
+    while position != -1:
+        prefix = data[:position + 1]
+        route = LEGACY_PREFIXES.get(prefix)
+        if route is not None:
+            factory, action = route
+            argument = data[position + 1:]
+            try:
+                if factory is UserCallback:
+                    return UserCallback(action=action, user_id=int(argument))
+                if action == KEY_REPLACE_DO:
+                    # replace_do_{short_id}_{server}; имя сервера может содержать '_'
+                    short_id, _, server = argument.partition('_')
+                    return KeyCallback(action=action, short_id=short_id, server=server or None)
+                return KeyCallback(action=action, short_id=argument)
+            except ValueError:
+                return None
+        position = data.find('_', position + 1)
+    return None
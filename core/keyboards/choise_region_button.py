@@ -1,8 +1,8 @@
-import json
-
 from aiogram.types import InlineKeyboardMarkup
 from aiogram.utils.keyboard import InlineKeyboardBuilder
 
+from core.api_s.outline.server_registry import server_registry
+
 
 def choise_region_keyboard() -> InlineKeyboardMarkup:
     """
@@ -26,11 +26,5 @@ def create_region_button_from_json() -> list:
 
     :return: list - список (call_back и текст)
     """
-    config_file = 'core/api_s/outline/settings_api_outline.json'
-    with open(config_file, 'r') as f:
-        config = json.load(f)
-    filtered_data = []
-    for value in config.values():
-        if value['is_active']:
-            filtered_data.append({"callback_data": value["name_en"], "name_ru": value["name_ru"]})
-    return filtered_data
\ No newline at end of file
+    return [{"callback_data": record.name_en, "name_ru": record.name_ru}
+            for record in server_registry.active()]
@@ -0,0 +1,78 @@
+"""
+Локальный HTTP-эндпоинт /metrics в текстовом формате Prometheus.
+
+Отдаёт задержки и ошибки запросов к Outline (по серверу и эндпоинту), вызовов
+репозиториев БД, запросов к ЮKassa и обработчиков бота, а также число активных
+ключей по серверам и глубину очереди исходящих сообщений. Метрики свои у каждого
+процесса: при RUN_MODE=multiprocess процесс проверки подписок слушает METRICS_PORT + 1.
+"""
+import time
+import traceback
+from datetime import datetime
+
+from aiohttp import web
+
+from core.settings import metrics_host
+from core.utils.latency import get_histograms
+from core.utils.message_queue import outbound_queue
+from core.utils.metrics import render_gauge, render_histograms, render_registered
+from logs.log_main import RotatingFileLogger
+
+logger = RotatingFileLogger()
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+_started = time.time()
+
+
+async def collect_metrics() -> str:
+    """
+    :return: str - Все метрики процесса в формате Prometheus
+    """
+    from core.middlewares.latency import get_route_histograms
+    from core.sql.function_db_user_vpn.users_vpn import count_active_keys_by_server
+
+    lines = render_registered()
+    lines.extend(render_histograms('yookassa_request_seconds', {
+        (('method', name.split('.', 1)[1]),): histogram
+        for name, histogram in get_histograms('yookassa.').items()
+    }))
+    lines.extend(render_histograms('bot_handler_seconds', {
+        (('route', route),): rolling.total for route, rolling in get_route_histograms().items()
+    }))
+
+    keys = await count_active_keys_by_server(datetime.now())
+    lines.extend(render_gauge('outline_active_keys', 'Active keys per Outline server',
+                              [((('server', server),), count) for server, count in sorted(keys.items())]))
+    lines.extend(render_gauge('outbound_queue_depth', 'Messages waiting in the outbound queue',
+                              [((), outbound_queue.depth())]))
+    lines.extend(render_gauge('process_start_time_seconds', 'Process start time (unix)', [((), _started)]))
+    return '\n'.join(lines) + '\n'
+
+
+async def handle_metrics(request: web.Request) -> web.Response:
+    try:
+        body = await collect_metrics()
+    except Exception as e:
+        tb = traceback.format_exc()
+        logger.log('error', f'Metrics collection failed: {e}\n{tb}')
+        return web.Response(status=500)
+    return web.Response(body=body.encode(), headers={'Content-Type': CONTENT_TYPE})
+
+
+async def start_metrics_server(port: int) -> web.AppRunner | None:
+    """
+    Запустить эндпоинт GET /metrics на METRICS_HOST:port
+
+    :param port: int - Порт (0 — не запускать)
+    :return: web.AppRunner | None - Для остановки через cleanup()
+    """
+    if not port:
+        return None
+    app = web.Application()
+    app.router.add_get('/metrics', handle_metrics)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, metrics_host, port).start()
+    logger.log('info', f'Metrics endpoint listening on {metrics_host}:{port}/metrics')
+    return runner
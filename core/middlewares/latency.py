@@ -0,0 +1,150 @@
+import html
+import re
+import time
+from typing import Any, Awaitable, Callable
+
+from aiogram import BaseMiddleware
+from aiogram.types import CallbackQuery, Message, TelegramObject
+
+from core.utils.latency import LatencyHistogram, RollingLatencyHistogram
+
+# Корзины задержек обработчиков (секунды), примерно логарифмическая шкала
+HANDLER_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.075, 0.1, 0.15, 0.25, 0.5, 0.75, 1.0, 2.5, 5.0, 10.0, 30.0)
+# Сколько минут хранить поминутные гистограммы для /perf <минуты>
+WINDOW_MINUTES = 60
+# Максимум маршрутов: callback_data приходит от клиента, остальное считается в OTHER_ROUTE
+MAX_ROUTES = 200
+OTHER_ROUTE = 'other'
+
+_routes: dict[str, RollingLatencyHistogram] = {}
+
+
+def callback_route(data: str | None) -> str:
+    """
+    Маршрут нажатия без параметров: "key:cpy" для CallbackData, "rpl_key_" для старого формата с id
+
+    :param data: str | None - callback_data
+    :return: str
+    """
+    if not data:
+        return 'callback'
+    prefix, sep, rest = data.partition(':')
+    if sep:
+        return f'callback {prefix}:{rest.partition(":")[0]}'
+    return f'callback {re.sub(r"[0-9-].*$", "", data)[:40]}'
+
+
+def message_route(message: Message, data: dict[str, Any]) -> str:
+    """
+    Маршрут сообщения: команда, состояние FSM или "message"
+
+    :param message: Message
+    :param data: dict - Данные middleware (raw_state от FSM)
+    :return: str
+    """
+    text = message.text or ''
+    if text.startswith('/'):
+        return text.split(maxsplit=1)[0].split('@', 1)[0].lower()[:40]
+    raw_state = data.get('raw_state')
+    if raw_state:
+        return f'state {raw_state}'
+    return 'message'
+
+
+def get_route_histograms() -> dict[str, RollingLatencyHistogram]:
+    """
+    :return: dict[str, RollingLatencyHistogram] - Гистограммы маршрутов этого процесса
+    """
+    return _routes
+
+
+class HandlerLatencyMiddleware(BaseMiddleware):
+    """
+    Замер времени обработки сообщений и нажатий по маршрутам (команда, префикс callback_data).
+
+    Регистрируется внешним middleware, поэтому время включает фильтры и ожидание ответа
+    Telegram в обработчике. Исключение обработчика считается ошибкой и пробрасывается дальше.
+    """
+
+    def __init__(self, prefix: str = ''):
+        """
+        Args:
+        - prefix: str - Префикс маршрутов (для второго бота в том же процессе)
+        """
+        self.prefix = prefix
+
+    def observe(self, route: str, seconds: float, error: bool = False) -> None:
+        route = self.prefix + route
+        histogram = _routes.get(route)
+        if histogram is None:
+            if len(_routes) >= MAX_ROUTES:
+                route = self.prefix + OTHER_ROUTE
+                histogram = _routes.get(route)
+            if histogram is None:
+                histogram = _routes[route] = RollingLatencyHistogram(HANDLER_BUCKETS, WINDOW_MINUTES)
+        histogram.observe(seconds, error)
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: dict[str, Any],
+    ) -> Any:
+        if isinstance(event, CallbackQuery):
+            route = callback_route(event.data)
+        elif isinstance(event, Message):
+            route = message_route(event, data)
+        else:
+            route = type(event).__name__
+        started = time.monotonic()
+        error = False
+        try:
+            return await handler(event, data)
+        except Exception:
+            error = True
+            raise
+        finally:
+            self.observe(route, time.monotonic() - started, error)
+
+
+def perf_report(minutes: int | None = None, top: int = 10) -> str:
+    """
+    Отчёт для /perf: общие квантили и самые медленные маршруты
+
+    :param minutes: int | None - Окно в минутах (None — с момента запуска)
+    :param top: int - Сколько маршрутов показать (по p95)
+    :return: str - HTML
+    """
+    if minutes is None:
+        histograms = {route: rolling.total for route, rolling in _routes.items()}
+        period = 'с момента запуска'
+    else:
+        minutes = max(1, min(minutes, WINDOW_MINUTES))
+        histograms = {route: rolling.last(minutes) for route, rolling in _routes.items()}
+        period = f'за последние {minutes} мин.'
+    histograms = {route: histogram for route, histogram in histograms.items() if histogram.count}
+    if not histograms:
+        return f'<b>⏱ Задержки обработчиков</b> ({period})\n\nНет событий'
+
+    overall = LatencyHistogram(HANDLER_BUCKETS)
+    for histogram in histograms.values():
+        overall.merge(histogram)
+
+    def quantiles(histogram: LatencyHistogram) -> str:
+        return ' / '.join(f'{histogram.quantile(q) * 1000:.0f}' for q in (0.5, 0.95, 0.99))
+
+    lines = [
+        f'<b>⏱ Задержки обработчиков</b> ({period})',
+        f'Всего: {overall.count} шт., ошибок {overall.errors}, p50/p95/p99 ≤ {quantiles(overall)} мс, '
+        f'макс. {overall.max * 1000:.0f} мс',
+        '',
+        '<b>Самые медленные маршруты (по p95):</b>',
+    ]
+    rows = sorted(histograms.items(), key=lambda item: (item[1].quantile(0.95), item[1].max), reverse=True)[:top]
+    for route, histogram in rows:
+        lines.append(f'• <code>{html.escape(route)}</code>: {histogram.count} шт., p50/p95/p99 ≤ {quantiles(histogram)} мс, '
+                     f'макс. {histogram.max * 1000:.0f} мс, ошибок {histogram.errors}')
+    return '\n'.join(lines)
+
+
+latency_middleware = HandlerLatencyMiddleware()
@@ -0,0 +1,167 @@
+import time
+from collections import OrderedDict, deque
+from typing import Any, Awaitable, Callable
+
+from aiogram import BaseMiddleware
+from aiogram.types import CallbackQuery, TelegramObject
+
+from core.settings import admin_tlg
+
+# Общий лимит на пользователя: не больше max_events событий за window секунд
+DEFAULT_LIMIT = (5, 1.0)
+
+# Отдельные лимиты для дорогих действий (запросы в ЮKassa, создание ключей на Outline).
+# Ключ, оканчивающийся на '_' или ':', сравнивается как префикс callback_data, остальные — точно.
+ACTION_LIMITS = {
+    'pay_check': (1, 3.0),
+    'day': (2, 10.0),
+    'month': (2, 10.0),
+    'year': (2, 10.0),
+    'promo': (1, 5.0),
+    'replace_do_': (1, 5.0),
+    'key:rpl_do:': (1, 5.0),
+}
+
+# Сколько пользователей храним в памяти и через сколько секунд простоя забываем пользователя
+MAX_TRACKED_KEYS = 10000
+IDLE_TTL = 10 * 60
+
+
+class SlidingWindowLimiter:
+    """
+    Ограничение частоты событий по ключу (пользователь, действие) со скользящим окном.
+
+    Память ограничена: записи хранятся в порядке последнего обращения (LRU),
+    простаивающие дольше idle_ttl и лишние сверх max_keys удаляются.
+    """
+
+    def __init__(self, max_keys: int = MAX_TRACKED_KEYS, idle_ttl: float = IDLE_TTL):
+        """
+        Args:
+        - max_keys: int - Максимум отслеживаемых ключей
+        - idle_ttl: float - Через сколько секунд без событий ключ забывается
+        """
+        self.max_keys = max_keys
+        self.idle_ttl = idle_ttl
+        self._events: OrderedDict[tuple, deque] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._events)
+
+    def hit(self, key: tuple, max_events: int, window: float, now: float | None = None) -> float:
+        """
+        Зарегистрировать событие, если лимит не превышен
+
+        :param key: tuple - (id пользователя, действие)
+        :param max_events: int - Сколько событий разрешено в окне
+        :param window: float - Длина окна в секундах
+        :param now: float | None - Текущее время time.monotonic()
+        :return: float - 0, если событие разрешено, иначе сколько секунд ждать
+        """
+        now = time.monotonic() if now is None else now
+        events = self._events.get(key)
+        if events is None:
+            events = self._events[key] = deque()
+        else:
+            self._events.move_to_end(key)
+        while events and events[0] <= now - window:
+            events.popleft()
+        if len(events) >= max_events:
+            return events[0] + window - now
+        events.append(now)
+        self._evict(now)
+        return 0.0
+
+    def _evict(self, now: float) -> None:
+        while len(self._events) > self.max_keys:
+            self._events.popitem(last=False)
+        # В начале словаря самые давно использованные ключи
+        while self._events:
+            key, events = next(iter(self._events.items()))
+            if events and events[-1] > now - self.idle_ttl:
+                break
+            del self._events[key]
+
+
+def _action_limit(data: str | None) -> tuple[str, tuple[int, float]] | None:
+    if not data:
+        return None
+    for action, limit in ACTION_LIMITS.items():
+        if data == action or (action.endswith(('_', ':')) and data.startswith(action)):
+            return action, limit
+    return None
+
+
+class ThrottlingMiddleware(BaseMiddleware):
+    """
+    Ограничение частоты сообщений и нажатий кнопок для каждого пользователя отдельно.
+
+    Каждое событие проверяется по общему лимиту пользователя, нажатия дорогих
+    кнопок (ACTION_LIMITS) — дополнительно по своему лимиту. Отклонённое нажатие
+    получает всплывающее уведомление, отклонённое сообщение молча пропускается.
+    Администратор не ограничивается.
+
+    Attributes:
+    - passed (int): Сколько событий пропущено к обработчикам.
+    - rejected (dict[str, int]): Сколько событий отклонено, по действиям.
+    """
+
+    def __init__(self, default_limit: tuple[int, float] = DEFAULT_LIMIT,
+                 limiter: SlidingWindowLimiter | None = None):
+        """
+        Args:
+        - default_limit: tuple[int, float] - Общий лимит (событий, окно в секундах)
+        - limiter: SlidingWindowLimiter | None - Хранилище событий
+        """
+        self.default_limit = default_limit
+        self.limiter = limiter or SlidingWindowLimiter()
+        self.passed = 0
+        self.rejected: dict[str, int] = {}
+
+    def _check(self, user_id: int, event: TelegramObject) -> tuple[str, float]:
+        """
+        :return: tuple[str, float] - (действие, сколько ждать); 0 — событие разрешено
+        """
+        if isinstance(event, CallbackQuery):
+            action = _action_limit(event.data)
+            if action is not None:
+                name, (max_events, window) = action
+                retry_after = self.limiter.hit((user_id, name), max_events, window)
+                if retry_after:
+                    return name, retry_after
+        max_events, window = self.default_limit
+        return 'default', self.limiter.hit((user_id, 'default'), max_events, window)
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: dict[str, Any],
+    ) -> Any:
+        user = getattr(event, 'from_user', None)
+        if user is None or (admin_tlg and str(user.id) == str(admin_tlg)):
+            return await handler(event, data)
+
+        action, retry_after = self._check(user.id, event)
+        if not retry_after:
+            self.passed += 1
+            return await handler(event, data)
+
+        self.rejected[action] = self.rejected.get(action, 0) + 1
+        if isinstance(event, CallbackQuery):
+            try:
+                await event.answer(f"Частые нажатия\nНужно ждать еще {round(retry_after, 2)} сек", show_alert=True)
+            except Exception:
+                pass
+        return None
+
+    def stats_text(self) -> str:
+        """
+        :return: str - Счётчики для /stats
+        """
+        rejected = ', '.join(f'{name}: {count}' for name, count in sorted(self.rejected.items())) or 'нет'
+        return (f'пропущено {self.passed}, отклонено: {rejected}, '
+                f'отслеживается ключей {len(self.limiter)}')
+
+
+throttling_middleware = ThrottlingMiddleware()
@@ -12,12 +12,60 @@ if not os.getenv("API_KEY_TLG") or not os.getenv("ADMIN_TLG"):
 # Для бота tlg
 api_key_tlg = os.getenv("API_KEY_TLG")
 admin_tlg = os.getenv("ADMIN_TLG")
+# Адрес Bot API (пусто — api.telegram.org); для локального сервера Bot API или тестового эндпоинта
+telegram_api_url = os.getenv("TELEGRAM_API_URL", "")
+
+# Запуск: multiprocess (бот и проверка подписок — отдельные процессы) или single (одним процессом)
+run_mode = os.getenv("RUN_MODE", "multiprocess").lower()
+# Запуск дольше стольких секунд (от импорта до приёма обновлений) пишется в лог предупреждением
+startup_budget = float(os.getenv("STARTUP_BUDGET", "10"))
+# Получение обновлений: polling (по умолчанию) или webhook
+bot_mode = os.getenv("BOT_MODE", "polling").lower()
+# Публичный адрес, по которому Telegram доступен webhook-сервер (например https://bot.example.com)
+webhook_base_url = os.getenv("WEBHOOK_BASE_URL", "").rstrip("/")
+# Где слушает локальный aiohttp-сервер (обычно за nginx)
+webhook_host = os.getenv("WEBHOOK_HOST", "127.0.0.1")
+webhook_port = int(os.getenv("WEBHOOK_PORT", "8080"))
+# Секрет заголовка X-Telegram-Bot-Api-Secret-Token (пусто — генерируется при каждом запуске)
+webhook_secret = os.getenv("WEBHOOK_SECRET", "")
+# Сколько обновлений обрабатывается одновременно
+webhook_workers = int(os.getenv("WEBHOOK_WORKERS", "8"))
+
+# Эндпоинт /metrics в формате Prometheus (0 — выключен)
+metrics_host = os.getenv("METRICS_HOST", "127.0.0.1")
+metrics_port = int(os.getenv("METRICS_PORT", "0"))
 
 # Для сервера outline — в json (core/api_s/outline/settings_api_outline.json)
+# Таймаут одного запроса к API Outline (секунды)
+outline_request_timeout = float(os.getenv("OUTLINE_REQUEST_TIMEOUT", "10"))
+# Сколько секунд переиспользуется снимок /metrics/transfer сервера
+outline_metrics_ttl = float(os.getenv("OUTLINE_METRICS_TTL", "30"))
+
+# Для базы данных
+database_url = os.getenv("DATABASE_URL", "sqlite+aiosqlite:///olvpnbot.db")
+# Печать SQL-запросов в stdout (только для отладки)
+db_echo = os.getenv("DB_ECHO", "false").lower() in ("1", "true", "yes")
+# Сколько миллисекунд SQLite ждёт снятия блокировки другим процессом
+db_busy_timeout = int(os.getenv("DB_BUSY_TIMEOUT", "5000"))
+
+# Очередь исходящих сообщений Telegram
+# Сколько сообщений в секунду бот отправляет всего (лимит Telegram — около 30)
+outbound_rate_limit = float(os.getenv("OUTBOUND_RATE_LIMIT", "25"))
+# Минимальная пауза между сообщениями в один чат (секунды)
+outbound_chat_interval = float(os.getenv("OUTBOUND_CHAT_INTERVAL", "1"))
 
 # Для юкасса
 client_id = os.getenv("YOUKASSA_ID")
 secret_key = os.getenv("YOUKASSA_SECRET")
+# Таймаут одного запроса к API ЮKassa (секунды) и размер пула потоков для запросов
+yookassa_timeout = float(os.getenv("YOOKASSA_TIMEOUT", "10"))
+yookassa_workers = int(os.getenv("YOOKASSA_WORKERS", "4"))
+# Как часто (секунды) локальный индекс платежей синхронизируется с ЮKassa
+payment_sync_interval = float(os.getenv("PAYMENT_SYNC_INTERVAL", "600"))
+# Приём HTTP-уведомлений ЮKassa (payment.succeeded) на WEBHOOK_HOST:WEBHOOK_PORT по пути /yookassa
+yookassa_webhook = os.getenv("YOOKASSA_WEBHOOK", "false").lower() in ("1", "true", "yes")
+# Принимать уведомления только с адресов ЮKassa (за прокси адрес берётся из X-Real-IP)
+yookassa_ip_check = os.getenv("YOOKASSA_IP_CHECK", "true").lower() in ("1", "true", "yes")
 
 # Для чата техподдержки
 support_chat_username = os.getenv("SUPPORT_CHAT_USERNAME", "helpvpb_bot")
@@ -35,6 +83,8 @@ if not client_id:
     missing.append("YOUKASSA_ID")
 if not secret_key:
     missing.append("YOUKASSA_SECRET")
+if bot_mode == "webhook" and not webhook_base_url:
+    missing.append("WEBHOOK_BASE_URL")
 
 if missing:
     raise RuntimeError(
@@ -1,6 +1,7 @@
+import uuid
 from datetime import datetime
 
-from sqlalchemy import String, Column, DateTime, Integer, Boolean, ForeignKey
+from sqlalchemy import String, Column, DateTime, Integer, Boolean, ForeignKey, Index, select, text
 from sqlalchemy.orm import DeclarativeBase, relationship
 
 
@@ -39,41 +40,111 @@ class Users(Base):
 
     user_payments = relationship('UserPay', back_populates='user')
 
+    __table_args__ = (
+        # Выборка истёкших премиумов пачками по (date, id)
+        Index('ix_users_vpn_date_id', 'date', 'id'),
+        # Пачки пользователей со старым ключом (get_users_page с with_key)
+        Index('ix_users_vpn_with_key', 'id', sqlite_where=text("key IS NOT NULL AND key != ''")),
+    )
+
 
 class UserPay(Base):
     """
-    Таблица с данными о платежах пользователей.
+    Таблица с данными о платежах пользователей (устаревшая).
+
+    Новые платежи записываются в payments; старые записи переносятся туда
+    при запуске (backfill_payments), функции users_payments читают из payments.
 
     Attributes:
     - id (str): Идентификатор пользователя (первичный ключ).
     - account_id (int): Идентификатор пользователя телеграм (уникальный).
-    - paykey (str): Ключ платежа юкассы
+    - paykey (str): Ключи платежей юкассы строками "[paykey|дата]"
     - last_updated (datetime): Время последнего апдейта
     """
     __tablename__ = 'users_payments'
     id = Column(String, primary_key=True)
     account_id = Column(Integer, ForeignKey('users_vpn.account'), unique=True)
     paykey = Column(String, nullable=True)
-    time_added = Column(DateTime, nullable=True)
+    time_added = Column(DateTime, nullable=True, index=True)
     last_updated = Column(DateTime, onupdate=datetime.now)
 
     user = relationship('Users', back_populates='user_payments')
 
 
+def short_id_from_key_id(key_id: str) -> str:
+    """
+    Короткий идентификатор ключа для callback_data (последние 8 символов id)
+    """
+    return str(key_id)[-8:]
+
+
+def pick_short_id(key_id: str, taken) -> str:
+    """
+    Подобрать свободный short_id для ключа.
+    Сначала последние 8 символов id (как в уже отправленных кнопках),
+    при совпадении — последние 12, затем случайный.
+
+    :param key_id: str - id записи UserKey
+    :param taken: Контейнер занятых short_id (поддерживает in)
+    :return: str - Свободный short_id
+    """
+    for candidate in (short_id_from_key_id(key_id), str(key_id)[-12:]):
+        if candidate not in taken:
+            return candidate
+    while True:
+        candidate = uuid.uuid4().hex[:8]
+        if candidate not in taken:
+            return candidate
+
+
+class _TakenShortIds:
+    """
+    Занятые short_id при вставке: записи в БД и строки той же вставки
+    """
+
+    def __init__(self, context):
+        self.connection = context.connection
+        self.pending = context.__dict__.setdefault('_pending_short_ids', set())
+
+    def __contains__(self, short_id: str) -> bool:
+        if short_id in self.pending:
+            return True
+        query = select(UserKey.short_id).where(UserKey.short_id == short_id).limit(1)
+        return self.connection.scalar(query) is not None
+
+
+def _default_short_id(context) -> str:
+    # Совпадение short_id нарушило бы UNIQUE уже после создания ключа на сервере Outline
+    taken = _TakenShortIds(context)
+    short_id = pick_short_id(context.get_current_parameters()['id'], taken)
+    taken.pending.add(short_id)
+    return short_id
+
+
 class UserKey(Base):
     """
     Таблица с несколькими ключами пользователя
+
+    short_id - уникальный короткий идентификатор для callback_data кнопок
     """
     __tablename__ = 'user_keys'
     id = Column(String, primary_key=True)
-    account = Column(Integer, ForeignKey('users_vpn.account'))
+    short_id = Column(String, unique=True, index=True, default=_default_short_id)
+    account = Column(Integer, ForeignKey('users_vpn.account'), index=True)
     access_url = Column(String, nullable=False)
     outline_id = Column(String, nullable=False)  # id ключа в Outline
     region_server = Column(String, nullable=True)
     premium = Column(Boolean, default=True)
     date = Column(DateTime, nullable=True)
     promo = Column(Boolean, default=False)
-    created_at = Column(DateTime, default=datetime.now)
+    created_at = Column(DateTime, default=datetime.now, index=True)
+
+    __table_args__ = (
+        # Пачки ключей сервера по id (миграция и удаление сервера)
+        Index('ix_user_keys_region_server_id', 'region_server', 'id'),
+        # Выборка истёкших ключей пачками по (date, id)
+        Index('ix_user_keys_date_id', 'date', 'id'),
+    )
 
 
 class BlockHistory(Base):
@@ -87,3 +158,87 @@ class BlockHistory(Base):
     reason = Column(String, nullable=True)
     key = Column(String, nullable=True)
     blocked_at = Column(DateTime, default=datetime.now)
+
+
+class Job(Base):
+    """
+    Фоновая задача администратора (перенос сервера, рассылка, удаление и т.п.)
+
+    Attributes:
+    - id (int): Номер задачи.
+    - kind (str): Тип задачи (имя из реестра core.jobs).
+    - status (str): pending / running / paused / cancelled / done / failed.
+    - params (str): Параметры задачи в JSON.
+    - counters (str): Счётчики результата в JSON.
+    - cursor (str): id последнего обработанного элемента (контрольная точка).
+    - processed (int): Сколько элементов обработано.
+    - total (int): Сколько элементов было на момент запуска.
+    - chat_id (int): Чат администратора для сообщений о прогрессе.
+    - message_id (int): Сообщение, в котором обновляется прогресс.
+    - error (str): Текст ошибки, если задача упала.
+    """
+    __tablename__ = 'jobs'
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    kind = Column(String, nullable=False)
+    status = Column(String, nullable=False, default='pending', index=True)
+    params = Column(String, nullable=True)
+    counters = Column(String, nullable=True)
+    cursor = Column(String, nullable=True)
+    processed = Column(Integer, default=0)
+    total = Column(Integer, default=0)
+    chat_id = Column(Integer, nullable=True)
+    message_id = Column(Integer, nullable=True)
+    error = Column(String, nullable=True)
+    created_at = Column(DateTime, default=datetime.now)
+    updated_at = Column(DateTime, default=datetime.now, onupdate=datetime.now)
+
+
+class Payment(Base):
+    """
+    Платежи, одна запись на платеж ЮKassa.
+    Записываются при выдаче ключа и дополняются синхронизацией с ЮKassa.
+
+    Attributes:
+    - id (str): id платежа ЮKassa.
+    - account (int): Идентификатор пользователя телеграм (из metadata или описания платежа).
+    - amount (str): Сумма, как её возвращает API ("150.00").
+    - period_days (int): Оплаченный срок в днях.
+    - status (str): Статус платежа (succeeded; test — тестовые данные).
+    - description (str): Описание платежа.
+    - created_at (datetime): Время создания платежа (UTC).
+    - captured_at (datetime): Время подтверждения платежа (UTC).
+    - fulfilled_at (datetime): Когда по платежу выдан ключ (None — ещё не выдан).
+    """
+    __tablename__ = 'payments'
+    id = Column(String, primary_key=True)
+    account = Column(Integer, nullable=True, index=True)
+    amount = Column(String, nullable=True)
+    period_days = Column(Integer, nullable=True)
+    status = Column(String, nullable=True)
+    description = Column(String, nullable=True)
+    created_at = Column(DateTime, nullable=True, index=True)
+    captured_at = Column(DateTime, nullable=True)
+    fulfilled_at = Column(DateTime, nullable=True)
+
+    __table_args__ = (
+        Index('ix_payments_account_created_at', 'account', 'created_at'),
+    )
+
+
+class SyncState(Base):
+    """
+    Состояние инкрементальной синхронизации с внешним API
+
+    Attributes:
+    - name (str): Имя синхронизации.
+    - cursor (str): Курсор следующей страницы незавершённого прохода.
+    - since (datetime): Нижняя граница created_at незавершённого прохода (UTC).
+    - watermark (datetime): Самое позднее created_at среди завершённых проходов (UTC).
+    - updated_at (datetime): Время последнего сохранения.
+    """
+    __tablename__ = 'sync_state'
+    name = Column(String, primary_key=True)
+    cursor = Column(String, nullable=True)
+    since = Column(DateTime, nullable=True)
+    watermark = Column(DateTime, nullable=True)
+    updated_at = Column(DateTime, default=datetime.now, onupdate=datetime.now)
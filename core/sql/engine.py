@@ -0,0 +1,49 @@
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from core.settings import database_url, db_echo, db_busy_timeout
+from core.sql.base import Base
+from core.sql.migrations import run_migrations
+
+# Единый движок для бота, проверки подписок и бота техподдержки
+engine = create_async_engine(database_url, echo=db_echo)
+
+# Объекты остаются доступными после commit — обработчики читают их уже после закрытия сессии
+async_session = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+
+@event.listens_for(engine.sync_engine, "connect")
+def _set_sqlite_pragmas(dbapi_connection, connection_record) -> None:
+    """
+    Настройка каждого нового соединения SQLite:
+    WAL позволяет читать во время записи из другого процесса,
+    busy_timeout — ждать блокировку вместо ошибки database is locked.
+    """
+    if engine.dialect.name != "sqlite":
+        return
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute(f"PRAGMA busy_timeout={db_busy_timeout}")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.close()
+
+
+async def init_db() -> None:
+    """
+    Создание отсутствующих таблиц и миграция существующих.
+    Вызывается один раз при запуске процесса.
+    """
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+        await run_migrations(conn)
+
+    # Перенос старых записей users_payments в payments (после завершения — сразу выходит)
+    from core.sql.function_db_payments.payments import backfill_payments
+    await backfill_payments()
+
+
+async def dispose_engine() -> None:
+    """
+    Закрыть все соединения с БД (при остановке процесса)
+    """
+    await engine.dispose()
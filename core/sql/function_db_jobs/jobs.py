@@ -0,0 +1,91 @@
+import json
+
+from sqlalchemy import select, update
+
+from core.sql.base import Job
+from core.sql.engine import async_session
+
+# Задачи в этих статусах подхватываются после перезапуска бота
+UNFINISHED_STATUSES = ('pending', 'running')
+
+
+async def create_job(kind: str, params: dict, total: int, chat_id: int | None = None,
+                     message_id: int | None = None) -> Job:
+    """
+    Создать задачу в статусе pending
+
+    :param kind: str - Тип задачи
+    :param params: dict - Параметры задачи (сохраняются в JSON)
+    :param total: int - Количество элементов на момент запуска
+    :param chat_id: int | None - Чат администратора
+    :param message_id: int | None - Сообщение для прогресса
+    :return: Job
+    """
+    job = Job(kind=kind, status='pending', params=json.dumps(params, ensure_ascii=False),
+              counters='{}', total=total, processed=0, chat_id=chat_id, message_id=message_id)
+    async with async_session() as session:
+        session.add(job)
+        await session.commit()
+        return job
+
+
+async def get_job(job_id: int) -> Job | None:
+    """
+    :param job_id: int - Номер задачи
+    :return: Job | None
+    """
+    async with async_session() as session:
+        return await session.get(Job, job_id)
+
+
+async def get_recent_jobs(limit: int = 10) -> list[Job]:
+    """
+    :param limit: int - Сколько последних задач вернуть
+    :return: list[Job] - Задачи, от новых к старым
+    """
+    async with async_session() as session:
+        return list(await session.scalars(select(Job).order_by(Job.id.desc()).limit(limit)))
+
+
+async def get_unfinished_jobs() -> list[Job]:
+    """
+    :return: list[Job] - Задачи, прерванные перезапуском (pending/running), в порядке создания
+    """
+    async with async_session() as session:
+        query = select(Job).where(Job.status.in_(UNFINISHED_STATUSES)).order_by(Job.id)
+        return list(await session.scalars(query))
+
+
+async def save_job_checkpoint(job_id: int, cursor: str, processed: int, counters: dict) -> None:
+    """
+    Сохранить контрольную точку после обработки элемента
+
+    :param job_id: int - Номер задачи
+    :param cursor: str - id последнего обработанного элемента
+    :param processed: int - Сколько элементов обработано
+    :param counters: dict - Счётчики результата
+    """
+    async with async_session() as session:
+        await session.execute(
+            update(Job).where(Job.id == job_id).values(
+                cursor=cursor, processed=processed, counters=json.dumps(counters, ensure_ascii=False)
+            )
+        )
+        await session.commit()
+
+
+async def set_job_status(job_id: int, status: str, error: str | None = None, message_id: int | None = None) -> None:
+    """
+    :param job_id: int - Номер задачи
+    :param status: str - Новый статус
+    :param error: str | None - Текст ошибки (для failed)
+    :param message_id: int | None - Новое сообщение для прогресса
+    """
+    values = {'status': status}
+    if error is not None:
+        values['error'] = error[:1000]
+    if message_id is not None:
+        values['message_id'] = message_id
+    async with async_session() as session:
+        await session.execute(update(Job).where(Job.id == job_id).values(**values))
+        await session.commit()
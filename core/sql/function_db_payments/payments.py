@@ -0,0 +1,144 @@
+import re
+from datetime import datetime
+
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+
+from core.sql.base import Payment, SyncState, UserPay
+from core.sql.engine import async_session
+
+# Перенос старых строк users_payments.paykey ("[paykey|дата]\n...") в payments
+BACKFILL_NAME = 'users_payments_backfill'
+BACKFILL_BATCH_SIZE = 200
+_PAYKEY_ENTRY_RE = re.compile(r'\[([^|\]]+)\|([^\]]*)\]')
+
+
+async def upsert_payments(rows: list[dict]) -> None:
+    """
+    Добавить или обновить записи платежей одной транзакцией
+
+    :param rows: list[dict] - Поля Payment (id обязателен)
+    :return: None
+    """
+    if not rows:
+        return
+    async with async_session() as session:
+        for row in rows:
+            await session.merge(Payment(**row))
+        await session.commit()
+
+
+async def get_account_payments(account: int, limit: int = 50) -> list[Payment]:
+    """
+    Платежи пользователя, новые первыми (индекс account, created_at)
+
+    :param account: int - id пользователя телеграм
+    :param limit: int - Максимум записей
+    :return: list[Payment]
+    """
+    async with async_session() as session:
+        return list(await session.scalars(
+            select(Payment)
+            .filter(Payment.account == account)
+            .order_by(Payment.created_at.desc())
+            .limit(limit)
+        ))
+
+
+async def get_sync_state(name: str) -> SyncState | None:
+    """
+    :param name: str - Имя синхронизации
+    :return: SyncState | None
+    """
+    async with async_session() as session:
+        return await session.get(SyncState, name)
+
+
+async def save_sync_state(name: str, cursor: str | None, since: datetime | None,
+                          watermark: datetime | None) -> None:
+    """
+    Сохранить контрольную точку синхронизации
+
+    :param name: str - Имя синхронизации
+    :param cursor: str | None - Курсор следующей страницы (None — проход завершён)
+    :param since: datetime | None - Нижняя граница незавершённого прохода
+    :param watermark: datetime | None - Самое позднее created_at завершённых проходов
+    :return: None
+    """
+    async with async_session() as session:
+        await session.merge(SyncState(name=name, cursor=cursor, since=since, watermark=watermark,
+                                      updated_at=datetime.now()))
+        await session.commit()
+
+
+def _legacy_payment_rows(record: UserPay) -> list[dict]:
+    """
+    Разобрать строку paykey старой записи на отдельные платежи
+
+    :param record: UserPay
+    :return: list[dict] - Поля Payment
+    """
+    rows = []
+    for index, (paykey, date_text) in enumerate(_PAYKEY_ENTRY_RE.findall(record.paykey or '')):
+        if date_text == 'test':
+            status, created_at = 'test', record.time_added
+        else:
+            status = 'succeeded'
+            try:
+                # Дата записана format_iso_datetime из времени ЮKassa (UTC)
+                created_at = datetime.strptime(date_text, '%d.%m.%y - %H:%M')
+            except ValueError:
+                created_at = record.time_added if index == 0 else None
+        # Записи users_payments создавались только после выдачи ключа
+        rows.append({'id': paykey, 'account': record.account_id, 'status': status,
+                     'created_at': created_at, 'fulfilled_at': created_at or record.time_added})
+    return rows
+
+
+async def _backfill_batch(records: list[UserPay]) -> int:
+    async with async_session() as session:
+        added = set()
+        for record in records:
+            for row in _legacy_payment_rows(record):
+                # Платежи, уже записанные синхронизацией или другим процессом, не перезаписываются
+                if row['id'] not in added and await session.get(Payment, row['id']) is None:
+                    session.add(Payment(**row))
+                    added.add(row['id'])
+        await session.commit()
+        return len(added)
+
+
+async def backfill_payments(batch_size: int = BACKFILL_BATCH_SIZE) -> int:
+    """
+    Перенести платежи из users_payments.paykey в payments (одна запись на платеж).
+
+    Записи users_payments читаются пачками по id, после каждой пачки
+    сохраняется контрольная точка; завершённый перенос повторно не запускается.
+
+    :param batch_size: int - Записей users_payments за пачку
+    :return: int - Сколько платежей перенесено
+    """
+    state = await get_sync_state(BACKFILL_NAME)
+    if state and state.watermark:
+        return 0
+    after_id = state.cursor if state else None
+    moved = 0
+    while True:
+        async with async_session() as session:
+            query = select(UserPay).order_by(UserPay.id).limit(batch_size)
+            if after_id is not None:
+                query = query.where(UserPay.id > after_id)
+            records = list(await session.scalars(query))
+        if not records:
+            break
+        try:
+            moved += await _backfill_batch(records)
+        except IntegrityError:
+            # Ту же пачку одновременно перенёс другой процесс — повторяем, пропуская записанное
+            moved += await _backfill_batch(records)
+        after_id = records[-1].id
+        await save_sync_state(BACKFILL_NAME, cursor=after_id, since=None, watermark=None)
+        if len(records) < batch_size:
+            break
+    await save_sync_state(BACKFILL_NAME, cursor=after_id, since=None, watermark=datetime.now())
+    return moved
@@ -0,0 +1,105 @@
+import asyncio
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import case, func, select
+
+from core.sql.base import Payment, Users, UserKey
+from core.sql.engine import async_session
+from core.utils.format_iso_datetime import local_to_utc
+
+# Сколько секунд /stats отдаёт уже посчитанный результат
+STATS_CACHE_TTL = 30
+
+_stats_cache: tuple[float, dict] | None = None
+_stats_lock = asyncio.Lock()
+
+
+def _count_if(condition):
+    """
+    SUM(CASE WHEN condition THEN 1 ELSE 0 END) — счётчик строк по условию внутри одного запроса
+    """
+    return func.coalesce(func.sum(case((condition, 1), else_=0)), 0)
+
+
+async def _collect_bot_statistics(now: datetime) -> dict:
+    """
+    Посчитать статистику агрегатными запросами, не загружая строки в память
+
+    :param now: datetime - Момент, относительно которого считаются окна
+    :return: dict - Счётчики для /stats
+    """
+    today_start = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    week_ago = now - timedelta(days=7)
+    month_ago = now - timedelta(days=30)
+    is_active = UserKey.date > now
+
+    async with async_session() as session:
+        users_row = (await session.execute(select(
+            func.count(Users.id),
+            _count_if(Users.premium.is_(True)),
+        ))).one()
+
+        keys_row = (await session.execute(select(
+            func.count(UserKey.id),
+            _count_if(is_active),
+            _count_if(UserKey.promo.is_(True)),
+            _count_if(UserKey.promo.is_(True) & is_active),
+            _count_if(UserKey.created_at >= today_start),
+            _count_if(UserKey.created_at >= week_ago),
+            _count_if(UserKey.created_at >= month_ago),
+        ))).one()
+
+        servers_rows = (await session.execute(
+            select(UserKey.region_server, func.count(UserKey.id))
+            .where(is_active)
+            .group_by(UserKey.region_server)
+        )).all()
+
+        # Покупки, по которым бот выдал ключ; payments.created_at в UTC, окна те же, что и для ключей
+        payments_row = (await session.execute(select(
+            func.count(Payment.id),
+            _count_if(Payment.created_at >= local_to_utc(today_start)),
+            _count_if(Payment.created_at >= local_to_utc(week_ago)),
+            _count_if(Payment.created_at >= local_to_utc(month_ago)),
+        ).where(Payment.fulfilled_at.is_not(None)))).one()
+
+    total_keys, active_keys, promo_total, promo_active, new_today, new_week, new_month = keys_row
+    return {
+        'generated_at': now,
+        'total_users': users_row[0],
+        'premium_users': users_row[1],
+        'total_keys': total_keys,
+        'active_keys': active_keys,
+        'expired_keys': total_keys - active_keys,
+        'paid_keys': total_keys - promo_total,
+        'promo_keys_total': promo_total,
+        'promo_keys_active': promo_active,
+        'new_today': new_today,
+        'new_week': new_week,
+        'new_month': new_month,
+        'server_distribution': {region or 'unknown': count for region, count in servers_rows},
+        'total_payments': payments_row[0],
+        'payments_today': payments_row[1],
+        'payments_week': payments_row[2],
+        'payments_month': payments_row[3],
+    }
+
+
+async def get_bot_statistics(max_age: float = STATS_CACHE_TTL) -> dict:
+    """
+    Статистика для /stats с коротким кэшем результата.
+    Параллельные вызовы во время пересчёта ждут один общий запрос.
+
+    :param max_age: float - Допустимый возраст кэша в секундах (0 - пересчитать)
+    :return: dict - Счётчики пользователей, ключей, платежей и распределение по серверам
+    """
+    global _stats_cache
+    if _stats_cache and time.monotonic() - _stats_cache[0] < max_age:
+        return _stats_cache[1]
+    async with _stats_lock:
+        if _stats_cache and time.monotonic() - _stats_cache[0] < max_age:
+            return _stats_cache[1]
+        stats = await _collect_bot_statistics(datetime.now())
+        _stats_cache = (time.monotonic(), stats)
+        return stats
@@ -1,76 +1,136 @@
-from datetime import datetime
-from sqlalchemy import create_engine
-from sqlalchemy.orm import Session, sessionmaker
+"""
+Функции платежей пользователей.
 
-from core.sql.base import Base, UserPay
-from core.sql.function_db_user_vpn.users_vpn import get_user_data_from_table_users, add_user_to_db
-from core.utils.format_iso_datetime import format_iso_datetime
+Платежи хранятся в таблице payments (одна запись на платеж). Функции, которые раньше
+возвращали UserPay со строкой paykey, собирают такие же объекты из payments,
+чтобы вызывающий код не зависел от способа хранения.
+"""
+from datetime import datetime
+from sqlalchemy import delete, func, select
 
-DATABASE_URL = 'sqlite:///olvpnbot.db'
-engine = create_engine(DATABASE_URL, echo=True)
-Session = sessionmaker(bind=engine)
-Base.metadata.create_all(engine)
+from core.sql.base import Payment, UserPay
+from core.sql.engine import async_session
+from core.utils.format_iso_datetime import parse_iso_datetime, utc_to_local
+from core.utils.metrics import instrument_repository
 
 
-async def add_payment_to_db(account: int, payment_key: str = None, payment_date: str = None, paykey: str = None) -> None:
+async def add_payment_to_db(account: int, payment_key: str = None, payment_date: str = None, paykey: str = None,
+                            amount: str = None, period_days: int = None) -> None:
     """
-    Добавить новый платеж пользователя в таблицу users_payments
+    Записать платеж пользователя в таблицу payments
 
     :param account: int - id пользователя телеграм (теперь называется account вместо account_id)
     :param payment_key: str - ключ платежа (устаревший параметр, используйте paykey)
-    :param payment_date: str - дата и время платежа
+    :param payment_date: str - дата и время платежа (ISO 8601 из ЮKassa)
     :param paykey: str - ключ платежа (новый параметр)
+    :param amount: str - сумма платежа
+    :param period_days: int - оплаченный срок в днях
     :return: None
     """
     # Поддержка старого и нового API
     if paykey is None and payment_key is not None:
         paykey = payment_key
-    
+
     if paykey is None:
         raise ValueError("paykey is required")
-    
-    with Session() as session:
-        existing_record = session.query(UserPay).filter(UserPay.account_id == account).first()
-        
-        if payment_date:
-            payment_date = format_iso_datetime(iso_datetime=payment_date)
-            payment_entry = f"[{paykey}|{payment_date}]"
-        else:
-            # Для тестовых платежей без даты
-            payment_entry = f"[{paykey}|test]"
-        
-        if existing_record:
-            existing_record.paykey += f"\n{payment_entry}"
-        else:
-            record_from_table_user = await get_user_data_from_table_users(account=account)
-            if record_from_table_user is None:
-                await add_user_to_db(account=account, account_name=str(account))
-                record_from_table_user = await get_user_data_from_table_users(account=account)
-            record_id = record_from_table_user.id
-            new_record = UserPay(
-                id=record_id,
-                account_id=account,
-                paykey=payment_entry,
-                time_added=datetime.now()
-            )
-            session.add(new_record)
-        session.commit()
+
+    if payment_date:
+        created_at, status = parse_iso_datetime(iso_datetime=payment_date), 'succeeded'
+    else:
+        # Для тестовых платежей без даты
+        created_at, status = datetime.utcnow(), 'test'
+
+    async with async_session() as session:
+        # Платеж мог попасть в таблицу раньше синхронизацией с ЮKassa — дополняем запись
+        payment = await session.get(Payment, paykey)
+        if payment is None:
+            payment = Payment(id=paykey, created_at=created_at)
+            session.add(payment)
+        payment.account = account
+        payment.status = status
+        if amount is not None:
+            payment.amount = amount
+        if period_days is not None:
+            payment.period_days = period_days
+        payment.fulfilled_at = datetime.utcnow()
+        await session.commit()
+
+
+async def is_payment_recorded(paykey: str) -> bool:
+    """
+    Проверить, выдан ли уже ключ по платежу
+    (платеж, только загруженный синхронизацией, ещё не считается выданным)
+    :param paykey: str - id платежа ЮKassa
+    :return: bool
+    """
+    async with async_session() as session:
+        fulfilled_at = await session.scalar(select(Payment.fulfilled_at).filter(Payment.id == paykey))
+        return fulfilled_at is not None
 
 
 async def get_all_accounts_from_db() -> list:
     """
-    Получить список всех account_id из таблицы UserPay
+    Получить список всех пользователей с платежами
     :return: list - список всех account_id
     """
-    with Session() as session:
-        all_accounts = session.query(UserPay.account_id).distinct().all()
+    async with async_session() as session:
+        all_accounts = (await session.execute(
+            select(Payment.account).filter(Payment.account.is_not(None)).distinct()
+        )).all()
         return [str(account[0]) for account in all_accounts]
 
 
 async def get_all_user_payments() -> list[UserPay]:
     """
-    Получить все записи о платежах из таблицы UserPay
-    :return: list[UserPay] - список всех платежей
+    Получить платежи всех пользователей в прежнем виде UserPay
+    (одна запись на пользователя, paykey — строки "[paykey|дата]", time_added — первый платеж)
+
+    Объекты не привязаны к сессии и не сохраняются в users_payments.
+    :return: list[UserPay] - список записей по пользователям
+    """
+    async with async_session() as session:
+        payments = await session.scalars(
+            select(Payment)
+            .filter(Payment.account.is_not(None))
+            .order_by(Payment.account, Payment.created_at)
+        )
+        records: dict[int, UserPay] = {}
+        for payment in payments:
+            date_text = payment.created_at.strftime("%d.%m.%y - %H:%M") if payment.status != 'test' and payment.created_at else 'test'
+            entry = f"[{payment.id}|{date_text}]"
+            record = records.get(payment.account)
+            if record is None:
+                records[payment.account] = UserPay(account_id=payment.account, paykey=entry,
+                                                   time_added=payment.created_at)
+            else:
+                record.paykey += f"\n{entry}"
+        return list(records.values())
+
+
+async def get_payment_time_added(account_id: int) -> datetime | None:
+    """
+    Дата первого платежа пользователя
+    :param account_id: int - id пользователя телеграм
+    :return: datetime | None - время первого платежа в местном времени (как прежний time_added),
+        либо None если платежа нет
+    """
+    async with async_session() as session:
+        created_at = await session.scalar(select(func.min(Payment.created_at)).filter(Payment.account == account_id))
+    return utc_to_local(created_at)
+
+
+async def delete_account_payments(account_id: int) -> int:
+    """
+    Удалить все платежи пользователя (и старую запись users_payments)
+    :param account_id: int - id пользователя телеграм
+    :return: int - Сколько платежей удалено
     """
-    with Session() as session:
-        return session.query(UserPay).all()
+    async with async_session() as session:
+        result = await session.execute(delete(Payment).where(Payment.account == account_id))
+        await session.execute(delete(UserPay).where(UserPay.account_id == account_id))
+        await session.commit()
+        return result.rowcount
+
+
+# Задержки и ошибки вызовов для /metrics
+instrument_repository(globals(), 'users_payments')
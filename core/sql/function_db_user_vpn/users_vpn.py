@@ -1,16 +1,18 @@
 from datetime import datetime
 from typing import Union
-from sqlalchemy import create_engine
+from sqlalchemy import delete, func, select, tuple_, update
 from sqlalchemy.exc import NoResultFound
-from sqlalchemy.orm import Session
 import uuid
 
 from core.api_s.outline.outline_api import OutlineManager
-from core.sql.base import Base, Users, UserKey
+from core.sql.base import Users, UserKey
+from core.sql.engine import async_session
+from core.utils.metrics import instrument_repository
 
-DATABASE_URL = 'sqlite:///olvpnbot.db'
-engine = create_engine(DATABASE_URL, echo=True)
-Base.metadata.create_all(engine)
+# Дата, которая записывается в users_vpn.date при сбросе подписки
+EMPTY_DATE = datetime(2000, 1, 1)
+# Поля users_vpn, которые можно менять через update_user_state
+USER_STATE_FIELDS = ('premium', 'date', 'region_server', 'key', 'promo_key')
 
 
 async def add_user_to_db(account: int, account_name: str) -> None:
@@ -21,7 +23,7 @@ async def add_user_to_db(account: int, account_name: str) -> None:
     :param account_name: str - Имя пользователя телеграм
     :return: None
     """
-    with Session(engine) as session:
+    async with async_session() as session:
         record_id = f"{account}_{uuid.uuid4()}"
         referal_link = f"id_{account}"
 
@@ -33,7 +35,7 @@ async def add_user_to_db(account: int, account_name: str) -> None:
         )
 
         session.add(new_record)
-        session.commit()
+        await session.commit()
 
 
 async def get_all_records_from_table_users() -> list[Users]:
@@ -41,12 +43,9 @@ async def get_all_records_from_table_users() -> list[Users]:
     Вывод всех записей таблицы users_vpn
     :return: list[Users] - Все записи из таблицы
     """
-    session = Session(engine)
-    try:
-        result_all_records = session.query(Users).all()
-        return result_all_records
-    finally:
-        session.close()
+    async with async_session() as session:
+        result_all_records = await session.scalars(select(Users))
+        return list(result_all_records)
 
 
 async def get_user_data_from_table_users(account: int) -> Users:
@@ -56,9 +55,9 @@ async def get_user_data_from_table_users(account: int) -> Users:
     :param account:  int - id пользователя телеграм
     :return: Users - Данные из таблицы
     """
-    with Session(engine) as session:
+    async with async_session() as session:
         try:
-            user_data = session.query(Users).filter_by(account=account).one()
+            user_data = (await session.execute(select(Users).filter_by(account=account))).scalar_one()
             return user_data
         except NoResultFound:
             return None
@@ -72,12 +71,12 @@ async def set_key_to_table_users(account: int, value_key: OutlineManager) -> boo
     :param value_key: str or None - Новое значение ключа outline vpn
     :return: bool - True в случае успеха, False в противном
     """
-    with Session(engine) as session:
+    async with async_session() as session:
         try:
-            user_record = session.query(Users).filter_by(account=account).one()
+            user_record = (await session.execute(select(Users).filter_by(account=account))).scalar_one()
             if value_key != user_record.key:
                 user_record.key = value_key
-                session.commit()
+                await session.commit()
             return True
         except NoResultFound:
             return False
@@ -90,9 +89,9 @@ async def get_key_from_table_users(account: int) -> str or bool:
     :param account: int - Идентификатор записи
     :return: str - Ключ в виде строки в случае успеха, False в противном
     """
-    with Session(engine) as session:
+    async with async_session() as session:
         try:
-            user_record = session.query(Users).filter_by(account=account).one()
+            user_record = (await session.execute(select(Users).filter_by(account=account))).scalar_one()
             return user_record.key
         except NoResultFound:
             return False
@@ -106,12 +105,12 @@ async def set_premium_status(account: int, value_premium: bool) -> bool:
     :param value_premium: bool - Значение премиума
     :return: bool - True в случае успеха, False в противном
     """
-    with Session(engine) as session:
+    async with async_session() as session:
         try:
-            user_record = session.query(Users).filter_by(account=account).one()
+            user_record = (await session.execute(select(Users).filter_by(account=account))).scalar_one()
             if value_premium != user_record.premium:
                 user_record.premium = value_premium
-                session.commit()
+                await session.commit()
             return True
         except NoResultFound:
             return False
@@ -124,32 +123,34 @@ async def get_premium_status(account: int) -> bool:
     :param account: int - Данные из таблицы users_vpn
     :return: bool - True если у пользователя стоит флаг премиум, False в противном случае
     """
-    with Session(engine) as session:
+    async with async_session() as session:
         try:
-            user_record = session.query(Users).filter_by(account=account).one()
+            user_record = (await session.execute(select(Users).filter_by(account=account))).scalar_one()
             return user_record.premium
         except NoResultFound:
             return False
 
 
-async def set_date_to_table_users(account: int, value_date: str) -> bool:
+async def set_date_to_table_users(account: int, value_date: Union[str, datetime, None]) -> bool:
     """
     Установка даты до которого действует премиум
 
     :param account: int - Данные из таблицы
-    :param value_date: str - Дата в формате ДД.ММ.ГГГГ - ЧЧ:ММ
+    :param value_date: str | datetime | None - Дата (datetime или строка ДД.ММ.ГГГГ - ЧЧ:ММ), None - сброс
     :return: bool - True в случае успеха, False в противном
     """
-    with Session(engine) as session:
+    async with async_session() as session:
         try:
-            user_record = session.query(Users).filter_by(account=account).one()
-            if value_date:
+            user_record = (await session.execute(select(Users).filter_by(account=account))).scalar_one()
+            if isinstance(value_date, datetime):
+                date = value_date
+            elif value_date:
                 date = datetime.strptime(value_date, '%d.%m.%Y - %H:%M')
             elif value_date is None:
-                date = datetime.strptime('01.01.2000 - 00:00', '%d.%m.%Y - %H:%M')
+                date = EMPTY_DATE
             if date != user_record.date:
                 user_record.date = date
-                session.commit()
+                await session.commit()
             return True
         except NoResultFound:
             return False
@@ -162,12 +163,12 @@ async def set_promo_status(account: int, value_promo: bool) -> bool:
     :param value_promo: bool - Значение получен промо-ключ или нет
     :return: bool - True в случае успеха, False в противном
     """
-    with Session(engine) as session:
+    async with async_session() as session:
         try:
-            user_record = session.query(Users).filter_by(account=account).one()
+            user_record = (await session.execute(select(Users).filter_by(account=account))).scalar_one()
             if value_promo != user_record.promo_key:
                 user_record.promo_key = value_promo
-                session.commit()
+                await session.commit()
             return True
         except NoResultFound:
             return False
@@ -180,9 +181,9 @@ async def get_promo_status(account: int) -> bool:
     :param account: int - Данные из таблицы users_vpn
     :return: bool - True если пользователь получал промо-ключ, False в противном случае
     """
-    with Session(engine) as session:
+    async with async_session() as session:
         try:
-            user_record = session.query(Users).filter_by(account=account).one()
+            user_record = (await session.execute(select(Users).filter_by(account=account))).scalar_one()
             return user_record.promo_key
         except NoResultFound:
             return False
@@ -195,12 +196,12 @@ async def set_region_server(account: int, value_region: str) -> bool:
     :param value_region: str - Значение региона сервера
     :return: bool - True в случае успеха, False в противном
     """
-    with Session(engine) as session:
+    async with async_session() as session:
         try:
-            user_record = session.query(Users).filter_by(account=account).one()
+            user_record = (await session.execute(select(Users).filter_by(account=account))).scalar_one()
             if value_region != user_record.region_server:
                 user_record.region_server = value_region
-                session.commit()
+                await session.commit()
             return True
         except NoResultFound:
             return False
@@ -213,14 +214,53 @@ async def get_region_server(account: int) -> str:
     :param account: int - Данные из таблицы users_vpn
     :return: str - Значение присвоенного региона сервера, False в противном случае
     """
-    with Session(engine) as session:
+    async with async_session() as session:
         try:
-            user_record = session.query(Users).filter_by(account=account).one()
+            user_record = (await session.execute(select(Users).filter_by(account=account))).scalar_one()
             return user_record.region_server
         except NoResultFound:
             return None
 
 
+async def update_user_state(account: int, user_key: dict | None = None, **fields) -> bool:
+    """
+    Обновить несколько полей пользователя и при необходимости добавить ключ
+    в user_keys одной транзакцией (один запрос пользователя и один commit).
+
+    :param account: int - id пользователя телеграм
+    :param user_key: dict | None - Поля новой записи UserKey:
+                     access_url, outline_id, region_server, date (datetime), promo
+    :param fields: Поля users_vpn: premium, date (datetime | None - сброс), region_server, key, promo_key
+    :return: bool - True в случае успеха, False если пользователь не найден
+    """
+    unknown = set(fields) - set(USER_STATE_FIELDS)
+    if unknown:
+        raise ValueError(f"update_user_state: unknown fields {sorted(unknown)}")
+    if 'date' in fields and fields['date'] is None:
+        fields['date'] = EMPTY_DATE
+
+    async with async_session() as session:
+        user_record = await session.scalar(select(Users).filter_by(account=account))
+        if user_record is None:
+            return False
+        for name, value in fields.items():
+            if getattr(user_record, name) != value:
+                setattr(user_record, name, value)
+        if user_key is not None:
+            session.add(UserKey(
+                id=f"{account}_key_{uuid.uuid4()}",
+                account=account,
+                premium=user_key.get('premium', True),
+                access_url=user_key['access_url'],
+                outline_id=user_key['outline_id'],
+                region_server=user_key.get('region_server'),
+                date=user_key.get('date'),
+                promo=user_key.get('promo', False),
+            ))
+        await session.commit()
+        return True
+
+
 # --- Multiple keys support ---
 
 async def add_user_key(account: int, access_url: str, outline_id: str, region_server: str, date_str: Union[str, datetime], promo: bool) -> bool:
@@ -235,7 +275,7 @@ async def add_user_key(account: int, access_url: str, outline_id: str, region_se
     :param promo: Флаг промо-ключа
     :return: True в случае успеха, False при ошибке
     """
-    with Session(engine) as session:
+    async with async_session() as session:
         try:
             record_id = f"{account}_key_{uuid.uuid4()}"
             # Парсим дату
@@ -261,7 +301,7 @@ async def add_user_key(account: int, access_url: str, outline_id: str, region_se
                 promo=promo,
             )
             session.add(new_key)
-            session.commit()
+            await session.commit()
             return True
         except ValueError as e:
             # Ошибка парсинга даты
@@ -276,43 +316,275 @@ async def add_user_key(account: int, access_url: str, outline_id: str, region_se
 
 
 async def get_user_keys(account: int) -> list[UserKey]:
-    session = Session(engine)
-    try:
-        return session.query(UserKey).filter_by(account=account).all()
-    finally:
-        session.close()
+    async with async_session() as session:
+        return list(await session.scalars(select(UserKey).filter_by(account=account)))
 
 
 async def get_all_user_keys() -> list[UserKey]:
-    session = Session(engine)
-    try:
-        return session.query(UserKey).all()
-    finally:
-        session.close()
+    async with async_session() as session:
+        return list(await session.scalars(select(UserKey)))
 
 
 async def get_user_key_by_id(key_id: str) -> UserKey | None:
-    session = Session(engine)
-    try:
-        return session.query(UserKey).filter_by(id=key_id).one()
-    except NoResultFound:
-        return None
-    finally:
-        session.close()
+    async with async_session() as session:
+        return await session.scalar(select(UserKey).filter_by(id=key_id))
+
+
+def _due_page(model, query, now: datetime, after: tuple[datetime, str] | None):
+    """
+    Пачка записей с истёкшей датой в порядке (date, id): запрос идёт диапазоном
+    по индексу (date, id) от курсора, сброшенные записи (EMPTY_DATE) не читаются
+    """
+    if after is None:
+        query = query.where(model.date > EMPTY_DATE)
+    else:
+        query = query.where(tuple_(model.date, model.id) > tuple_(*after))
+    return query.where(model.date <= now).order_by(model.date, model.id)
+
+
+async def get_due_user_keys(now: datetime, limit: int, after: tuple[datetime, str] | None = None) -> list[UserKey]:
+    """
+    Выбрать пачку ключей, срок которых истёк (запрос по индексу user_keys (date, id))
+
+    :param now: datetime - Текущий момент
+    :param limit: int - Размер пачки
+    :param after: tuple[datetime, str] | None - (date, id) последнего ключа предыдущей пачки
+    :return: list[UserKey] - Истёкшие ключи, упорядоченные по (date, id)
+    """
+    query = _due_page(UserKey, select(UserKey), now, after)
+    async with async_session() as session:
+        return list(await session.scalars(query.limit(limit)))
+
+
+async def get_due_premium_users(now: datetime, limit: int, after: tuple[datetime, str] | None = None) -> list[Users]:
+    """
+    Выбрать пачку пользователей с флагом премиум и истёкшей users_vpn.date (старая схема без user_keys)
+
+    :param now: datetime - Текущий момент
+    :param limit: int - Размер пачки
+    :param after: tuple[datetime, str] | None - (date, id) последней записи предыдущей пачки
+    :return: list[Users] - Пользователи, упорядоченные по (date, id)
+    """
+    query = _due_page(Users, select(Users).where(Users.premium.is_(True)), now, after)
+    async with async_session() as session:
+        return list(await session.scalars(query.limit(limit)))
+
+
+async def get_user_keys_page(limit: int, after_id: str | None = None, region_server: str | None = None,
+                             premium_only: bool = False) -> list[UserKey]:
+    """
+    Выбрать пачку ключей по id (для фоновых задач, продолжающих работу с последнего id)
+
+    :param limit: int - Размер пачки
+    :param after_id: str | None - id последнего ключа предыдущей пачки
+    :param region_server: str | None - Только ключи этого сервера
+    :param premium_only: bool - Только ключи с флагом premium
+    :return: list[UserKey] - Ключи, упорядоченные по id
+    """
+    query = select(UserKey)
+    if region_server is not None:
+        query = query.where(UserKey.region_server == region_server)
+    if premium_only:
+        query = query.where(UserKey.premium.is_(True))
+    if after_id is not None:
+        query = query.where(UserKey.id > after_id)
+    async with async_session() as session:
+        return list(await session.scalars(query.order_by(UserKey.id).limit(limit)))
+
+
+async def count_user_keys(region_server: str | None = None, premium_only: bool = False) -> int:
+    """
+    Количество ключей с теми же условиями, что и в get_user_keys_page
+
+    :param region_server: str | None - Только ключи этого сервера
+    :param premium_only: bool - Только ключи с флагом premium
+    :return: int
+    """
+    query = select(func.count()).select_from(UserKey)
+    if region_server is not None:
+        query = query.where(UserKey.region_server == region_server)
+    if premium_only:
+        query = query.where(UserKey.premium.is_(True))
+    async with async_session() as session:
+        return await session.scalar(query) or 0
+
+
+def _users_page_filters(query, name_prefix: str | None, with_key: bool):
+    if name_prefix is not None:
+        query = query.where(Users.account_name.startswith(name_prefix, autoescape=True))
+    if with_key:
+        query = query.where(Users.key.is_not(None), Users.key != '')
+    return query
+
+
+async def get_users_page(limit: int, after_id: str | None = None, name_prefix: str | None = None,
+                         with_key: bool = False) -> list[Users]:
+    """
+    Выбрать пачку пользователей по id (для фоновых задач, продолжающих работу с последнего id)
+
+    :param limit: int - Размер пачки
+    :param after_id: str | None - id последней записи предыдущей пачки
+    :param name_prefix: str | None - Только пользователи с account_name, начинающимся с префикса
+    :param with_key: bool - Только пользователи со старым ключом в users_vpn.key
+    :return: list[Users] - Пользователи, упорядоченные по id
+    """
+    query = _users_page_filters(select(Users), name_prefix, with_key)
+    if after_id is not None:
+        query = query.where(Users.id > after_id)
+    async with async_session() as session:
+        return list(await session.scalars(query.order_by(Users.id).limit(limit)))
+
+
+async def count_users(name_prefix: str | None = None, with_key: bool = False) -> int:
+    """
+    Количество пользователей с теми же условиями, что и в get_users_page
+
+    :param name_prefix: str | None - Только пользователи с account_name, начинающимся с префикса
+    :param with_key: bool - Только пользователи со старым ключом в users_vpn.key
+    :return: int
+    """
+    query = _users_page_filters(select(func.count()).select_from(Users), name_prefix, with_key)
+    async with async_session() as session:
+        return await session.scalar(query) or 0
+
+
+async def count_active_keys_by_server(now: datetime) -> dict[str, int]:
+    """
+    Количество действующих ключей на каждом сервере
+
+    :param now: datetime - Текущий момент
+    :return: dict[str, int] - region_server -> количество
+    """
+    async with async_session() as session:
+        rows = (await session.execute(
+            select(UserKey.region_server, func.count(UserKey.id))
+            .where(UserKey.date > now)
+            .group_by(UserKey.region_server)
+        )).all()
+    return {region_server: count for region_server, count in rows}
+
+
+async def get_next_expiry(now: datetime) -> datetime | None:
+    """
+    Ближайший будущий момент истечения ключа или премиума
+
+    :param now: datetime - Текущий момент
+    :return: datetime | None - Дата ближайшего истечения, None если истекать нечему
+    """
+    async with async_session() as session:
+        next_key = await session.scalar(select(func.min(UserKey.date)).where(UserKey.date > now))
+        next_user = await session.scalar(
+            select(func.min(Users.date)).where(Users.premium.is_(True), Users.date > now)
+        )
+    candidates = [date for date in (next_key, next_user) if date is not None]
+    return min(candidates) if candidates else None
+
+
+async def get_user_key_by_short_id(short_id: str) -> UserKey | None:
+    """
+    Найти ключ по короткому идентификатору из callback_data (индексированный поиск)
+
+    :param short_id: str - Короткий идентификатор ключа (UserKey.short_id)
+    :return: UserKey | None
+    """
+    async with async_session() as session:
+        return await session.scalar(select(UserKey).filter_by(short_id=short_id))
 
 
 async def delete_user_key_record(key_id: str) -> bool:
-    with Session(engine) as session:
+    async with async_session() as session:
         try:
-            k: UserKey = session.query(UserKey).filter_by(id=key_id).one()
-            session.delete(k)
-            session.commit()
+            k: UserKey = (await session.execute(select(UserKey).filter_by(id=key_id))).scalar_one()
+            await session.delete(k)
+            await session.commit()
             return True
         except NoResultFound:
             return False
 
 
 
+async def delete_user_key_records(key_ids: list[str]) -> int:
+    """
+    Удалить несколько записей user_keys одним запросом
+
+    :param key_ids: list[str] - id записей UserKey
+    :return: int - Количество удалённых записей
+    """
+    if not key_ids:
+        return 0
+    async with async_session() as session:
+        result = await session.execute(delete(UserKey).where(UserKey.id.in_(key_ids)))
+        await session.commit()
+        return result.rowcount
+
+
+async def replace_user_keys(new_keys: list[dict], old_key_ids: list[str]) -> int:
+    """
+    Заменить ключи одной транзакцией: вставить новые записи user_keys и удалить старые
+    (при ошибке не меняется ничего)
+
+    :param new_keys: list[dict] - Поля новых записей UserKey:
+                     account, access_url, outline_id, region_server, date, promo, premium
+    :param old_key_ids: list[str] - id заменяемых записей
+    :return: int - Количество вставленных записей
+    """
+    if not new_keys and not old_key_ids:
+        return 0
+    async with async_session() as session:
+        session.add_all([
+            UserKey(
+                id=f"{key['account']}_key_{uuid.uuid4()}",
+                account=key['account'],
+                access_url=key['access_url'],
+                outline_id=key['outline_id'],
+                region_server=key.get('region_server'),
+                premium=key.get('premium', True),
+                date=key.get('date'),
+                promo=key.get('promo', False),
+            )
+            for key in new_keys
+        ])
+        if old_key_ids:
+            await session.execute(delete(UserKey).where(UserKey.id.in_(old_key_ids)))
+        await session.commit()
+    return len(new_keys)
+
+
+async def get_accounts_with_keys(accounts: list[int]) -> set[int]:
+    """
+    Какие из указанных пользователей ещё имеют ключи в user_keys
+
+    :param accounts: list[int] - id пользователей телеграм
+    :return: set[int] - Пользователи, у которых остались ключи
+    """
+    if not accounts:
+        return set()
+    async with async_session() as session:
+        rows = await session.scalars(
+            select(UserKey.account).where(UserKey.account.in_(accounts)).distinct()
+        )
+        return set(rows)
+
+
+async def reset_users_state(accounts: list[int]) -> int:
+    """
+    Сбросить ключ, премиум и дату у нескольких пользователей одним запросом
+
+    :param accounts: list[int] - id пользователей телеграм
+    :return: int - Количество обновлённых записей
+    """
+    if not accounts:
+        return 0
+    async with async_session() as session:
+        result = await session.execute(
+            update(Users)
+            .where(Users.account.in_(accounts))
+            .values(key=None, premium=False, date=EMPTY_DATE)
+        )
+        await session.commit()
+        return result.rowcount
+
+
 async def add_block_record(account: int, admin_id: int, reason: str, key: str) -> bool:
     """
     Добавляет запись о блокировке ключа в таблицу block_history
@@ -323,7 +595,7 @@ async def add_block_record(account: int, admin_id: int, reason: str, key: str) -
     :param key: str - сам ключ или access_url
     :return: bool
     """
-    with Session(engine) as session:
+    async with async_session() as session:
         try:
             record_id = f"{account}_block_{uuid.uuid4()}"
             from core.sql.base import BlockHistory
@@ -336,8 +608,11 @@ async def add_block_record(account: int, admin_id: int, reason: str, key: str) -
                 key=key,
             )
             session.add(new_record)
-            session.commit()
+            await session.commit()
             return True
         except Exception:
             return False
 
+
+# Задержки и ошибки вызовов для /metrics
+instrument_repository(globals(), 'users_vpn')
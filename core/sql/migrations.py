@@ -0,0 +1,92 @@
+from sqlalchemy import inspect, text
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+from core.sql.base import pick_short_id
+
+# Индексы user_keys; имена совпадают с теми, что create_all строит для новой БД
+USER_KEYS_INDEXES = (
+    "CREATE UNIQUE INDEX IF NOT EXISTS ix_user_keys_short_id ON user_keys (short_id)",
+    "CREATE INDEX IF NOT EXISTS ix_user_keys_account ON user_keys (account)",
+    "CREATE INDEX IF NOT EXISTS ix_user_keys_region_server_id ON user_keys (region_server, id)",
+    "CREATE INDEX IF NOT EXISTS ix_user_keys_date_id ON user_keys (date, id)",
+    "CREATE INDEX IF NOT EXISTS ix_user_keys_created_at ON user_keys (created_at)",
+    # Одноколоночные индексы заменены составными выше
+    "DROP INDEX IF EXISTS ix_user_keys_region_server",
+    "DROP INDEX IF EXISTS ix_user_keys_date",
+)
+
+# Индексы под оконные агрегаты /stats по платежам и выборку истёкших подписок
+EXTRA_INDEXES = (
+    "CREATE INDEX IF NOT EXISTS ix_users_payments_time_added ON users_payments (time_added)",
+    "CREATE INDEX IF NOT EXISTS ix_users_vpn_date_id ON users_vpn (date, id)",
+    "CREATE INDEX IF NOT EXISTS ix_users_vpn_with_key ON users_vpn (id) WHERE key IS NOT NULL AND key != ''",
+    "DROP INDEX IF EXISTS ix_users_vpn_date",
+)
+
+
+def _table_columns(sync_conn, table_name: str) -> set[str]:
+    return {column['name'] for column in inspect(sync_conn).get_columns(table_name)}
+
+
+async def migrate_user_keys_short_id(conn: AsyncConnection) -> int:
+    """
+    Добавить колонку short_id в user_keys (для БД, созданных до её появления),
+    заполнить её для старых записей без дублей и построить индексы.
+
+    :param conn: AsyncConnection - Соединение внутри транзакции init_db
+    :return: int - Количество заполненных записей
+    """
+    columns = await conn.run_sync(_table_columns, 'user_keys')
+    if 'short_id' not in columns:
+        await conn.execute(text("ALTER TABLE user_keys ADD COLUMN short_id VARCHAR"))
+
+    filled = 0
+    # Обычно все записи уже заполнены: проверка по индексу short_id вместо чтения всей таблицы
+    if await conn.scalar(text("SELECT 1 FROM user_keys WHERE short_id IS NULL LIMIT 1")):
+        rows = (await conn.execute(text("SELECT id, short_id FROM user_keys"))).all()
+        taken = {row.short_id for row in rows if row.short_id}
+        for row in rows:
+            if row.short_id:
+                continue
+            short_id = pick_short_id(row.id, taken)
+            taken.add(short_id)
+            await conn.execute(
+                text("UPDATE user_keys SET short_id = :short_id WHERE id = :id"),
+                {'short_id': short_id, 'id': row.id},
+            )
+            filled += 1
+
+    for statement in USER_KEYS_INDEXES:
+        await conn.execute(text(statement))
+    return filled
+
+
+# Колонки payments, появившиеся после создания таблицы
+PAYMENTS_NEW_COLUMNS = {
+    'period_days': 'INTEGER',
+    'fulfilled_at': 'DATETIME',
+}
+
+
+async def migrate_payments_columns(conn: AsyncConnection) -> None:
+    """
+    Добавить новые колонки в payments (для БД, где таблица создана до их появления)
+
+    :param conn: AsyncConnection - Соединение внутри транзакции init_db
+    """
+    columns = await conn.run_sync(_table_columns, 'payments')
+    for name, column_type in PAYMENTS_NEW_COLUMNS.items():
+        if name not in columns:
+            await conn.execute(text(f"ALTER TABLE payments ADD COLUMN {name} {column_type}"))
+
+
+async def run_migrations(conn: AsyncConnection) -> None:
+    """
+    Применить миграции схемы к существующей БД (идемпотентно)
+
+    :param conn: AsyncConnection - Соединение внутри транзакции init_db
+    """
+    await migrate_user_keys_short_id(conn)
+    await migrate_payments_columns(conn)
+    for statement in EXTRA_INDEXES:
+        await conn.execute(text(statement))
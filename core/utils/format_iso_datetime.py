@@ -1,4 +1,4 @@
-from datetime import datetime
+from datetime import datetime, timezone
 
 
 def format_iso_datetime(iso_datetime: str) -> str:
@@ -11,3 +11,40 @@ def format_iso_datetime(iso_datetime: str) -> str:
     dt = datetime.fromisoformat(iso_datetime.replace("Z", "+00:00"))
     formatted_datetime = dt.strftime("%d.%m.%y - %H:%M")
     return formatted_datetime
+
+
+def parse_iso_datetime(iso_datetime: str | None) -> datetime | None:
+    """
+    Преобразует строку ISO 8601 из API ЮKassa в naive datetime в UTC (для записи в БД).
+
+    :param iso_datetime: str | None Строка с датой и временем в формате ISO 8601.
+    :return: datetime | None
+    """
+    if not iso_datetime:
+        return None
+    dt = datetime.fromisoformat(iso_datetime.replace("Z", "+00:00"))
+    if dt.tzinfo is None:
+        return dt
+    return dt.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def utc_to_local(value: datetime | None) -> datetime | None:
+    """
+    Преобразует naive datetime в UTC (как хранится в payments) в naive datetime в местном времени сервера.
+
+    :param value: datetime | None Время в UTC.
+    :return: datetime | None
+    """
+    if value is None:
+        return None
+    return value.replace(tzinfo=timezone.utc).astimezone().replace(tzinfo=None)
+
+
+def local_to_utc(value: datetime) -> datetime:
+    """
+    Преобразует naive datetime в местном времени сервера в naive datetime в UTC (для сравнения с payments).
+
+    :param value: datetime Местное время.
+    :return: datetime
+    """
+    return value.astimezone(timezone.utc).replace(tzinfo=None)
@@ -1,30 +1,34 @@
 from aiogram.types import CallbackQuery
 from datetime import datetime, timedelta
 
-from core.api_s.outline.outline_api import OutlineManager
-from core.sql.function_db_user_vpn.users_vpn import (
-    set_key_to_table_users,
-    set_premium_status,
-    set_date_to_table_users,
-    set_region_server,
-    add_user_key,
-)
+from core.api_s.outline.outline_api import get_outline_manager
+from core.sql.function_db_user_vpn.users_vpn import update_user_state
 import uuid
 
 
-def get_future_date(add_day: int) -> str:
+def get_future_date(add_day: int) -> datetime:
     """
     Добавление к текущей дате количество дней выбранной подписки
 
     :param add_day: кол-во дней подписки
-    :return: Возврат даты окончания подписки в формате ДД.ММ.ГГГГ
+    :return: datetime - Дата окончания подписки
     """
     current_date = datetime.now()
-    future_date = current_date + timedelta(days=add_day)
-    return future_date.strftime('%d.%m.%Y - %H:%M')
+    return current_date + timedelta(days=add_day)
 
 
-async def get_ol_key_func(call: CallbackQuery, untill_date: str, region_server: str = 'nederland') -> str or bool:
+def format_date(date: datetime) -> str:
+    """
+    Дата окончания подписки в формате для сообщений пользователю
+
+    :param date: datetime - Дата
+    :return: str - Дата в формате ДД.ММ.ГГГГ - ЧЧ:ММ
+    """
+    return date.strftime('%d.%m.%Y - %H:%M')
+
+
+async def get_ol_key_func(call: CallbackQuery | None, untill_date: datetime, region_server: str = 'nederland',
+                          account: int | None = None) -> str or bool:
     """
     Проверяет наличие ключа у пользователя
     Если ключа нет - создает.
@@ -33,32 +37,35 @@ async def get_ol_key_func(call: CallbackQuery, untill_date: str, region_server:
 
     :param region_server: str - Регион раcположения сервера,
                                 берется из ответа пользователя в choise_region() в get_key_handler.py
-    :param untill_date: str - дата окончания подписки в формате ДД.ММ.ГГГГ - ЧЧ:ММ.
+    :param untill_date: datetime - дата окончания подписки.
     :param call: CallbackQuery - Объект CallbackQuery.
+    :param account: int | None - id пользователя, если ключ выдаётся без CallbackQuery (уведомление об оплате)
     :return: Key - Объект Key, содержащий информацию о ключе пользователя или False
     """
-    olm = OutlineManager(region_server)
-    id_user = call.from_user.id
+    olm = get_outline_manager(region_server)
+    id_user = account if account is not None else call.from_user.id
     # Всегда создаём новый ключ (поддержка множественных ключей) с уникальным именем
     # Используем POST запрос без key_id, чтобы избежать ошибки парсинга
     unique_name = f"{id_user}-{uuid.uuid4().hex[:8]}"
-    key_user = olm._client.create_key(name=unique_name)
+    key_user = await olm._client.create_key(name=unique_name)
     # Сохраняем сгенерированный сервером outline_id (конвертируем в строку)
     outline_id = str(key_user.key_id)
-    premium_user_db = await set_premium_status(account=id_user, value_premium=True)
-    date_user_db = await set_date_to_table_users(account=id_user, value_date=untill_date)
-    region_server_to_db = await set_region_server(account=id_user, value_region=region_server)
-    if all((premium_user_db, date_user_db, region_server_to_db)):
-        # Добавляем запись в новую таблицу множественных ключей
-        await add_user_key(
-            account=id_user,
-            access_url=key_user.access_url,
-            outline_id=outline_id,
-            region_server=region_server,
-            date_str=untill_date,
-            promo=False,
-        )
-        # Для обратной совместимости — сохраняем последний ключ в users_vpn.key
-        await set_key_to_table_users(account=id_user, value_key=key_user.access_url)
+    # Запись в таблицу множественных ключей и статусы пользователя — одной транзакцией.
+    # Для обратной совместимости последний ключ сохраняется и в users_vpn.key
+    updated = await update_user_state(
+        account=id_user,
+        user_key={
+            'access_url': key_user.access_url,
+            'outline_id': outline_id,
+            'region_server': region_server,
+            'date': untill_date,
+            'promo': False,
+        },
+        premium=True,
+        date=untill_date,
+        region_server=region_server,
+        key=key_user.access_url,
+    )
+    if updated:
         return key_user
     return False
@@ -1,18 +1,13 @@
-import json
+from core.api_s.outline.server_registry import server_registry
 
 
 async def get_region_name_from_json(region: str) -> str or None:
     """
     Получение названия сервера на русском, в читаемом формате
-    Из файла settings_api_outline.json
+    Из реестра серверов (settings_api_outline.json)
 
     :param region: str - Название региона в формате для бота
     :return: str - строка с названием региона сервера либо None если нет
     """
-    config_file = 'core/api_s/outline/settings_api_outline.json'
-    with open(config_file, 'r') as f:
-        config = json.load(f)
-    for key, value in config.items():
-        if value['name_en'] == region:
-            return value['name_ru']
-    return None
+    record = server_registry.get(region)
+    return record.name_ru if record else None
@@ -0,0 +1,152 @@
+import bisect
+import time
+from collections import deque
+
+# Верхние границы корзин гистограммы задержек (секунды)
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class LatencyHistogram:
+    """
+    Гистограмма задержек одной операции с момента запуска процесса
+
+    Attributes:
+    - buckets (tuple[float, ...]): Верхние границы корзин в секундах.
+    - counts (list[int]): Количество замеров в каждой корзине; последняя — больше buckets[-1].
+    - count (int): Всего замеров.
+    - total (float): Сумма задержек в секундах.
+    - max (float): Максимальная задержка в секундах.
+    - errors (int): Сколько замеров завершилось ошибкой.
+    """
+
+    def __init__(self, buckets: tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.errors = 0
+
+    def observe(self, seconds: float, error: bool = False) -> None:
+        """
+        Добавить замер
+
+        :param seconds: float - Задержка в секундах
+        :param error: bool - Операция завершилась ошибкой
+        """
+        self.counts[bisect.bisect_left(self.buckets, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+        if error:
+            self.errors += 1
+
+    def merge(self, other: 'LatencyHistogram') -> None:
+        """
+        Добавить замеры другой гистограммы с теми же корзинами
+
+        :param other: LatencyHistogram
+        """
+        for index, bucket_count in enumerate(other.counts):
+            self.counts[index] += bucket_count
+        self.count += other.count
+        self.total += other.total
+        self.max = max(self.max, other.max)
+        self.errors += other.errors
+
+    def quantile(self, q: float) -> float:
+        """
+        Оценка квантиля сверху: граница корзины, в которую он попадает
+
+        :param q: float - Квантиль от 0 до 1
+        :return: float - Секунды (для последней корзины — максимум)
+        """
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for bound, bucket_count in zip(self.buckets, self.counts):
+            seen += bucket_count
+            if seen >= rank:
+                return bound
+        return self.max
+
+    def as_text(self) -> str:
+        if not self.count:
+            return 'нет вызовов'
+        return (f'{self.count} шт., ср. {self.total / self.count * 1000:.0f} мс, '
+                f'p95 ≤ {self.quantile(0.95) * 1000:.0f} мс, макс. {self.max * 1000:.0f} мс, '
+                f'ошибок {self.errors}')
+
+
+class RollingLatencyHistogram:
+    """
+    Гистограмма с момента запуска и поминутные гистограммы за последние window_minutes минут.
+    Память ограничена: не больше window_minutes поминутных гистограмм.
+
+    Attributes:
+    - total (LatencyHistogram): Все замеры с момента запуска.
+    """
+
+    def __init__(self, buckets: tuple[float, ...] = DEFAULT_BUCKETS, window_minutes: int = 60):
+        """
+        Args:
+        - buckets: tuple[float, ...] - Верхние границы корзин в секундах
+        - window_minutes: int - За сколько последних минут хранить поминутные гистограммы
+        """
+        self.total = LatencyHistogram(buckets)
+        self.window_minutes = window_minutes
+        self._minutes: deque[tuple[int, LatencyHistogram]] = deque()
+
+    def observe(self, seconds: float, error: bool = False, now: float | None = None) -> None:
+        """
+        :param seconds: float - Задержка в секундах
+        :param error: bool - Операция завершилась ошибкой
+        :param now: float | None - Текущее время time.monotonic()
+        """
+        self.total.observe(seconds, error)
+        minute = int((time.monotonic() if now is None else now) // 60)
+        if not self._minutes or self._minutes[-1][0] != minute:
+            self._minutes.append((minute, LatencyHistogram(self.total.buckets)))
+            while self._minutes[0][0] <= minute - self.window_minutes:
+                self._minutes.popleft()
+        self._minutes[-1][1].observe(seconds, error)
+
+    def last(self, minutes: int, now: float | None = None) -> LatencyHistogram:
+        """
+        Замеры за последние minutes минут (не больше window_minutes)
+
+        :param minutes: int - Длина окна в минутах
+        :param now: float | None - Текущее время time.monotonic()
+        :return: LatencyHistogram - Новая гистограмма, объединяющая поминутные
+        """
+        since = int((time.monotonic() if now is None else now) // 60) - minutes
+        merged = LatencyHistogram(self.total.buckets)
+        for minute, histogram in self._minutes:
+            if minute > since:
+                merged.merge(histogram)
+        return merged
+
+
+_histograms: dict[str, LatencyHistogram] = {}
+
+
+def get_histogram(name: str) -> LatencyHistogram:
+    """
+    Гистограмма по имени операции (создаётся при первом обращении)
+
+    :param name: str - Имя операции, например yookassa.create_payment
+    :return: LatencyHistogram
+    """
+    histogram = _histograms.get(name)
+    if histogram is None:
+        histogram = _histograms[name] = LatencyHistogram()
+    return histogram
+
+
+def get_histograms(prefix: str = '') -> dict[str, LatencyHistogram]:
+    """
+    :param prefix: str - Оставить только операции с этим префиксом
+    :return: dict[str, LatencyHistogram] - Гистограммы, упорядоченные по имени
+    """
+    return {name: _histograms[name] for name in sorted(_histograms) if name.startswith(prefix)}
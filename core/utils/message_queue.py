@@ -0,0 +1,244 @@
+import asyncio
+import itertools
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+
+from aiogram.exceptions import (
+    TelegramBadRequest,
+    TelegramForbiddenError,
+    TelegramNetworkError,
+    TelegramRetryAfter,
+)
+
+from core.settings import outbound_rate_limit, outbound_chat_interval
+from logs.log_main import RotatingFileLogger
+
+logger = RotatingFileLogger()
+
+# Очереди приоритетов: сообщения по действиям пользователя уходят раньше рассылок
+PRIORITY_TRANSACTIONAL = 0
+PRIORITY_BROADCAST = 1
+
+# Сколько раз повторять отправку после сетевой ошибки
+MAX_SEND_ATTEMPTS = 3
+# Сколько отправок выполняется одновременно (темп всё равно ограничивает token bucket)
+SEND_WORKERS = 4
+
+
+@dataclass(order=True)
+class OutboundMessage:
+    """
+    Сообщение в очереди отправки (сортируется по приоритету и порядку постановки)
+    """
+    priority: int
+    seq: int
+    chat_id: int = field(compare=False)
+    text: str = field(compare=False)
+    kwargs: dict = field(compare=False, default_factory=dict)
+    attempts: int = field(compare=False, default=0)
+
+
+@dataclass
+class DeliveryStats:
+    """
+    Статистика доставки с момента запуска процесса
+    """
+    queued: int = 0
+    sent: int = 0
+    failed: int = 0
+    forbidden: int = 0
+    retry_after: int = 0
+
+    def as_text(self) -> str:
+        return (f'в очереди {self.queued - self.sent - self.failed - self.forbidden}, '
+                f'отправлено {self.sent}, ошибок {self.failed}, '
+                f'заблокировали бота {self.forbidden}, flood-пауз {self.retry_after}')
+
+
+class TokenBucket:
+    """
+    Глобальное ограничение темпа: не более rate отправок в секунду
+    с запасом burst на короткий всплеск
+    """
+
+    def __init__(self, rate: float, burst: float | None = None):
+        self.rate = rate
+        self.capacity = burst if burst is not None else rate
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+                self.updated_at = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class OutboundMessageQueue:
+    """
+    Очередь исходящих сообщений Telegram.
+
+    Обработчики ставят сообщение в очередь и не ждут отправки.
+    Воркеры соблюдают общий лимит (token bucket), паузу между сообщениями
+    в один чат и при TelegramRetryAfter приостанавливают всю отправку
+    на указанное Telegram время, после чего повторяют сообщение.
+    """
+
+    def __init__(self, rate: float = outbound_rate_limit, chat_interval: float = outbound_chat_interval,
+                 workers: int = SEND_WORKERS):
+        """
+        Args:
+        - rate: float - Сколько сообщений в секунду отправляется всего
+        - chat_interval: float - Минимальная пауза между сообщениями в один чат (секунды)
+        - workers: int - Количество параллельных отправок
+        """
+        self.rate = rate
+        self.chat_interval = chat_interval
+        self.workers = workers
+        self.stats = DeliveryStats()
+        self._queue: asyncio.PriorityQueue | None = None
+        self._bucket: TokenBucket | None = None
+        self._tasks: list[asyncio.Task] = []
+        self._seq = itertools.count()
+        # Упорядочен по времени готовности чата: истёкшие записи снимаются с начала
+        self._chat_next_at: OrderedDict[int, float] = OrderedDict()
+        self._paused_until = 0.0
+        self._delayed = 0
+        self._bot = None
+
+    def _ensure_started(self) -> None:
+        """Очередь и воркеры создаются лениво, внутри работающего event loop"""
+        if self._queue is None:
+            self._queue = asyncio.PriorityQueue()
+            self._bucket = TokenBucket(self.rate)
+        self._tasks = [task for task in self._tasks if not task.done()]
+        loop = asyncio.get_running_loop()
+        while len(self._tasks) < self.workers:
+            self._tasks.append(loop.create_task(self._run()))
+
+    def depth(self) -> int:
+        """
+        :return: int - Сколько сообщений ждут отправки (в очереди и отложенных)
+        """
+        return (self._queue.qsize() if self._queue is not None else 0) + self._delayed
+
+    def send_message(self, chat_id: int, text: str, priority: int = PRIORITY_TRANSACTIONAL, **kwargs) -> None:
+        """
+        Поставить сообщение в очередь отправки
+
+        :param chat_id: int - id чата получателя
+        :param text: str - Текст сообщения
+        :param priority: int - PRIORITY_TRANSACTIONAL или PRIORITY_BROADCAST
+        :param kwargs: Остальные параметры bot.send_message (parse_mode, reply_markup, ...)
+        """
+        self._ensure_started()
+        self.stats.queued += 1
+        self._queue.put_nowait(OutboundMessage(priority, next(self._seq), chat_id, text, kwargs))
+
+    def _get_bot(self):
+        if self._bot is None:
+            from core.bot import get_bot
+            self._bot = get_bot()
+        return self._bot
+
+    def _requeue(self, message: OutboundMessage, delay: float) -> None:
+        """Вернуть сообщение в очередь через delay секунд"""
+        def put_back() -> None:
+            self._delayed -= 1
+            self._queue.put_nowait(message)
+
+        self._delayed += 1
+        asyncio.get_running_loop().call_later(max(delay, 0), put_back)
+
+    async def _run(self) -> None:
+        while True:
+            message = await self._queue.get()
+            try:
+                await self._deliver(message)
+            except Exception as e:
+                self.stats.failed += 1
+                logger.log('error', f'Outbound message to {message.chat_id} failed: {e}')
+            finally:
+                self._queue.task_done()
+
+    async def _deliver(self, message: OutboundMessage) -> None:
+        now = time.monotonic()
+        if self._paused_until > now:
+            await asyncio.sleep(self._paused_until - now)
+
+        # Пауза в один чат: пока чат занят, сообщение ждёт вне очереди и не задерживает остальные
+        now = time.monotonic()
+        chat_ready_at = self._chat_next_at.get(message.chat_id, 0.0)
+        if chat_ready_at > now:
+            self._requeue(message, chat_ready_at - now)
+            return
+        # Пауза одинакова для всех чатов, поэтому move_to_end сохраняет порядок по времени
+        while self._chat_next_at and next(iter(self._chat_next_at.values())) <= now:
+            self._chat_next_at.popitem(last=False)
+        self._chat_next_at[message.chat_id] = now + self.chat_interval
+        self._chat_next_at.move_to_end(message.chat_id)
+
+        await self._bucket.acquire()
+        message.attempts += 1
+        try:
+            await self._get_bot().send_message(chat_id=message.chat_id, text=message.text, **message.kwargs)
+            self.stats.sent += 1
+        except TelegramRetryAfter as e:
+            self.stats.retry_after += 1
+            self._paused_until = max(self._paused_until, time.monotonic() + e.retry_after)
+            logger.log('warning', f'Telegram flood control: pause {e.retry_after} s')
+            self._requeue(message, e.retry_after)
+        except TelegramForbiddenError:
+            self.stats.forbidden += 1
+        except TelegramBadRequest as e:
+            self.stats.failed += 1
+            logger.log('warning', f'Outbound message to {message.chat_id} rejected: {e}')
+        except TelegramNetworkError as e:
+            if message.attempts >= MAX_SEND_ATTEMPTS:
+                self.stats.failed += 1
+                logger.log('warning', f'Outbound message to {message.chat_id} dropped after {message.attempts} attempts: {e}')
+            else:
+                self._requeue(message, 2 ** message.attempts)
+
+    async def drain(self, timeout: float = 30) -> None:
+        """
+        Дождаться отправки поставленных сообщений и остановить воркеры (при остановке процесса)
+
+        :param timeout: float - Максимальное время ожидания в секундах
+        """
+        if self._queue is not None:
+            deadline = time.monotonic() + timeout
+            try:
+                while True:
+                    await asyncio.wait_for(self._queue.join(), timeout=max(deadline - time.monotonic(), 0))
+                    if not self._delayed:
+                        break
+                    # сообщения, отложенные на паузу чата или flood control, ещё вернутся в очередь
+                    await asyncio.sleep(min(0.5, max(deadline - time.monotonic(), 0)))
+                    if time.monotonic() >= deadline:
+                        raise asyncio.TimeoutError
+            except asyncio.TimeoutError:
+                logger.log('warning', f'Outbound messages left unsent: {self._queue.qsize() + self._delayed}')
+        for task in self._tasks:
+            task.cancel()
+        self._tasks = []
+        logger.log('info', f'Outbound queue stats: {self.stats.as_text()}')
+
+    async def close(self) -> None:
+        """
+        Закрыть HTTP-сессию бота, если очередь её открыла (процесс проверки подписок, после drain).
+        В процессе бота сессию закрывает start_bot.
+        """
+        if self._bot is not None:
+            await self._bot.session.close()
+            self._bot = None
+
+
+outbound_queue = OutboundMessageQueue()
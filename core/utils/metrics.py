@@ -0,0 +1,125 @@
+"""
+Метрики процесса в текстовом формате Prometheus: гистограммы задержек с метками
+(запросы к Outline, вызовы репозиториев БД) и вывод gauge-значений.
+"""
+import functools
+import inspect
+import time
+
+from core.utils.latency import LatencyHistogram
+
+# Корзины задержек запросов к БД и Outline (секунды)
+REQUEST_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+METRIC_HELP = {
+    'outline_request_seconds': 'Outline management API requests',
+    'sql_query_seconds': 'SQL repository calls',
+    'yookassa_request_seconds': 'YooKassa API calls',
+    'bot_handler_seconds': 'Telegram message and callback handlers',
+}
+
+# Имя метрики -> (метки) -> гистограмма
+_histograms: dict[str, dict[tuple, LatencyHistogram]] = {}
+
+
+def observe(metric: str, seconds: float, error: bool = False, **labels) -> None:
+    """
+    Добавить замер в гистограмму метрики с метками
+
+    :param metric: str - Имя метрики, например outline_request_seconds
+    :param seconds: float - Задержка в секундах
+    :param error: bool - Вызов завершился ошибкой
+    :param labels: Метки серии (server, endpoint, ...)
+    """
+    series = _histograms.setdefault(metric, {})
+    key = tuple(sorted(labels.items()))
+    histogram = series.get(key)
+    if histogram is None:
+        histogram = series[key] = LatencyHistogram(REQUEST_BUCKETS)
+    histogram.observe(seconds, error)
+
+
+def _timed_query(func, repository: str):
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        error = False
+        try:
+            return await func(*args, **kwargs)
+        except Exception:
+            error = True
+            raise
+        finally:
+            observe('sql_query_seconds', time.perf_counter() - started, error,
+                    repository=repository, function=func.__name__)
+    return wrapper
+
+
+def instrument_repository(namespace: dict, repository: str) -> None:
+    """
+    Замерять все публичные корутины модуля-репозитория (вызывается в конце модуля: globals())
+
+    :param namespace: dict - globals() модуля
+    :param repository: str - Значение метки repository
+    """
+    for name, func in list(namespace.items()):
+        if (not name.startswith('_') and inspect.iscoroutinefunction(func)
+                and func.__module__ == namespace['__name__']):
+            namespace[name] = _timed_query(func, repository)
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _series(name: str, labels: tuple) -> str:
+    if not labels:
+        return name
+    return name + '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in labels) + '}'
+
+
+def render_histograms(metric: str, series: dict[tuple, LatencyHistogram]) -> list[str]:
+    """
+    Гистограммы одной метрики и счётчик ошибок <метрика без _seconds>_errors_total
+
+    :param metric: str - Имя метрики
+    :param series: dict[tuple, LatencyHistogram] - Метки (пары ключ-значение) -> гистограмма
+    :return: list[str] - Строки формата Prometheus
+    """
+    if not series:
+        return []
+    lines = [f'# HELP {metric} {METRIC_HELP.get(metric, metric)}', f'# TYPE {metric} histogram']
+    for labels, histogram in series.items():
+        cumulative = 0
+        for bound, bucket_count in zip(histogram.buckets, histogram.counts):
+            cumulative += bucket_count
+            lines.append(f'{_series(metric + "_bucket", labels + (("le", repr(bound)),))} {cumulative}')
+        lines.append(f'{_series(metric + "_bucket", labels + (("le", "+Inf"),))} {histogram.count}')
+        lines.append(f'{_series(metric + "_sum", labels)} {histogram.total}')
+        lines.append(f'{_series(metric + "_count", labels)} {histogram.count}')
+    errors = metric.removesuffix('_seconds') + '_errors_total'
+    lines.append(f'# TYPE {errors} counter')
+    lines.extend(f'{_series(errors, labels)} {histogram.errors}' for labels, histogram in series.items())
+    return lines
+
+
+def render_gauge(name: str, help_text: str, samples: list[tuple[tuple, float]]) -> list[str]:
+    """
+    :param name: str - Имя метрики
+    :param help_text: str - Описание
+    :param samples: list[tuple[tuple, float]] - (метки, значение)
+    :return: list[str] - Строки формата Prometheus
+    """
+    lines = [f'# HELP {name} {help_text}', f'# TYPE {name} gauge']
+    lines.extend(f'{_series(name, labels)} {value}' for labels, value in samples)
+    return lines
+
+
+def render_registered() -> list[str]:
+    """
+    :return: list[str] - Все гистограммы, записанные через observe
+    """
+    lines = []
+    for metric in sorted(_histograms):
+        lines.extend(render_histograms(metric, _histograms[metric]))
+    return lines
@@ -0,0 +1,59 @@
+import time
+from contextlib import contextmanager
+
+from core.settings import startup_budget
+from logs.log_main import RotatingFileLogger
+
+logger = RotatingFileLogger()
+
+
+class StartupProfiler:
+    """
+    Замер этапов запуска процесса (от импорта этого модуля до начала приёма обновлений)
+
+    Attributes:
+    - phases (list[tuple[str, float]]): Этапы и их длительность в секундах, в порядке выполнения.
+    - total (float | None): Время от старта до finish (None — запуск ещё идёт).
+    """
+
+    def __init__(self):
+        self._started = time.perf_counter()
+        self.phases: list[tuple[str, float]] = []
+        self.total: float | None = None
+
+    @contextmanager
+    def phase(self, name: str):
+        """
+        Замерить этап: with startup_profiler.phase('init_db'): ...
+
+        :param name: str - Имя этапа
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases.append((name, time.perf_counter() - start))
+
+    def as_text(self) -> str:
+        total = self.total if self.total is not None else time.perf_counter() - self._started
+        lines = [f'{name}: {seconds * 1000:.0f} мс' for name, seconds in self.phases]
+        lines.append(f'прочее: {max(total - sum(seconds for _, seconds in self.phases), 0) * 1000:.0f} мс')
+        lines.append(f'всего: {total * 1000:.0f} мс (бюджет {startup_budget * 1000:.0f} мс)')
+        return '\n'.join(lines)
+
+    def finish(self) -> None:
+        """
+        Завершить замер и вывести разбивку по этапам (повторные вызовы игнорируются)
+        """
+        if self.total is not None:
+            return
+        self.total = time.perf_counter() - self._started
+        report = self.as_text()
+        print(f'[startup]\n{report}')
+        if self.total > startup_budget:
+            logger.log('warning', f'Startup exceeded budget:\n{report}')
+        else:
+            logger.log('info', f'Startup:\n{report}')
+
+
+startup_profiler = StartupProfiler()
@@ -0,0 +1,199 @@
+"""
+Получение обновлений через webhook: один локальный aiohttp-сервер для основного
+бота и бота техподдержки.
+
+Telegram отправляет обновление POST-запросом на /webhook/<имя бота> с заголовком
+X-Telegram-Bot-Api-Secret-Token. Обновление кладётся в ограниченную очередь и
+сразу подтверждается, а обрабатывают очередь webhook_workers задач. Если очередь
+заполнена, запрос ждёт места — Telegram не шлёт новые обновления этому боту,
+пока не получит ответ.
+
+Через add_route тот же сервер принимает и другие HTTP-запросы (уведомления ЮKassa).
+"""
+import asyncio
+import hmac
+import secrets
+import traceback
+
+from aiogram import Bot, Dispatcher
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
+from aiohttp import web
+
+from core.settings import (
+    telegram_api_url,
+    webhook_base_url,
+    webhook_host,
+    webhook_port,
+    webhook_secret,
+    webhook_workers,
+)
+from logs.log_main import RotatingFileLogger
+
+logger = RotatingFileLogger()
+
+SECRET_HEADER = 'X-Telegram-Bot-Api-Secret-Token'
+# Сколько обновлений на одного обработчика может ждать в очереди
+QUEUE_SIZE_PER_WORKER = 10
+# Сколько секунд при остановке ждём обработки уже принятых обновлений
+DRAIN_TIMEOUT = 30
+
+
+def telegram_session() -> AiohttpSession | None:
+    """
+    Сессия Bot API с адресом из TELEGRAM_API_URL (локальный сервер Bot API или тестовый эндпоинт)
+
+    :return: AiohttpSession | None - None, если используется api.telegram.org
+    """
+    if not telegram_api_url:
+        return None
+    return AiohttpSession(api=TelegramAPIServer.from_base(telegram_api_url))
+
+
+class WebhookServer:
+    """
+    aiohttp-приложение, принимающее обновления для нескольких ботов.
+
+    Attributes:
+    - received (int): Сколько обновлений принято.
+    - processed (int): Сколько обновлений обработано.
+    - failed (int): Сколько обновлений завершилось ошибкой обработчика.
+    - rejected (int): Сколько запросов отклонено (неверный секрет, неизвестный бот, остановка).
+    """
+
+    def __init__(self, host: str = webhook_host, port: int = webhook_port, base_url: str = webhook_base_url,
+                 secret: str = webhook_secret, workers: int = webhook_workers):
+        """
+        Args:
+        - host: str - Адрес, на котором слушает сервер
+        - port: int - Порт сервера
+        - base_url: str - Публичный адрес для setWebhook
+        - secret: str - Секретный токен (пусто — сгенерировать)
+        - workers: int - Количество задач-обработчиков
+        """
+        self.host = host
+        self.port = port
+        self.base_url = base_url.rstrip('/')
+        self.secret = secret or secrets.token_urlsafe(32)
+        self.workers = max(1, workers)
+        self._bots: dict[str, tuple[Bot, Dispatcher, bool]] = {}
+        self._queue: asyncio.Queue | None = None
+        self._worker_tasks: list[asyncio.Task] = []
+        self._runner: web.AppRunner | None = None
+        self._site: web.TCPSite | None = None
+        self._closing = False
+        self.received = 0
+        self.processed = 0
+        self.failed = 0
+        self.rejected = 0
+
+        self.app = web.Application()
+        self.app.router.add_post('/webhook/{name}', self._handle)
+
+    def add_bot(self, name: str, bot: Bot, dp: Dispatcher, drop_pending_updates: bool = False) -> None:
+        """
+        Добавить бота (вызывается до start)
+
+        :param name: str - Имя в пути /webhook/<name>
+        :param bot: Bot
+        :param dp: Dispatcher
+        :param drop_pending_updates: bool - Пропустить обновления, накопленные за время простоя
+        """
+        self._bots[name] = (bot, dp, drop_pending_updates)
+
+    def add_route(self, path: str, handler) -> None:
+        """
+        Добавить обработчик POST-запросов (вызывается до start)
+
+        :param path: str - Путь, например /yookassa
+        :param handler: Корутина aiohttp (web.Request) -> web.Response
+        """
+        self.app.router.add_post(path, handler)
+
+    def webhook_url(self, name: str) -> str:
+        return f'{self.base_url}/webhook/{name}'
+
+    async def start(self) -> None:
+        """
+        Запустить обработчиков и HTTP-сервер, затем зарегистрировать webhook у каждого бота
+        """
+        self._queue = asyncio.Queue(maxsize=self.workers * QUEUE_SIZE_PER_WORKER)
+        self._worker_tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+        self._runner = web.AppRunner(self.app, access_log=None)
+        await self._runner.setup()
+        self._site = web.TCPSite(self._runner, self.host, self.port)
+        await self._site.start()
+
+        for name, (bot, dp, drop_pending_updates) in self._bots.items():
+            await bot.set_webhook(
+                url=self.webhook_url(name),
+                secret_token=self.secret,
+                allowed_updates=dp.resolve_used_update_types(),
+                drop_pending_updates=drop_pending_updates,
+            )
+        logger.log('info', f'Webhook server listening on {self.host}:{self.port} for {", ".join(self._bots)} '
+                           f'with {self.workers} workers')
+
+    async def stop(self, timeout: float = DRAIN_TIMEOUT) -> None:
+        """
+        Остановить сервер: перестать принимать запросы, дождаться обработки
+        принятых обновлений (не дольше timeout секунд) и остановить обработчиков.
+
+        Webhook у Telegram не удаляется: обновления, пришедшие во время перезапуска,
+        Telegram доставит повторно.
+        """
+        self._closing = True
+        if self._site is not None:
+            await self._site.stop()
+        if self._queue is not None:
+            try:
+                await asyncio.wait_for(self._queue.join(), timeout)
+            except asyncio.TimeoutError:
+                logger.log('warning', f'Webhook drain timed out, {self._queue.qsize()} updates left unprocessed')
+        for task in self._worker_tasks:
+            task.cancel()
+        await asyncio.gather(*self._worker_tasks, return_exceptions=True)
+        if self._runner is not None:
+            await self._runner.cleanup()
+        for _, dp, _ in self._bots.values():
+            await dp.storage.close()
+        logger.log('info', f'Webhook server stopped: received {self.received}, processed {self.processed}, '
+                           f'failed {self.failed}, rejected {self.rejected}')
+
+    async def _handle(self, request: web.Request) -> web.Response:
+        name = request.match_info['name']
+        if name not in self._bots:
+            self.rejected += 1
+            return web.Response(status=404)
+        if not hmac.compare_digest(request.headers.get(SECRET_HEADER, ''), self.secret):
+            self.rejected += 1
+            logger.log('warning', f'Webhook {name}: wrong secret token from {request.remote}')
+            return web.Response(status=401)
+        if self._closing:
+            # Telegram повторит доставку после перезапуска
+            self.rejected += 1
+            return web.Response(status=503)
+        try:
+            update = await request.json()
+        except ValueError:
+            self.rejected += 1
+            return web.Response(status=400)
+
+        await self._queue.put((name, update))
+        self.received += 1
+        return web.Response()
+
+    async def _worker(self) -> None:
+        while True:
+            name, update = await self._queue.get()
+            bot, dp, _ = self._bots[name]
+            try:
+                await dp.feed_raw_update(bot, update)
+                self.processed += 1
+            except Exception as e:
+                self.failed += 1
+                tb = traceback.format_exc()
+                logger.log('error', f'Webhook {name}: update {update.get("update_id")} failed: {e}\n{tb}')
+            finally:
+                self._queue.task_done()
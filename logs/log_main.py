@@ -1,8 +1,80 @@
+import atexit
+import copy
 import logging
 import os
 import json
+import queue
 import sys
-from logging.handlers import TimedRotatingFileHandler
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, TimedRotatingFileHandler
+
+# Один обработчик на файл лога: запись ставится в очередь, в файл её пишет фоновый поток
+_sinks: dict[str, tuple[QueueHandler, QueueListener]] = {}
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    Запись лога одной строкой JSON (LOG_FORMAT=json или "log_format": "json" в настройках)
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'time': datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'process': record.process,
+            'message': record.getMessage(),
+        }
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry['exc_info'] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False)
+
+
+class _QueueHandler(QueueHandler):
+    """
+    QueueHandler, который не склеивает traceback с сообщением:
+    форматирование целиком остаётся за обработчиком файла
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info and not record.exc_text:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record.exc_info = None
+        return record
+
+
+def flush_logs() -> None:
+    """
+    Дописать очередь в файлы при завершении процесса.
+    В основном процессе вызывается через atexit; дочерние процессы multiprocessing
+    завершаются через os._exit без atexit и вызывают её сами
+    """
+    for _, listener in _sinks.values():
+        if listener._thread is not None:
+            listener.stop()
+
+
+def _restart_listeners_in_child() -> None:
+    """
+    Поток записи не переживает fork: дочерний процесс (multiprocessing в main.py)
+    запускает свои потоки с новыми очередями
+    """
+    for queue_handler, listener in _sinks.values():
+        records = queue.SimpleQueue()
+        queue_handler.queue = records
+        listener.queue = records
+        listener._thread = None
+        listener.start()
+
+
+atexit.register(flush_logs)
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_restart_listeners_in_child)
 
 
 class RotatingFileLogger:
@@ -14,6 +86,7 @@ class RotatingFileLogger:
         self.log_file_format = config.get('log_file_format', '%Y-%m-%d.log')
         self.max_bytes = config.get('max_bytes', 200000000)
         self.backup_count = config.get('backup_count', 7)
+        self.log_format = os.getenv('LOG_FORMAT', config.get('log_format', 'text')).lower()
 
         self.logger = logging.getLogger(name=config.get('log_name', None))
         self.logger.setLevel(logging.INFO)
@@ -25,11 +98,19 @@ class RotatingFileLogger:
 
     def setup_logging(self):
         """Настройки логгирования, ротация"""
+        filename = os.path.abspath(os.path.join(self.log_dir, 'olvpnbot.log'))
+        # Файл уже подключён другим модулем — повторный обработчик продублировал бы каждую запись
+        if filename in _sinks:
+            queue_handler = _sinks[filename][0]
+            if queue_handler not in self.logger.handlers:
+                self.logger.addHandler(queue_handler)
+            return
+
         if not os.path.exists(self.log_dir):
             os.makedirs(self.log_dir)
 
         handler = TimedRotatingFileHandler(
-            filename=os.path.join(self.log_dir, 'olvpnbot.log'),
+            filename=filename,
             when='midnight',
             interval=1,
             backupCount=self.backup_count,
@@ -40,9 +121,18 @@ class RotatingFileLogger:
         handler.suffix = self.log_file_format
         handler.extMatch = r'^\d{4}-\d{2}-\d{2}.log$'
 
-        formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
+        if self.log_format == 'json':
+            formatter = JsonFormatter()
+        else:
+            formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
         handler.setFormatter(formatter)
-        self.logger.addHandler(handler)
+
+        # Форматирование и запись — в потоке QueueListener, цикл событий не ждёт диск
+        queue_handler = _QueueHandler(queue.SimpleQueue())
+        listener = QueueListener(queue_handler.queue, handler, respect_handler_level=True)
+        listener.start()
+        _sinks[filename] = (queue_handler, listener)
+        self.logger.addHandler(queue_handler)
 
     def handle_exception(self, exc_type, exc_value, exc_traceback):
         if issubclass(exc_type, KeyboardInterrupt):
@@ -5,8 +5,12 @@ import signal
 import time
 import traceback
 
-from core import bot, check_time_subscribe
-from logs.log_main import RotatingFileLogger
+from core.utils.startup_profiler import startup_profiler
+
+with startup_profiler.phase('import core.bot'):
+    from core import bot
+from core.settings import run_mode
+from logs.log_main import RotatingFileLogger, flush_logs
 
 logger = RotatingFileLogger()
 logger_payments = RotatingFileLogger(config_file='logs/log_settings_payments.json')
@@ -28,6 +32,9 @@ def run_bot() -> None:
         print('[main] run_bot exception:', e)
         print(tb)
         raise
+    finally:
+        # atexit в дочернем процессе не вызывается, иначе хвост очереди логов потеряется
+        flush_logs()
 
 
 def run_checker() -> None:
@@ -38,6 +45,7 @@ def run_checker() -> None:
     try:
         logger.log('info', 'run_checker: starting checker loop')
         print('[main] run_checker: starting checker loop')
+        from core import check_time_subscribe
         asyncio.run(check_time_subscribe.main_check_subscribe())
     except Exception as e:
         tb = traceback.format_exc()
@@ -46,6 +54,41 @@ def run_checker() -> None:
         print('[main] run_checker exception:', e)
         print(tb)
         raise
+    finally:
+        # atexit в дочернем процессе не вызывается, иначе хвост очереди логов потеряется
+        flush_logs()
+
+
+async def _run_single() -> None:
+    """
+    Бот с проверкой подписок в одном цикле событий; SIGINT/SIGTERM отменяют его,
+    и start_bot закрывает ресурсы в своём finally
+    """
+    loop = asyncio.get_running_loop()
+    task = asyncio.current_task()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(signum, task.cancel)
+    await bot.start_bot()
+
+
+def run_single() -> None:
+    """
+    Запуск в одном процессе (RUN_MODE=single)
+    :return: None
+    """
+    logger.log('info', 'run_single: starting bot with subscription checker')
+    print('[main] run_single: starting bot with subscription checker')
+    try:
+        asyncio.run(_run_single())
+    except asyncio.CancelledError:
+        logger.log('info', 'Приложение остановлено')
+    except Exception as e:
+        tb = traceback.format_exc()
+        logger_payments.log('error', f'run_single exception: {e}\n{tb}')
+        logger.log('error', f'run_single exception: {e}')
+        print('[main] run_single exception:', e)
+        print(tb)
+        raise
 
 
 def stop_application(signum: int, frame: int) -> None:
@@ -62,13 +105,16 @@ def stop_application(signum: int, frame: int) -> None:
 
 if __name__ == "__main__":
     """
-    Запуск модулей через multiprocessing
+    Запуск модулей через multiprocessing (или одним процессом при RUN_MODE=single)
     """
-    signal.signal(signal.SIGINT, stop_application)
-
     logger.log('info', 'Запуск приложения')
     logger_payments.log('warning', 'Запуск логгера payments')
     print('[main] Запуск приложения')
+    if run_mode == 'single':
+        run_single()
+        sys.exit(0)
+
+    signal.signal(signal.SIGINT, stop_application)
     bot_th = multiprocessing.Process(target=run_bot)
     plan_th = multiprocessing.Process(target=run_checker)
     bot_th.start()
@@ -0,0 +1,251 @@
+"""
+Asyncio API wrapper for Outline VPN
+"""
+
+import asyncio
+import time
+import typing
+
+import aiohttp
+
+from outline_vpn.outline_vpn import (
+    DEFAULT_METRICS_TTL,
+    OutlineKey,
+    OutlineLibraryException,
+    OutlineServerErrorException,
+    UNABLE_TO_GET_METRICS_ERROR,
+)
+
+DEFAULT_TIMEOUT = 10
+DEFAULT_CONNECT_TIMEOUT = 5
+DEFAULT_POOL_SIZE = 10
+DEFAULT_KEEPALIVE = 60
+
+
+def _fingerprint_from_sha256(cert_sha256: str) -> aiohttp.Fingerprint:
+    """
+    Converts the certificate fingerprint from the Outline config
+    (hex string, optionally separated by colons) into an aiohttp.Fingerprint
+    """
+    digest = bytes.fromhex(str(cert_sha256).replace(":", "").strip())
+    return aiohttp.Fingerprint(digest)
+
+
+class AsyncOutlineVPN:
+    """
+    An asyncio Outline VPN connection.
+
+    Every request goes through one pooled keep-alive connector per server,
+    and the server certificate is checked against the pinned SHA256
+    fingerprint, the same way _FingerprintAdapter does for requests.
+    """
+
+    def __init__(
+        self,
+        api_url: str,
+        cert_sha256: str,
+        timeout: float = DEFAULT_TIMEOUT,
+        connect_timeout: float = DEFAULT_CONNECT_TIMEOUT,
+        pool_size: int = DEFAULT_POOL_SIZE,
+        keepalive: float = DEFAULT_KEEPALIVE,
+        metrics_ttl: float = DEFAULT_METRICS_TTL,
+        on_request: typing.Optional[
+            typing.Callable[[str, str, typing.Optional[int], float], None]
+        ] = None,
+    ):
+        self.api_url = api_url
+        # Called after every request with (method, path, status or None on failure, seconds)
+        self.on_request = on_request
+
+        if not cert_sha256:
+            raise OutlineLibraryException(
+                "No certificate SHA256 provided. Running without certificate is no longer supported."
+            )
+        self.fingerprint = _fingerprint_from_sha256(cert_sha256)
+        self.timeout = aiohttp.ClientTimeout(total=timeout, connect=connect_timeout)
+        self.pool_size = pool_size
+        self.keepalive = keepalive
+        self._session: typing.Optional[aiohttp.ClientSession] = None
+        # Snapshot of /metrics/transfer shared by get_key/get_keys for metrics_ttl seconds
+        self.metrics_ttl = metrics_ttl
+        self._metrics: typing.Optional[dict] = None
+        self._metrics_fetched_at = 0.0
+        self._metrics_lock: typing.Optional[asyncio.Lock] = None
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        """The session is created lazily, inside the running event loop"""
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                ssl=self.fingerprint,
+                limit_per_host=self.pool_size,
+                keepalive_timeout=self.keepalive,
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector, timeout=self.timeout
+            )
+        return self._session
+
+    async def close(self) -> None:
+        """Closes the pooled connections"""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    async def _request(
+        self, method: str, path: str, timeout: float = None, **kwargs
+    ) -> typing.Tuple[int, typing.Any]:
+        """
+        Sends a request to the management API.
+
+        :return: (status code, decoded json body or None)
+        """
+        session = self._get_session()
+        # timeout=None would disable the session's ClientTimeout, so fall back to it
+        request_timeout = (
+            aiohttp.ClientTimeout(total=timeout, connect=self.timeout.connect)
+            if timeout is not None
+            else self.timeout
+        )
+        started = time.monotonic()
+        status = None
+        try:
+            async with session.request(
+                method, f"{self.api_url}{path}", timeout=request_timeout, **kwargs
+            ) as response:
+                body = None
+                if response.content_type == "application/json":
+                    body = await response.json()
+                else:
+                    await response.read()
+                status = response.status
+                return response.status, body
+        except (aiohttp.ClientError, TimeoutError) as e:
+            raise OutlineServerErrorException(
+                f"Request {method} {path} failed: {e!r}"
+            ) from e
+        finally:
+            if self.on_request is not None:
+                self.on_request(method, path, status, time.monotonic() - started)
+
+    def _metrics_fresh(self) -> bool:
+        return (
+            self._metrics is not None
+            and time.monotonic() - self._metrics_fetched_at < self.metrics_ttl
+        )
+
+    async def _get_cached_metrics(self) -> dict:
+        """
+        Returns the transfer metrics snapshot, downloading it at most once
+        per metrics_ttl seconds. Concurrent callers await a single refresh.
+        """
+        if self._metrics_fresh():
+            return self._metrics
+        if self._metrics_lock is None:
+            self._metrics_lock = asyncio.Lock()
+        async with self._metrics_lock:
+            if not self._metrics_fresh():
+                self._metrics = await self.get_transferred_data()
+                self._metrics_fetched_at = time.monotonic()
+            return self._metrics
+
+    async def get_keys(self, with_metrics: bool = True):
+        """Get all keys in the outline server"""
+        status, body = await self._request("GET", "/access-keys/")
+        if status == 200 and body and "accessKeys" in body:
+            metrics = await self._get_cached_metrics() if with_metrics else None
+            return [OutlineKey(key, metrics) for key in body.get("accessKeys")]
+        raise OutlineServerErrorException("Unable to retrieve keys")
+
+    async def get_key(self, key_id: str, with_metrics: bool = True) -> OutlineKey:
+        status, body = await self._request("GET", f"/access-keys/{key_id}")
+        if status == 200:
+            metrics = await self._get_cached_metrics() if with_metrics else None
+            return OutlineKey(body, metrics)
+        raise OutlineServerErrorException("Unable to get key")
+
+    async def create_key(
+        self,
+        key_id: str = None,
+        name: str = None,
+        method: str = None,
+        password: str = None,
+        data_limit: int = None,
+        port: int = None,
+    ) -> OutlineKey:
+        """Create a new key"""
+
+        payload = {}
+        if name:
+            payload["name"] = name
+        if method:
+            payload["method"] = method
+        if password:
+            payload["password"] = password
+        if data_limit:
+            payload["limit"] = {"bytes": data_limit}
+        if port:
+            payload["port"] = port
+        if key_id:
+            payload["id"] = key_id
+            status, body = await self._request(
+                "PUT", f"/access-keys/{key_id}", json=payload
+            )
+        else:
+            status, body = await self._request("POST", "/access-keys", json=payload)
+
+        if status == 201:
+            return OutlineKey(body)
+
+        raise OutlineServerErrorException(f"Unable to create key. {body}")
+
+    async def delete_key(self, key_id: str) -> bool:
+        """Delete a key"""
+        status, _ = await self._request("DELETE", f"/access-keys/{key_id}")
+        return status == 204
+
+    async def rename_key(self, key_id: str, name: str):
+        """Rename a key"""
+        form = aiohttp.FormData()
+        form.add_field("name", name)
+        status, _ = await self._request(
+            "PUT", f"/access-keys/{key_id}/name", data=form
+        )
+        return status == 204
+
+    async def add_data_limit(self, key_id: str, limit_bytes: int) -> bool:
+        """Set data limit for a key (in bytes)"""
+        data = {"limit": {"bytes": limit_bytes}}
+        status, _ = await self._request(
+            "PUT", f"/access-keys/{key_id}/data-limit", json=data
+        )
+        return status == 204
+
+    async def delete_data_limit(self, key_id: str) -> bool:
+        """Removes data limit for a key"""
+        status, _ = await self._request(
+            "DELETE", f"/access-keys/{key_id}/data-limit"
+        )
+        return status == 204
+
+    async def get_transferred_data(self):
+        """Gets how much data all keys have used
+        {
+            "bytesTransferredByUserId": {
+                "1":1008040941,
+                "2":5958113497,
+                "3":752221577
+            }
+        }"""
+        status, body = await self._request("GET", "/metrics/transfer")
+        if status >= 400 or not body or "bytesTransferredByUserId" not in body:
+            raise OutlineServerErrorException(UNABLE_TO_GET_METRICS_ERROR)
+        return body
+
+    async def get_server_information(self):
+        """Get information about the server"""
+        status, body = await self._request("GET", "/server")
+        if status != 200:
+            raise OutlineServerErrorException(
+                "Unable to get information about the server"
+            )
+        return body
@@ -2,6 +2,8 @@
 API wrapper for Outline VPN
 """
 
+import threading
+import time
 import typing
 from dataclasses import dataclass
 
@@ -9,6 +11,7 @@ import requests
 from urllib3 import PoolManager
 
 UNABLE_TO_GET_METRICS_ERROR = "Unable to get metrics"
+DEFAULT_METRICS_TTL = 30
 
 
 @dataclass
@@ -73,8 +76,15 @@ class OutlineVPN:
     An Outline VPN connection
     """
 
-    def __init__(self, api_url: str, cert_sha256: str):
+    def __init__(
+        self, api_url: str, cert_sha256: str, metrics_ttl: float = DEFAULT_METRICS_TTL
+    ):
         self.api_url = api_url
+        # Snapshot of /metrics/transfer shared by get_key/get_keys for metrics_ttl seconds
+        self.metrics_ttl = metrics_ttl
+        self._metrics: typing.Optional[dict] = None
+        self._metrics_fetched_at = 0.0
+        self._metrics_lock = threading.Lock()
 
         if cert_sha256:
             session = requests.Session()
@@ -85,43 +95,40 @@ class OutlineVPN:
                 "No certificate SHA256 provided. Running without certificate is no longer supported."
             )
 
-    def get_keys(self):
-        """Get all keys in the outline server"""
-        response = self.session.get(f"{self.api_url}/access-keys/", verify=False)
-        if response.status_code == 200 and "accessKeys" in response.json():
-            response_metrics = self.session.get(
-                f"{self.api_url}/metrics/transfer", verify=False
-            )
+    def _get_cached_metrics(self) -> dict:
+        """
+        Returns the transfer metrics snapshot, downloading it at most once
+        per metrics_ttl seconds. Concurrent callers wait for a single refresh.
+        """
+        with self._metrics_lock:
             if (
-                response_metrics.status_code >= 400
-                or "bytesTransferredByUserId" not in response_metrics.json()
+                self._metrics is None
+                or time.monotonic() - self._metrics_fetched_at >= self.metrics_ttl
             ):
-                raise OutlineServerErrorException(UNABLE_TO_GET_METRICS_ERROR)
+                self._metrics = self.get_transferred_data()
+                self._metrics_fetched_at = time.monotonic()
+            return self._metrics
 
+    def get_keys(self, with_metrics: bool = True):
+        """Get all keys in the outline server"""
+        response = self.session.get(f"{self.api_url}/access-keys/", verify=False)
+        if response.status_code == 200 and "accessKeys" in response.json():
+            metrics = self._get_cached_metrics() if with_metrics else None
             response_json = response.json()
             result = []
             for key in response_json.get("accessKeys"):
-                result.append(OutlineKey(key, response_metrics.json()))
+                result.append(OutlineKey(key, metrics))
             return result
         raise OutlineServerErrorException("Unable to retrieve keys")
 
-    def get_key(self, key_id: str) -> OutlineKey:
+    def get_key(self, key_id: str, with_metrics: bool = True) -> OutlineKey:
         response = self.session.get(
             f"{self.api_url}/access-keys/{key_id}", verify=False
         )
         if response.status_code == 200:
             key = response.json()
-
-            response_metrics = self.session.get(
-                f"{self.api_url}/metrics/transfer", verify=False
-            )
-            if (
-                response_metrics.status_code >= 400
-                or "bytesTransferredByUserId" not in response_metrics.json()
-            ):
-                raise OutlineServerErrorException(UNABLE_TO_GET_METRICS_ERROR)
-
-            return OutlineKey(key, response_metrics.json())
+            metrics = self._get_cached_metrics() if with_metrics else None
+            return OutlineKey(key, metrics)
         else:
             raise OutlineServerErrorException("Unable to get key")
 
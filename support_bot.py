@@ -28,8 +28,11 @@ if not os.getenv("SUPPORT_BOT_TOKEN"):
     if os.path.exists(temp_env_path):
         load_dotenv(temp_env_path)
 
-from core.settings import admin_tlg
-from core.api_s.outline.outline_api import OutlineManager, get_name_all_active_server_ol, get_server_display_name
+from core.settings import admin_tlg, bot_mode
+from core.api_s.outline.outline_api import get_outline_manager, close_outline_managers, get_name_all_active_server_ol, get_server_display_name
+from core.sql.engine import init_db, dispose_engine
+from core.webhook import telegram_session
+from core.middlewares.latency import HandlerLatencyMiddleware, perf_report
 from core.sql.function_db_user_vpn.users_vpn import (
     get_user_data_from_table_users,
     get_region_server,
@@ -39,9 +42,9 @@ from core.sql.function_db_user_vpn.users_vpn import (
     set_date_to_table_users,
     set_region_server,
     set_key_to_table_users,
-    set_promo_status,
     delete_user_key_record,
-    get_all_user_keys
+    get_all_user_keys,
+    update_user_state,
 )
 
 # Получаем токен бота техподдержки и username основного бота
@@ -126,10 +129,15 @@ async def get_least_busy_server_for_user(user_id: int) -> str:
 
 
 # Инициализация бота и диспетчера
-bot = Bot(token=SUPPORT_BOT_TOKEN)
+bot = Bot(token=SUPPORT_BOT_TOKEN, session=telegram_session())
 dp = Dispatcher()
 router = Router()
 
+# Задержки обработчиков; в режиме webhook маршруты видны и в /perf основного бота
+latency_middleware = HandlerLatencyMiddleware(prefix='support ')
+dp.message.outer_middleware(latency_middleware)
+dp.callback_query.outer_middleware(latency_middleware)
+
 # Словарь для хранения сопоставления пользователей и их последних сообщений
 # Структура: {user_id: {'username': ..., 'full_name': ..., 'last_message_id': ..., 'messages': [...]}}
 user_mapping = {}
@@ -213,6 +221,17 @@ async def cmd_start(message: Message):
     await message.answer(welcome_text, parse_mode=ParseMode.HTML)
 
 
+@router.message(Command("perf"))
+async def cmd_perf(message: Message):
+    """Задержки обработчиков (только для администратора)"""
+    if message.from_user.id != ADMIN_ID:
+        await message.answer("У вас нет доступа к этой команде")
+        return
+    args = message.text.split(maxsplit=1)
+    minutes = int(args[1]) if len(args) > 1 and args[1].strip().isdigit() else None
+    await message.answer(perf_report(minutes), parse_mode=ParseMode.HTML)
+
+
 @router.message(F.text)
 async def forward_to_admin(message: Message):
     """Пересылка сообщений от пользователей администратору"""
@@ -438,10 +457,10 @@ async def callback_give_promo(callback: CallbackQuery):
         
         # Создаем ключ на Outline сервере
         unique_name = f"{user_id}-promo-{uuid.uuid4().hex[:8]}"
-        olm = OutlineManager(region_server=region)
+        olm = get_outline_manager(region)
         
         try:
-            key_data = olm._client.create_key(name=unique_name)
+            key_data = await olm._client.create_key(name=unique_name)
         except Exception as e:
             logger.error(f'Promo create_key error for {user_id}: {e}')
             await callback.message.answer(
@@ -460,20 +479,22 @@ async def callback_give_promo(callback: CallbackQuery):
         outline_id = str(key_data.key_id)
         date_str = expiry_date.strftime('%d.%m.%Y - %H:%M')
         
-        # Сохраняем в БД
-        await add_user_key(
+        # Сохраняем в БД одной транзакцией
+        await update_user_state(
             account=user_id,
-            access_url=key_data.access_url,
-            outline_id=outline_id,
+            user_key={
+                'access_url': key_data.access_url,
+                'outline_id': outline_id,
+                'region_server': region,
+                'date': expiry_date,
+                'promo': True,
+            },
+            premium=True,
+            date=expiry_date,
             region_server=region,
-            date_str=date_str,
-            promo=True,
+            key=key_data.access_url,
+            promo_key=True,
         )
-        await set_premium_status(account=user_id, value_premium=True)
-        await set_date_to_table_users(account=user_id, value_date=date_str)
-        await set_region_server(account=user_id, value_region=region)
-        await set_key_to_table_users(account=user_id, value_key=key_data.access_url)
-        await set_promo_status(account=user_id, value_promo=True)
         
         # Отправляем уведомление пользователю
         try:
@@ -581,9 +602,9 @@ async def callback_replace_key(callback: CallbackQuery):
         
         # Создаем новый ключ
         try:
-            olm_new = OutlineManager(new_server)
+            olm_new = get_outline_manager(new_server)
             unique_name = f"{user_id}-replaced-{uuid.uuid4().hex[:8]}"
-            new_key = olm_new._client.create_key(name=unique_name)
+            new_key = await olm_new._client.create_key(name=unique_name)
             
             if not new_key:
                 raise Exception("Failed to create new key")
@@ -629,8 +650,8 @@ async def callback_replace_key(callback: CallbackQuery):
         
         # Удаляем старый ключ из Outline
         try:
-            olm_old = OutlineManager(old_server)
-            olm_old.delete_key_by_id(old_outline_id)
+            olm_old = get_outline_manager(old_server)
+            await olm_old.delete_key_by_id(old_outline_id)
             logger.info(f'Deleted old key {old_outline_id} from server {old_server}')
         except Exception as e:
             logger.warning(f'Failed to delete old key from Outline: {e}')
@@ -735,10 +756,11 @@ async def callback_history(callback: CallbackQuery):
     )
 
 
-async def main():
-    """Главная функция запуска бота"""
+async def on_startup():
+    """Подготовка бота: роутер, БД и уведомление администратора о запуске"""
     # Регистрируем роутер
     dp.include_router(router)
+    await init_db()
     
     logger.info("Бот техподдержки запущен")
     
@@ -772,25 +794,41 @@ async def main():
         except:
             pass
         raise
-    
+
+
+async def on_shutdown():
+    """Уведомление администратора об остановке и закрытие сессии бота"""
+    # Отправляем уведомление об остановке бота
+    try:
+        shutdown_message = (
+            f"🔴 <b>Бот техподдержки остановлен</b>\n\n"
+            f"⏹️ <b>Статус:</b> Бот прекратил работу\n"
+            f"🕐 <b>Время остановки:</b> {asyncio.get_event_loop().time()}\n\n"
+            f"<i>Сообщения от пользователей не будут приниматься</i>"
+        )
+        await send_notification_to_admin(shutdown_message)
+    except Exception as e:
+        logger.error(f"Ошибка при отправке уведомления об остановке: {e}")
+
+    await bot.session.close()
+    logger.info("Бот техподдержки остановлен")
+
+
+async def main():
+    """Главная функция запуска бота"""
+    if bot_mode == 'webhook':
+        # В режиме webhook бот обслуживается webhook-сервером основного бота (main.py)
+        logger.info("BOT_MODE=webhook: бот техподдержки работает в процессе основного бота, отдельный запуск не нужен")
+        return
+
+    await on_startup()
     # Запускаем polling
     try:
         await dp.start_polling(bot, allowed_updates=dp.resolve_used_update_types())
     finally:
-        # Отправляем уведомление об остановке бота
-        try:
-            shutdown_message = (
-                f"🔴 <b>Бот техподдержки остановлен</b>\n\n"
-                f"⏹️ <b>Статус:</b> Бот прекратил работу\n"
-                f"🕐 <b>Время остановки:</b> {asyncio.get_event_loop().time()}\n\n"
-                f"<i>Сообщения от пользователей не будут приниматься</i>"
-            )
-            await send_notification_to_admin(shutdown_message)
-        except Exception as e:
-            logger.error(f"Ошибка при отправке уведомления об остановке: {e}")
-        
-        await bot.session.close()
-        logger.info("Бот техподдержки остановлен")
+        await on_shutdown()
+        await close_outline_managers()
+        await dispose_engine()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,5 @@
+import os
+import tempfile
+
+# Тесты работают с отдельной БД: переменная читается core.settings при первом импорте
+os.environ['DATABASE_URL'] = 'sqlite+aiosqlite:///' + os.path.join(tempfile.mkdtemp(), 'test.db')
@@ -0,0 +1,58 @@
+import asyncio
+import json
+from datetime import datetime
+from types import SimpleNamespace
+
+import pytest
+
+requests = pytest.importorskip('requests')
+pytest.importorskip('yookassa')
+pytest.importorskip('sqlalchemy')
+
+from core.api_s.api_youkassa import payment_sync
+
+
+def _response(status: int, body: dict) -> requests.Response:
+    response = requests.Response()
+    response.status_code = status
+    response._content = json.dumps(body).encode()
+    response.headers['Content-Type'] = 'application/json'
+    response.url = 'https://api.yookassa.ru/v3/payments'
+    return response
+
+
+def test_stale_cursor_restarts_pass(monkeypatch):
+    since = datetime(2024, 1, 1)
+    state = SimpleNamespace(cursor='stale', since=since, watermark=datetime(2024, 1, 1, 2))
+    saved = []
+    requested = []
+    responses = [
+        _response(400, {'type': 'error', 'code': 'invalid_request', 'parameter': 'cursor'}),
+        _response(200, {'type': 'list', 'items': []}),
+    ]
+
+    def fake_request(session, method, url, **kwargs):
+        requested.append(kwargs['params'])
+        return responses.pop(0)
+
+    async def get_sync_state(name):
+        return state
+
+    async def save_sync_state(name, cursor, since, watermark):
+        saved.append(cursor)
+
+    async def upsert_payments(rows):
+        pass
+
+    monkeypatch.setattr(requests.Session, 'request', fake_request)
+    monkeypatch.setattr(payment_sync, 'get_sync_state', get_sync_state)
+    monkeypatch.setattr(payment_sync, 'save_sync_state', save_sync_state)
+    monkeypatch.setattr(payment_sync, 'upsert_payments', upsert_payments)
+
+    assert asyncio.run(payment_sync.sync_payments()) == 0
+
+    assert requested[0]['cursor'] == 'stale'
+    assert 'cursor' not in requested[1]
+    assert requested[1]['created_at.gte'] == payment_sync._format_api_datetime(since)
+    # Устаревший курсор стёрт сразу, а не только после успешной страницы
+    assert saved == [None, None]
@@ -0,0 +1,45 @@
+import asyncio
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+pytest.importorskip('sqlalchemy')
+pytest.importorskip('aiosqlite')
+
+from core.sql.base import Base, UserPay, Users
+from core.sql.engine import async_session, dispose_engine, engine
+from core.sql.function_db_payments.payments import backfill_payments
+from core.sql.function_db_user_payments.users_payments import get_payment_time_added
+
+
+@pytest.fixture
+def moscow_tz(monkeypatch):
+    monkeypatch.setenv('TZ', 'Europe/Moscow')
+    time.tzset()
+    yield
+    monkeypatch.undo()
+    time.tzset()
+
+
+def test_time_added_of_backfilled_legacy_row_stays_local(moscow_tz):
+    # Платеж ЮKassa в 09:30 UTC; прежняя запись users_payments создана в ту же минуту по местному времени
+    paid_utc = datetime(2024, 3, 1, 9, 30)
+    time_added = paid_utc + timedelta(hours=3)
+
+    async def scenario():
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.drop_all)
+            await conn.run_sync(Base.metadata.create_all)
+        async with async_session() as session:
+            session.add(Users(id='1_test', account=1, account_name='test'))
+            session.add(UserPay(id='1_pay', account_id=1, time_added=time_added,
+                                paykey=f"[2d6f0a9c-000f-5000-9000-1b2c3d4e5f60|{paid_utc:%d.%m.%y - %H:%M}]"))
+            await session.commit()
+        await backfill_payments()
+        try:
+            return await get_payment_time_added(1)
+        finally:
+            await dispose_engine()
+
+    assert asyncio.run(scenario()) == time_added
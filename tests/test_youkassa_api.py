@@ -0,0 +1,72 @@
+import asyncio
+import json
+
+import pytest
+
+requests = pytest.importorskip('requests')
+pytest.importorskip('yookassa')
+
+from core.api_s.api_youkassa import youkassa_api
+
+
+def _response(status: int, body: dict) -> requests.Response:
+    response = requests.Response()
+    response.status_code = status
+    response._content = json.dumps(body).encode()
+    response.headers['Content-Type'] = 'application/json'
+    response.url = 'https://api.yookassa.ru/v3/payments/test'
+    return response
+
+
+PAYMENT = {
+    'id': 'test', 'status': 'succeeded', 'paid': True,
+    'amount': {'value': '150.00', 'currency': 'RUB'},
+    'created_at': '2024-01-01T00:00:00.000Z', 'recipient': {'account_id': '1', 'gateway_id': '1'},
+    'test': True, 'refundable': False, 'metadata': {},
+}
+ERROR = {'type': 'error', 'code': 'internal_server_error'}
+
+
+@pytest.fixture
+def api(monkeypatch):
+    """Ответы API по очереди через настоящий путь SDK: ApiClient.request -> Session.request"""
+    responses = []
+    calls = []
+
+    def fake_request(session, method, url, **kwargs):
+        calls.append(kwargs)
+        return responses.pop(0)
+
+    monkeypatch.setattr(requests.Session, 'request', fake_request)
+    monkeypatch.setattr(youkassa_api, 'YOOKASSA_RETRY_DELAY', 0)
+    return responses, calls
+
+
+@pytest.mark.parametrize('status', [429, 503])
+def test_get_payment_retries_429_and_5xx(api, status):
+    responses, calls = api
+    responses.extend([_response(status, ERROR), _response(200, PAYMENT)])
+
+    payment = asyncio.run(youkassa_api.get_payment('test'))
+
+    assert payment.status == 'succeeded'
+    assert len(calls) == 2
+    assert all(call['timeout'] for call in calls)
+
+
+def test_get_payment_gives_up_after_max_attempts(api):
+    responses, calls = api
+    responses.extend(_response(503, ERROR) for _ in range(youkassa_api.YOOKASSA_MAX_ATTEMPTS))
+
+    with pytest.raises(requests.HTTPError):
+        asyncio.run(youkassa_api.get_payment('test'))
+    assert len(calls) == youkassa_api.YOOKASSA_MAX_ATTEMPTS
+
+
+def test_get_payment_does_not_retry_4xx(api):
+    responses, calls = api
+    responses.append(_response(404, {'type': 'error', 'code': 'not_found'}))
+
+    with pytest.raises(requests.HTTPError):
+        asyncio.run(youkassa_api.get_payment('test'))
+    assert len(calls) == 1